@@ -99,6 +99,7 @@ export async function POST(request: NextRequest) {
         monthlyInterest: response.data.projected_savings.monthly_interest,
         annualInterest: response.data.projected_savings.annual_interest,
       },
+      objectiveValue: response.data.objective_value,
     };
 
     return NextResponse.json(
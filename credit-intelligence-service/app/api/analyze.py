@@ -3,7 +3,7 @@ API Route: POST /analyze
 Analyze credit data and generate insights
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.models.schemas import (
     AnalyzeCreditRequest, 
     AnalyzeCreditResponse,
@@ -11,6 +11,8 @@ from app.models.schemas import (
     TransactionInsightResponse,
     TransactionInsight
 )
+from app.core.executor import compute_executor
+from app.core.response_cache import response_cache
 from app.core.security import verify_api_key
 from app.services.analyzer import CreditAnalyzer
 from app.services.transaction_insights import transaction_insights
@@ -19,9 +21,15 @@ router = APIRouter()
 analyzer = CreditAnalyzer()
 
 
+def _analyze(request: AnalyzeCreditRequest) -> AnalyzeCreditResponse:
+    return analyzer.analyze(request)
+
+
 @router.post("/analyze", response_model=AnalyzeCreditResponse)
 async def analyze_credit(
     request: AnalyzeCreditRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -33,8 +41,13 @@ async def analyze_credit(
     """
     try:
         # Analyze credit using hybrid rules + ML approach
-        result = analyzer.analyze(request)
-        return result
+        return await response_cache.serve(
+            "/analyze",
+            request,
+            http_request,
+            http_response,
+            lambda: compute_executor.respond("/analyze", _analyze, request),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
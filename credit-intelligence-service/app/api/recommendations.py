@@ -3,11 +3,13 @@ API Route: POST /recommendations
 Generate payment recommendations
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.models.schemas import (
     PaymentRecommendationRequest,
     PaymentRecommendationResponse
 )
+from app.core.executor import compute_executor
+from app.core.response_cache import response_cache
 from app.core.security import verify_api_key
 from app.services.recommender import PaymentRecommender
 
@@ -15,9 +17,15 @@ router = APIRouter()
 recommender = PaymentRecommender()
 
 
+def _recommend(request: PaymentRecommendationRequest) -> PaymentRecommendationResponse:
+    return recommender.recommend(request)
+
+
 @router.post("/recommendations", response_model=PaymentRecommendationResponse)
 async def get_payment_recommendations(
     request: PaymentRecommendationRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -38,8 +46,13 @@ async def get_payment_recommendations(
     """
     try:
         # Generate payment recommendations using hybrid approach
-        result = recommender.recommend(request)
-        return result
+        return await response_cache.serve(
+            "/recommendations",
+            request,
+            http_request,
+            http_response,
+            lambda: compute_executor.respond("/recommendations", _recommend, request),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate recommendations: {str(e)}")
 
@@ -5,16 +5,27 @@ Simulate loan payoff scenarios
 
 from fastapi import APIRouter, Depends, HTTPException
 from app.models.schemas import (
+    MultiCardPayoffRequest,
+    MultiCardPayoffResponse,
     PayoffSimulationRequest,
     PayoffSimulationResponse
 )
+from app.core.executor import compute_executor
 from app.core.security import verify_api_key
-from app.services.simulator import PayoffSimulator
+from app.services.simulator import InsufficientBudgetError, PayoffSimulator
 
 router = APIRouter()
 simulator = PayoffSimulator()
 
 
+def _simulate(request: PayoffSimulationRequest) -> PayoffSimulationResponse:
+    return simulator.simulate(request)
+
+
+def _compare_strategies(request: MultiCardPayoffRequest) -> MultiCardPayoffResponse:
+    return simulator.compare_strategies(request)
+
+
 @router.post("/simulate-payoff", response_model=PayoffSimulationResponse)
 async def simulate_payoff(
     request: PayoffSimulationRequest,
@@ -22,17 +33,42 @@ async def simulate_payoff(
 ):
     """
     Simulate loan payoff scenarios with different payment amounts
-    
-    TODO: Implement payoff simulation logic
-    - Call PayoffSimulator service
-    - Calculate multiple payment scenarios
-    - Show time to payoff and total interest
-    - Return comparison data
+
+    Returns:
+    - Minimum-only, minimum + extra, minimum + 2x extra and aggressive scenarios
+    - Months to payoff, total interest and total paid for each
+    - Optional payment vs. payoff-time curve (`curve_points` fixed payments)
+    """
+    try:
+        result = await compute_executor.run("/simulate-payoff", _simulate, request)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to simulate payoff: {str(e)}")
+
+
+@router.post("/simulate-payoff/strategies", response_model=MultiCardPayoffResponse)
+async def compare_payoff_strategies(
+    request: MultiCardPayoffRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Compare avalanche, snowball and balanced payoff of several cards from one monthly budget
+
+    Returns, for each strategy:
+    - Months until every card is paid off, total interest and total paid
+    - Per-card payoff months and end-of-month balance trajectories
     """
     try:
-        # TODO: Call simulator.simulate(request)
-        # TODO: Return scenarios
-        
-        raise HTTPException(status_code=501, detail="Not implemented")
+        result = await compute_executor.run("/simulate-payoff/strategies", _compare_strategies, request)
+        return result
+    except InsufficientBudgetError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": e.code,
+                "message": str(e),
+                "details": e.details,
+            },
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to compare payoff strategies: {str(e)}")
@@ -1,27 +1,40 @@
 """
 API Routes: Stochastic Planning
 - POST /spending-probability (Markov Chain)
+- POST /spending-probability/multi-step (Markov Chain, next N purchases)
 - POST /card-choice-batch (MDP batch)
+- POST /state/transactions (incremental per-user state ingest)
+- POST /state/reset
+- POST /state/spending-probability (Markov Chain from stored state)
+- POST /state/card-choice-batch (MDP batch from stored state)
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
+from app.core.executor import compute_executor
+from app.core.response_cache import response_cache
 from app.core.security import verify_api_key
 from app.models.schemas import (
     SpendingProbabilityRequest,
     SpendingProbabilityResponse,
-    CardChoiceRequest,
+    SpendingSequenceRequest,
+    SpendingSequenceResponse,
     CardChoiceBatchRequest,
     CardChoiceBatchResponse,
-    CardChoiceBatchItem,
     NewCardOpportunitiesRequest,
     NewCardOpportunitiesResponse,
     ForecastInsightsRequest,
     ForecastInsightsResponse,
+    StateIngestRequest,
+    StateIngestResponse,
+    StateResetRequest,
+    StateSpendingProbabilityRequest,
+    StateCardChoiceBatchRequest,
 )
+from app.services.category_taxonomy import category_inference_cache_info, reload_taxonomy
+from app.services.reward_catalog import reward_catalog
+from app.services.state_store import StateCursorMismatchError
 from app.services.stochastic_planner import (
-    NoRewardDataError,
     InsufficientDataError,
     stochastic_planner,
 )
@@ -29,14 +42,55 @@ from app.services.stochastic_planner import (
 router = APIRouter()
 
 
+# Module-level task functions so process-pool workers can import them by name.
+def _spending_probability(request: SpendingProbabilityRequest) -> SpendingProbabilityResponse:
+    return stochastic_planner.predict_spending_probability(request)
+
+
+def _spending_sequence(request: SpendingSequenceRequest) -> SpendingSequenceResponse:
+    return stochastic_planner.forecast_spending_sequence(request)
+
+
+def _card_choice_batch(request: CardChoiceBatchRequest, offers) -> CardChoiceBatchResponse:
+    return stochastic_planner.choose_cards_for_batch(request, offers=offers)
+
+
+def _ingest_state(request: StateIngestRequest) -> StateIngestResponse:
+    return stochastic_planner.ingest_transactions(request)
+
+
+def _state_spending_probability(request: StateSpendingProbabilityRequest) -> SpendingProbabilityResponse:
+    return stochastic_planner.predict_spending_probability_from_state(request)
+
+
+def _state_card_choice_batch(request: StateCardChoiceBatchRequest, offers) -> CardChoiceBatchResponse:
+    return stochastic_planner.choose_cards_for_batch_from_state(request, offers=offers)
+
+
+def _new_card_opportunities(request: NewCardOpportunitiesRequest, offers) -> NewCardOpportunitiesResponse:
+    return stochastic_planner.recommend_new_card_opportunities(request, offers=offers)
+
+
+def _forecast_insights(request: ForecastInsightsRequest) -> ForecastInsightsResponse:
+    return stochastic_planner.build_forecast_insights(request)
+
+
 @router.post("/spending-probability", response_model=SpendingProbabilityResponse)
 async def get_spending_probability(
     request: SpendingProbabilityRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key),
 ):
     """Predict next spending category probabilities using a Markov Chain."""
     try:
-        return stochastic_planner.predict_spending_probability(request)
+        return await response_cache.serve(
+            "/spending-probability",
+            request,
+            http_request,
+            http_response,
+            lambda: compute_executor.respond("/spending-probability", _spending_probability, request),
+        )
     except InsufficientDataError as e:
         raise HTTPException(
             status_code=422,
@@ -50,73 +104,130 @@ async def get_spending_probability(
         raise HTTPException(status_code=500, detail=f"Failed to compute spending probabilities: {str(e)}")
 
 
+@router.post("/spending-probability/multi-step", response_model=SpendingSequenceResponse)
+async def get_spending_sequence(
+    request: SpendingSequenceRequest,
+    api_key: str = Depends(verify_api_key),
+):
+    """Forecast category probabilities for each of the next N purchases and the long-run mix."""
+    try:
+        return await compute_executor.run("/spending-probability/multi-step", _spending_sequence, request)
+    except InsufficientDataError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": e.code,
+                "message": str(e),
+                "details": e.details,
+            },
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute spending forecast: {str(e)}")
+
+
 @router.post("/card-choice-batch", response_model=CardChoiceBatchResponse)
 async def get_card_choice_batch(
     request: CardChoiceBatchRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key),
 ):
     """Evaluate multiple recent transactions in one request and return per-transaction card-choice outputs."""
-    results = []
-
-    for txn in request.recent_transactions:
-        estimated_amount = abs(float(txn.amount or 0))
-        if estimated_amount <= 0:
-            continue
-
-        merchant_name = txn.description or "Unknown merchant"
-        merchant_category = txn.category
-
-        single_request = CardChoiceRequest(
-            user_id=request.user_id,
-            merchant_name=merchant_name,
-            merchant_category=merchant_category,
-            used_card_id=txn.card_id,
-            estimated_amount=estimated_amount,
-            lookback_days=request.lookback_days,
-            cards=request.cards,
-            transactions=request.transactions,
+    offers = await reward_catalog.get_offers()
+    return await response_cache.serve(
+        "/card-choice-batch",
+        request,
+        http_request,
+        http_response,
+        lambda: compute_executor.respond("/card-choice-batch", _card_choice_batch, request, offers=offers),
+        catalog_version=reward_catalog.version,
+    )
+
+
+@router.post("/state/transactions", response_model=StateIngestResponse)
+async def ingest_state_transactions(
+    request: StateIngestRequest,
+    api_key: str = Depends(verify_api_key),
+):
+    """Fold a transaction delta into the user's stored Markov and utilization state."""
+    try:
+        return await compute_executor.run("/state/transactions", _ingest_state, request)
+    except StateCursorMismatchError as e:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "code": e.code,
+                "message": str(e),
+                "details": e.details,
+            },
         )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to ingest transactions: {str(e)}")
 
-        try:
-            choice = stochastic_planner.choose_card_for_merchant(single_request)
-            results.append(
-                CardChoiceBatchItem(
-                    transaction_id=txn.id,
-                    used_card_id=txn.card_id,
-                    merchant_name=merchant_name,
-                    merchant_category=merchant_category,
-                    estimated_amount=estimated_amount,
-                    card_choice=choice,
-                )
-            )
-        except (InsufficientDataError, NoRewardDataError) as e:
-            results.append(
-                CardChoiceBatchItem(
-                    transaction_id=txn.id,
-                    used_card_id=txn.card_id,
-                    merchant_name=merchant_name,
-                    merchant_category=merchant_category,
-                    estimated_amount=estimated_amount,
-                    skipped_code=e.code,
-                    skipped_reason=str(e),
-                )
-            )
-
-    return CardChoiceBatchResponse(
-        user_id=request.user_id,
-        results=results,
-        computed_at=datetime.utcnow().isoformat(),
-    )
+
+@router.post("/state/reset")
+async def reset_state(
+    request: StateResetRequest,
+    api_key: str = Depends(verify_api_key),
+):
+    """Drop the user's stored state so full history can be replayed."""
+    stochastic_planner.reset_state(request.user_id)
+    return {
+        "success": True,
+        "message": "Stochastic state reset",
+        "user_id": request.user_id,
+    }
+
+
+@router.post("/state/spending-probability", response_model=SpendingProbabilityResponse)
+async def get_state_spending_probability(
+    request: StateSpendingProbabilityRequest,
+    api_key: str = Depends(verify_api_key),
+):
+    """Predict next spending category probabilities from stored transition counts."""
+    try:
+        return await compute_executor.run("/state/spending-probability", _state_spending_probability, request)
+    except InsufficientDataError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "code": e.code,
+                "message": str(e),
+                "details": e.details,
+            },
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute spending probabilities: {str(e)}")
+
+
+@router.post("/state/card-choice-batch", response_model=CardChoiceBatchResponse)
+async def get_state_card_choice_batch(
+    request: StateCardChoiceBatchRequest,
+    api_key: str = Depends(verify_api_key),
+):
+    """Batched card choice using stored utilization transitions and spend aggregates."""
+    offers = await reward_catalog.get_offers()
+    return await compute_executor.run("/state/card-choice-batch", _state_card_choice_batch, request, offers=offers)
 
 
 @router.post("/new-card-opportunities", response_model=NewCardOpportunitiesResponse)
 async def get_new_card_opportunities(
     request: NewCardOpportunitiesRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key),
 ):
     """Scenario 2 endpoint: recommend external cards user does not own for top spend categories."""
     try:
-        return stochastic_planner.recommend_new_card_opportunities(request)
+        offers = await reward_catalog.get_offers()
+        return await response_cache.serve(
+            "/new-card-opportunities",
+            request,
+            http_request,
+            http_response,
+            lambda: compute_executor.respond("/new-card-opportunities", _new_card_opportunities, request, offers=offers),
+            catalog_version=reward_catalog.version,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to compute new-card opportunities: {str(e)}")
 
@@ -124,11 +235,19 @@ async def get_new_card_opportunities(
 @router.post("/forecast-insights", response_model=ForecastInsightsResponse)
 async def get_forecast_insights(
     request: ForecastInsightsRequest,
+    http_request: Request,
+    http_response: Response,
     api_key: str = Depends(verify_api_key),
 ):
     """Compute Smart Forecast insights server-side for UI consumption."""
     try:
-        return stochastic_planner.build_forecast_insights(request)
+        return await response_cache.serve(
+            "/forecast-insights",
+            request,
+            http_request,
+            http_response,
+            lambda: compute_executor.respond("/forecast-insights", _forecast_insights, request),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to compute forecast insights: {str(e)}")
 
@@ -137,6 +256,29 @@ async def get_forecast_insights(
 async def invalidate_reward_catalog(
     api_key: str = Depends(verify_api_key),
 ):
-    """Invalidate cached reward catalog so next card-choice reloads from DB."""
+    """Invalidate cached reward catalog; it is revalidated in the background while the stale copy is served."""
     stochastic_planner.invalidate_reward_catalog_cache()
-    return {"success": True, "message": "Reward catalog cache invalidated"}
+    return {
+        "success": True,
+        "message": "Reward catalog cache invalidated",
+        "catalog": reward_catalog.stats(),
+    }
+
+
+@router.post("/taxonomy/reload")
+async def reload_category_taxonomy(
+    api_key: str = Depends(verify_api_key),
+):
+    """Reload the shared category taxonomy and clear memoized category inferences."""
+    try:
+        categories = reload_taxonomy()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload taxonomy: {str(e)}")
+    # Cached responses were categorized with the old taxonomy.
+    response_cache.clear()
+    return {
+        "success": True,
+        "message": "Category taxonomy reloaded",
+        "categories": len(categories),
+        "inference_cache": category_inference_cache_info(),
+    }
@@ -0,0 +1,966 @@
+"""
+Benchmark Script for Credit Intelligence Service
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.category_taxonomy import (
+    OTHER_CATEGORY,
+    SHARED_CATEGORIES,
+    SHARED_CATEGORY_KEYWORDS,
+    UNKNOWN_LABELS,
+    _infer_shared_category_uncached,
+    _to_slug,
+    category_inference_cache_info,
+    clear_category_inference_cache,
+    infer_shared_category,
+)
+from app.services.reward_catalog import (
+    RewardCatalogIndex,
+    _safe_float,
+    normalize_identity,
+    offer_to_rate_map,
+)
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.core.serialization import RenderedJSON
+from app.models.schemas import (
+    CardChoiceBatchRequest,
+    CardChoiceBatchResponse,
+    CardData,
+    CardDecisionCandidate,
+    ExpectedImpact,
+    MultiCardPayoffRequest,
+    ForecastInsightsRequest,
+    StochasticTransactionData,
+)
+from app.core.evaluation import evaluation_context
+from app.services.card_choice_shards import CardChoiceSharder
+from app.services.date_parsing import clear_date_memo, epoch_days, parse_transaction_date
+from app.services.recommender import PaymentRecommender
+from app.services.simulator import PayoffSimulator, payoff_schedule, simulate_multi_card_payoff
+from app.services.stochastic_planner import UTILIZATION_BUCKETS, StochasticPlanner, stochastic_planner
+from app.services.transaction_frame import TransactionFrame
+
+
+def print_section(title):
+    """Print a formatted section header"""
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def _time_per_item(fn, items, repeat=3):
+    """Best-of-N wall time for fn over items, returned as (total seconds, microseconds per item)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(items)
+        best = min(best, time.perf_counter() - start)
+    return best, (best / max(len(items), 1)) * 1e6
+
+
+def _synthetic_category_inputs(count, seed=7):
+    """Transaction-like (raw_category, description, merchant_name) triples"""
+    rng = random.Random(seed)
+    merchants = [
+        "TIM HORTONS #1234", "UBER EATS", "SOBEYS #552", "SHELL C02114", "AMAZON.CA",
+        "AIR CANADA", "NETFLIX.COM", "ROGERS WIRELESS", "LOCAL BAKERY", "E-TRANSFER",
+        "CITY OF TORONTO", "PHARMAPRIX", "GOODLIFE FITNESS", "UNKNOWN VENDOR 88",
+    ]
+    raw_categories = [None, "", "Food and Drink", "Shopping", "Travel", "Uncategorized", "Service", "Transfer"]
+    inputs = []
+    for idx in range(count):
+        merchant = rng.choice(merchants)
+        inputs.append((rng.choice(raw_categories), f"POS PURCHASE {merchant} {idx % 97}", merchant))
+    return inputs
+
+
+def _legacy_infer_shared_category(raw_category, description=None, merchant_name=None):
+    """Reference per-keyword substring implementation kept for comparison"""
+    raw = (raw_category or "").strip().lower()
+    source = f"{raw} {description or ''} {merchant_name or ''}".strip().lower()
+    if not source:
+        return OTHER_CATEGORY
+    if raw in SHARED_CATEGORIES:
+        return raw
+    for category, keywords in SHARED_CATEGORY_KEYWORDS.items():
+        if raw and any(keyword in raw for keyword in keywords):
+            return category
+    for category, keywords in SHARED_CATEGORY_KEYWORDS.items():
+        if any(keyword in source for keyword in keywords):
+            return category
+    if raw in UNKNOWN_LABELS:
+        return OTHER_CATEGORY
+    if raw:
+        slug = _to_slug(raw)
+        if slug and slug not in UNKNOWN_LABELS:
+            return slug
+    return OTHER_CATEGORY
+
+
+def benchmark_category_inference():
+    """Per-transaction cost of category inference, substring scan vs compiled automaton"""
+    print_section("BENCHMARK 1: Category Inference (infer_shared_category)")
+
+    def run(fn):
+        return lambda items: [fn(raw, description, merchant) for raw, description, merchant in items]
+
+    for count in (10_000, 100_000):
+        inputs = _synthetic_category_inputs(count)
+        legacy_total, legacy_us = _time_per_item(run(_legacy_infer_shared_category), inputs)
+        compiled_total, compiled_us = _time_per_item(run(_infer_shared_category_uncached), inputs)
+
+        assert run(_legacy_infer_shared_category)(inputs) == run(_infer_shared_category_uncached)(inputs)
+
+        print(f"\n  {count:,} transactions")
+        print(f"    substring scan : {legacy_total * 1000:9.1f} ms  ({legacy_us:6.2f} us/txn)")
+        print(f"    automaton      : {compiled_total * 1000:9.1f} ms  ({compiled_us:6.2f} us/txn)")
+        print(f"    speedup        : {legacy_total / max(compiled_total, 1e-9):9.2f}x")
+
+
+def benchmark_category_inference_cache():
+    """Repeated merchant strings through the memoized inference path"""
+    print_section("BENCHMARK 2: Category Inference Memo Cache")
+
+    def run(fn):
+        return lambda items: [fn(raw, description, merchant) for raw, description, merchant in items]
+
+    inputs = _synthetic_category_inputs(100_000)
+    uncached_total, uncached_us = _time_per_item(run(_infer_shared_category_uncached), inputs)
+    clear_category_inference_cache()
+    cached_total, cached_us = _time_per_item(run(infer_shared_category), inputs)
+    info = category_inference_cache_info()
+    hit_rate = info["hits"] / max(info["hits"] + info["misses"], 1) * 100
+
+    print(f"\n  100,000 transactions ({len(set(inputs)):,} distinct inputs)")
+    print(f"    uncached       : {uncached_total * 1000:9.1f} ms  ({uncached_us:6.2f} us/txn)")
+    print(f"    memoized       : {cached_total * 1000:9.1f} ms  ({cached_us:6.2f} us/txn)")
+    print(f"    hit rate       : {hit_rate:9.1f}%  (evictions: {info['evictions']})")
+
+
+def _synthetic_reward_offers(count, seed=11):
+    """Catalog rows shaped like the card_offers table"""
+    rng = random.Random(seed)
+    issuers = ["TD", "RBC", "Scotiabank", "BMO", "CIBC", "American Express", "Tangerine", "National Bank"]
+    offers = []
+    for idx in range(count):
+        issuer = rng.choice(issuers)
+        offers.append(
+            {
+                "id": idx,
+                "issuer": issuer,
+                "name": f"{issuer} Card {idx % 350}",
+                "annual_fee": rng.choice([None, 0, 0, 39, 120, 139, 599]),
+                "earn_rate_grocery": rng.choice([0, 1, 1.5, 2, 3, 4, 5]),
+                "earn_rate_travel": rng.choice([0, 1, 2, 3, 5]),
+                "earn_rate_dining": rng.choice([0, 1, 2, 3, 4, 5]),
+                "earn_rate_other": rng.choice([0.5, 1, 1.25]),
+            }
+        )
+    return offers
+
+
+def _legacy_top_offers_for_bucket(offers, bucket, current_best_rate, estimated_monthly_spend, limit=3):
+    """Reference per-call parse/dedupe/sort implementation kept for comparison"""
+    candidates = []
+    for offer in offers:
+        rate_map = offer_to_rate_map(offer)
+        rate = rate_map.get(bucket)
+        if rate is None:
+            rate = rate_map.get("default", 0.0)
+        if rate <= current_best_rate:
+            continue
+        monthly_incremental = estimated_monthly_spend * (rate - current_best_rate)
+        candidates.append(
+            {
+                "offer_id": offer.get("id"),
+                "name": offer.get("name"),
+                "issuer": offer.get("issuer"),
+                "reward_rate": round(rate, 4),
+                "annual_fee": _safe_float(offer.get("annual_fee")),
+                "estimated_monthly_incremental_reward": round(monthly_incremental, 2),
+                "estimated_annual_incremental_reward": round(monthly_incremental * 12.0, 2),
+            }
+        )
+
+    deduped = {}
+    for candidate in candidates:
+        key = normalize_identity(f"{candidate.get('issuer', '')} {candidate.get('name', '')}")
+        existing = deduped.get(key)
+        if existing is None or (
+            candidate["estimated_monthly_incremental_reward"] > existing["estimated_monthly_incremental_reward"]
+        ):
+            deduped[key] = candidate
+
+    ordered = sorted(
+        deduped.values(),
+        key=lambda c: (
+            0 if (c["annual_fee"] is None or c["annual_fee"] <= 0) else 1,
+            -c["estimated_monthly_incremental_reward"],
+            -c["reward_rate"],
+        ),
+    )
+    return ordered[:max(1, limit)]
+
+
+def benchmark_offer_ranking():
+    """Top-offer lookups per bucket, per-call scan vs precomputed rankings"""
+    print_section("BENCHMARK 3: Offer Ranking (top offers per reward bucket)")
+
+    offers = _synthetic_reward_offers(1_000)
+    rng = random.Random(3)
+    queries = [
+        (
+            rng.choice(["groceries", "travel", "dining", "default"]),
+            rng.choice([0.0, 0.01, 0.02, 0.03]),
+            rng.choice([150.0, 420.0, 900.0]),
+        )
+        for _ in range(300)
+    ]
+
+    def legacy(items):
+        return [_legacy_top_offers_for_bucket(offers, bucket, rate, spend) for bucket, rate, spend in items]
+
+    build_start = time.perf_counter()
+    index = RewardCatalogIndex(offers)
+    for bucket in ("groceries", "travel", "dining", "default"):
+        index.best_offer_for_bucket(bucket)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    def indexed(items):
+        return [index.top_offers_for_bucket(bucket, rate, spend, 3) for bucket, rate, spend in items]
+
+    assert legacy(queries) == indexed(queries)
+
+    legacy_total, legacy_us = _time_per_item(legacy, queries)
+    indexed_total, indexed_us = _time_per_item(indexed, queries)
+
+    print(f"\n  {len(offers):,} offers, {len(queries)} lookups (index build: {build_ms:.1f} ms)")
+    print(f"    per-call scan  : {legacy_total * 1000:9.1f} ms  ({legacy_us:8.2f} us/lookup)")
+    print(f"    ranked index   : {indexed_total * 1000:9.1f} ms  ({indexed_us:8.2f} us/lookup)")
+    print(f"    speedup        : {legacy_total / max(indexed_total, 1e-9):9.2f}x")
+
+
+def _synthetic_frame_rows(count, seed=5):
+    """(card_id, date, amount, category, balance) rows spread over the last year"""
+    rng = random.Random(seed)
+    categories = sorted(SHARED_CATEGORIES)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for _ in range(count):
+        rows.append(
+            (
+                rng.choice(["card_a", "card_b", "card_c"]),
+                start + timedelta(seconds=rng.randrange(365 * 86400)),
+                round(rng.uniform(-40.0, 400.0), 2),
+                rng.choice(categories),
+                None if rng.random() < 0.1 else round(rng.uniform(0.0, 5000.0), 2),
+            )
+        )
+    return rows
+
+
+def _legacy_aggregations(rows, category_space, card_limits):
+    """Reference row-at-a-time aggregations over a date-sorted list"""
+    rows = sorted(rows, key=lambda row: row[1])
+
+    spend_by_category = defaultdict(float)
+    monthly_totals = defaultdict(float)
+    for _, date, amount, category, _ in rows:
+        if amount > 0:
+            spend_by_category[category] += amount
+            monthly_totals[date.strftime("%Y-%m")] += amount
+
+    transitions = {src: {dst: 0 for dst in category_space} for src in category_space}
+    for prev_row, next_row in zip(rows[:-1], rows[1:]):
+        src = prev_row[3] if prev_row[3] in category_space else "other"
+        dst = next_row[3] if next_row[3] in category_space else "other"
+        transitions[src][dst] += 1
+
+    def bucket(balance, limit):
+        utilization = max(0.0, min(100.0, (balance / limit) * 100))
+        return "low" if utilization < 30 else "medium" if utilization < 70 else "high"
+
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[0]].append(row)
+    bucket_counts = {}
+    for card_id, card_rows in grouped.items():
+        counts = {s: {d: 0 for d in ("low", "medium", "high")} for s in ("low", "medium", "high")}
+        for current, following in zip(card_rows[:-1], card_rows[1:]):
+            if current[4] is None or following[4] is None:
+                continue
+            counts[bucket(current[4], card_limits[card_id])][bucket(following[4], card_limits[card_id])] += 1
+        bucket_counts[card_id] = stochastic_planner._normalize_bucket_counts(counts)
+
+    return dict(spend_by_category), dict(monthly_totals), transitions, bucket_counts
+
+
+def _frame_aggregations(rows, category_space, card_limits):
+    frame = TransactionFrame.from_rows(rows)
+    positive = frame.amounts > 0
+    return (
+        frame.sum_by_category(positive),
+        frame.sum_by_month(positive),
+        stochastic_planner._build_category_transition_counts(frame, category_space).to_dict(),
+        stochastic_planner._build_card_bucket_transitions(frame, card_limits),
+    )
+
+
+def benchmark_transaction_frame():
+    """Planner aggregations over Python row lists vs the columnar transaction frame"""
+    print_section("BENCHMARK 4: Transaction Aggregations (row list vs TransactionFrame)")
+
+    category_space = stochastic_planner._derive_category_space([])
+    card_limits = {"card_a": 4000.0, "card_b": 5000.0, "card_c": 2500.0}
+
+    for count in (1_000, 10_000, 100_000):
+        rows = _synthetic_frame_rows(count)
+        assert _legacy_aggregations(rows, category_space, card_limits) == _frame_aggregations(
+            rows, category_space, card_limits
+        )
+
+        legacy_total, legacy_us = _time_per_item(
+            lambda items: _legacy_aggregations(items, category_space, card_limits), rows
+        )
+        frame_total, frame_us = _time_per_item(
+            lambda items: _frame_aggregations(items, category_space, card_limits), rows
+        )
+
+        print(f"\n  {count:,} transactions (frame build included)")
+        print(f"    row list       : {legacy_total * 1000:9.1f} ms  ({legacy_us:6.2f} us/txn)")
+        print(f"    frame          : {frame_total * 1000:9.1f} ms  ({frame_us:6.2f} us/txn)")
+        print(f"    speedup        : {legacy_total / max(frame_total, 1e-9):9.2f}x")
+
+
+def _synthetic_card_choice_batch(count, seed=13):
+    """Card-choice batch with 180 days of history and `count` recent transactions"""
+    rng = random.Random(seed)
+    merchants = [
+        ("Sobeys", "groceries"), ("Shell", "gas"), ("Air Canada", "travel"),
+        ("Uber Eats", "dining"), ("Metro", "groceries"), ("Amazon", "shopping"),
+    ]
+    institutions = {"card_a": "Tangerine", "card_b": "American Express", "card_c": "Scotiabank"}
+    limits = {"card_a": 4000.0, "card_b": 5000.0, "card_c": 2500.0}
+    balances = {card_id: 0.0 for card_id in limits}
+    start = datetime.utcnow() - timedelta(days=180)
+
+    def transaction(idx, when, high):
+        name, category = rng.choice(merchants)
+        card_id = rng.choice(sorted(limits))
+        amount = round(rng.uniform(5.0, high), 2)
+        balances[card_id] = (balances[card_id] + amount) % limits[card_id]
+        return StochasticTransactionData(
+            id=f"txn_{idx}",
+            card_id=card_id,
+            date=when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            description=f"{name} Purchase",
+            amount=amount,
+            category=category,
+            merchant_name=name,
+            balance=round(balances[card_id], 2),
+        )
+
+    history = [transaction(idx, start + timedelta(hours=idx * 3), 400.0) for idx in range(1_200)]
+    # Larger recent purchases can clear the minimum incremental reward, so many items are fully scored.
+    recent = [transaction(10_000 + idx, datetime.utcnow(), 1_500.0) for idx in range(count)]
+    cards = [
+        CardDecisionCandidate(
+            card_id=card_id,
+            institution_name=institutions[card_id],
+            current_balance=balances[card_id],
+            credit_limit=limits[card_id],
+            utilization_percentage=round(balances[card_id] / limits[card_id] * 100, 2),
+            minimum_payment=25.0,
+        )
+        for card_id in sorted(limits)
+    ]
+    return CardChoiceBatchRequest(
+        user_id="bench_user",
+        lookback_days=365,
+        cards=cards,
+        transactions=history,
+        recent_transactions=recent,
+    )
+
+
+def _sample_card_offers():
+    """Distinct rates per issuer so many purchases have a better owned card to recommend"""
+    return [
+        {"id": 1, "issuer": "Tangerine", "name": "Tangerine Money-Back", "annual_fee": 0,
+         "earn_rate_grocery": 2, "earn_rate_travel": 0.5, "earn_rate_dining": 2, "earn_rate_other": 0.5},
+        {"id": 2, "issuer": "American Express", "name": "American Express Cobalt", "annual_fee": 155.88,
+         "earn_rate_grocery": 5, "earn_rate_travel": 2, "earn_rate_dining": 5, "earn_rate_other": 1},
+        {"id": 3, "issuer": "Scotiabank", "name": "Scotiabank Passport", "annual_fee": 150,
+         "earn_rate_grocery": 1, "earn_rate_travel": 4, "earn_rate_dining": 1, "earn_rate_other": 1},
+    ]
+
+
+def benchmark_card_choice_sharding():
+    """Card-choice batch scored in-process vs split across worker processes"""
+    print_section("BENCHMARK 5: Card-Choice Batch Sharding (500 recent transactions)")
+
+    offers = _sample_card_offers()
+    request = _synthetic_card_choice_batch(500)
+
+    def strip(response):
+        payload = response.model_dump()
+        payload.pop("computed_at")
+        for item in payload["results"]:
+            if item["card_choice"]:
+                item["card_choice"].pop("computed_at")
+        return payload
+
+    serial_planner = StochasticPlanner(sharder=CardChoiceSharder(workers=0))
+    expected = strip(serial_planner.choose_cards_for_batch(request, offers=offers))
+    serial_total, _ = _time_per_item(
+        lambda items: serial_planner.choose_cards_for_batch(request, offers=offers), request.recent_transactions
+    )
+    print(f"\n  cores available : {os.cpu_count()}")
+    print(f"  1 worker (in-process) : {serial_total * 1000:9.1f} ms")
+
+    for workers in (2, 4, 8):
+        sharder = CardChoiceSharder(workers=workers, min_transactions=2)
+        planner = StochasticPlanner(sharder=sharder)
+        try:
+            # The first call starts the pool; time steady-state requests only.
+            assert strip(planner.choose_cards_for_batch(request, offers=offers)) == expected
+            total, _ = _time_per_item(
+                lambda items: planner.choose_cards_for_batch(request, offers=offers), request.recent_transactions
+            )
+        finally:
+            sharder.shutdown()
+        print(f"  {workers} workers             : {total * 1000:9.1f} ms  ({serial_total / max(total, 1e-9):5.2f}x)")
+
+
+def _legacy_state_reward(card, util_bucket, merchant_category, estimated_amount):
+    """Reference per-(card, bucket) reward, re-deriving every card parameter on each call"""
+    reward_gain = estimated_amount * stochastic_planner._estimate_reward_rate(card, merchant_category)
+    util_midpoint = {"low": 20.0, "medium": 50.0, "high": 85.0}[util_bucket]
+    post_util = min(100.0, util_midpoint + (estimated_amount / max(card.credit_limit, 1.0)) * 100)
+    apr = card.interest_rate if card.interest_rate is not None else 0.0
+    interest_penalty = (apr / 100.0) * estimated_amount * 0.08
+    util_penalty = 0.0
+    if post_util > 30:
+        util_penalty += ((post_util - 30) / 70) * 2.5
+    if post_util > 70:
+        util_penalty += 2.0
+    due_penalty = 0.0
+    days_to_due = stochastic_planner._days_until_due(card.payment_due_date)
+    if days_to_due is not None and 0 <= days_to_due <= 3:
+        due_penalty = 1.5
+    elif days_to_due is not None and 4 <= days_to_due <= 7:
+        due_penalty = 0.5
+    return reward_gain - interest_penalty - util_penalty - due_penalty
+
+
+def _legacy_q_values(context, purchases):
+    """Reference Q-values: four scalar reward evaluations per card per purchase"""
+    values = []
+    for category, amount in purchases:
+        row = []
+        for card in context.eligible_cards:
+            transitions = context.transition_by_card.get(card.card_id)
+            bucket = stochastic_planner._bucket_for_utilization(card.utilization_percentage)
+            if not transitions or not transitions.get(bucket):
+                continue
+            immediate = _legacy_state_reward(card, bucket, category, amount)
+            expected_next = sum(
+                transitions[bucket][dst] * _legacy_state_reward(card, dst, category, amount)
+                for dst in UTILIZATION_BUCKETS
+            )
+            row.append(immediate + 0.9 * expected_next)
+        values.append(row)
+    return values
+
+
+def benchmark_q_values():
+    """Scalar per-card Q-value loop vs one broadcasted (purchases x cards x buckets) computation"""
+    print_section("BENCHMARK 6: Card-Choice Q-Values (scalar loop vs broadcast grid)")
+
+    request = _synthetic_card_choice_batch(2_000)
+    due = (datetime.utcnow() + timedelta(days=5)).strftime("%Y-%m-%dT00:00:00Z")
+    for card in request.cards:
+        card.payment_due_date = due
+        card.interest_rate = 20.99
+    context = stochastic_planner._build_card_choice_context(
+        user_id=request.user_id,
+        cards=request.cards,
+        transactions=request.transactions,
+        lookback_days=request.lookback_days,
+        offers=_sample_card_offers(),
+    )
+    purchases = [
+        (stochastic_planner._normalize_category(txn.category), float(txn.amount)) for txn in request.recent_transactions
+    ]
+
+    def vectorized(items):
+        # Fresh grid each run so per-request setup is included in the timing.
+        context.scoring_grid = None
+        categories = [category for category, _ in items]
+        amounts = np.array([amount for _, amount in items])
+        return stochastic_planner._q_values(stochastic_planner._card_scoring_grid(context), categories, amounts)[2]
+
+    assert vectorized(purchases).tolist() == _legacy_q_values(context, purchases)
+
+    for count in (1, 50, 2_000):
+        items = purchases[:count]
+        legacy_total, legacy_us = _time_per_item(lambda batch: _legacy_q_values(context, batch), items)
+        grid_total, grid_us = _time_per_item(vectorized, items)
+        print(f"\n  {count:,} purchases x {len(context.eligible_cards)} cards")
+        print(f"    scalar loop    : {legacy_total * 1000:9.3f} ms  ({legacy_us:8.2f} us/purchase)")
+        print(f"    broadcast grid : {grid_total * 1000:9.3f} ms  ({grid_us:8.2f} us/purchase)")
+        print(f"    speedup        : {legacy_total / max(grid_total, 1e-9):9.2f}x")
+
+
+def _loop_payoff(balance, monthly_rate, payments, horizon=600):
+    """Reference month-by-month amortization, one payment amount at a time"""
+    results = []
+    for payment in payments:
+        remaining, interest, months = balance, 0.0, -1
+        for month in range(1, horizon + 1):
+            charge = remaining * monthly_rate
+            interest += charge
+            remaining = remaining + charge - min(payment, remaining + charge)
+            if remaining < 0.005:
+                months = month
+                break
+        results.append((months, interest))
+    return results
+
+
+def benchmark_payoff_curve():
+    """Month-by-month loop per payment vs one closed-form NumPy pass over the whole curve"""
+    print_section("BENCHMARK 7: Payoff Curve (amortization loop vs closed form)")
+
+    balance, monthly_rate = 8_000.0, 21.99 / 12 / 100
+    payments = np.linspace(150.0, balance * (1 + monthly_rate), 500)
+
+    months, interest, _ = payoff_schedule(balance, monthly_rate, payments)
+    for (loop_months, loop_interest), closed_months, closed_interest in zip(
+        _loop_payoff(balance, monthly_rate, payments), months.tolist(), interest.tolist()
+    ):
+        assert loop_months == closed_months and abs(loop_interest - closed_interest) < 0.01
+
+    for count in (1, 50, 500):
+        items = payments[:count]
+        loop_total, loop_us = _time_per_item(lambda batch: _loop_payoff(balance, monthly_rate, batch), items)
+        closed_total, closed_us = _time_per_item(lambda batch: payoff_schedule(balance, monthly_rate, batch), items)
+        print(f"\n  {count:,} payment amounts")
+        print(f"    month loop  : {loop_total * 1000:9.3f} ms  ({loop_us:8.2f} us/payment)")
+        print(f"    closed form : {closed_total * 1000:9.3f} ms  ({closed_us:8.2f} us/payment)")
+        print(f"    speedup     : {loop_total / max(closed_total, 1e-9):9.2f}x")
+
+
+def _loop_multi_card_payoff(balances, monthly_rates, minimums, limits, budget, priority, weights, horizon=600):
+    """Reference per-card, per-month loop for one strategy; returns each card's payoff month"""
+    balances = list(balances)
+    count = len(balances)
+    payoff = [0 if balance <= 0 else -1 for balance in balances]
+    for month in range(1, horizon + 1):
+        if min(payoff) >= 0:
+            break
+        due = [balance + balance * rate for balance, rate in zip(balances, monthly_rates)]
+        minimum = [min(required, owed) for required, owed in zip(minimums, due)]
+        extra = budget - sum(minimum)
+        headroom = [owed - paid for owed, paid in zip(due, minimum)]
+        scores = [weights[k] * (1 + balances[k] / limits[k]) if headroom[k] > 0 else 0.0 for k in range(count)]
+        total = sum(scores)
+        share = [min(headroom[k], scores[k] * extra / total) if total > 0 else 0.0 for k in range(count)]
+        left = extra - sum(share)
+        payment = [minimum[k] + share[k] for k in range(count)]
+        for k in priority:
+            top_up = min(max(left, 0.0), headroom[k] - share[k])
+            payment[k] += top_up
+            left -= top_up
+        balances = [owed - paid if owed - paid >= 0.005 else 0.0 for owed, paid in zip(due, payment)]
+        for k in range(count):
+            if payoff[k] < 0 and balances[k] == 0:
+                payoff[k] = month
+    return payoff
+
+
+def benchmark_multi_card_payoff():
+    """Per-strategy scalar loops vs one array pass over strategies x cards per month"""
+    print_section("BENCHMARK 8: Multi-card Payoff Strategies (10 cards, 3 strategies)")
+
+    rng = np.random.default_rng(16)
+    cards = [
+        CardData(
+            card_id=f"card_{idx}",
+            institution_name="Bench Bank",
+            current_balance=float(rng.uniform(500, 6000)),
+            credit_limit=8000.0,
+            utilization_percentage=40.0,
+            minimum_payment=60.0,
+            interest_rate=float(rng.uniform(10, 30)),
+        )
+        for idx in range(10)
+    ]
+    request = MultiCardPayoffRequest(user_id="bench_user", cards=cards, monthly_budget=850.0)
+    simulator = PayoffSimulator()
+    result = simulator.compare_strategies(request)
+
+    balances = np.array([card.current_balance for card in cards])
+    aprs = np.array([card.interest_rate for card in cards])
+    rates, minimums, limits = aprs / 12 / 100, np.full(10, 60.0), np.full(10, 8000.0)
+    avalanche = np.argsort(-aprs, kind="stable")
+    priority = np.stack([avalanche, np.argsort(balances, kind="stable"), avalanche])
+    weights = np.stack([np.zeros(10), np.zeros(10), aprs / 100])
+    _, _, _, payoff = simulate_multi_card_payoff(balances, rates, minimums, limits, 850.0, priority, weights)
+
+    def scalar(_):
+        return [
+            _loop_multi_card_payoff(balances.tolist(), rates.tolist(), minimums.tolist(), limits.tolist(), 850.0,
+                                    priority[row].tolist(), weights[row].tolist())
+            for row in range(3)
+        ]
+
+    def vectorized(_):
+        return simulate_multi_card_payoff(balances, rates, minimums, limits, 850.0, priority, weights)
+
+    assert scalar(None) == payoff.tolist()
+
+    months = max(item.months_to_payoff for item in result.results)
+    loop_total, _ = _time_per_item(scalar, [None])
+    array_total, _ = _time_per_item(vectorized, [None])
+    request_total, _ = _time_per_item(lambda _: simulator.compare_strategies(request), [None])
+    print(f"\n  {months} months x 10 cards x 3 strategies")
+    print(f"    scalar loops       : {loop_total * 1000:9.3f} ms")
+    print(f"    array engine       : {array_total * 1000:9.3f} ms")
+    print(f"    full request       : {request_total * 1000:9.3f} ms")
+    print(f"    speedup (engine)   : {loop_total / max(array_total, 1e-9):9.2f}x")
+
+
+def _legacy_calculate_impact(card, payment_amount):
+    """Reference two-loop 12-month impact kept for comparison"""
+    monthly_rate = (card.interest_rate / 100 / 12) if card.interest_rate else 0.0
+    balance_with_min = card.current_balance
+    interest_with_min = 0
+    for month in range(12):
+        interest_charge = balance_with_min * monthly_rate
+        interest_with_min += interest_charge
+        balance_with_min = max(0, balance_with_min + interest_charge - card.minimum_payment)
+    balance_with_payment = max(0, card.current_balance - payment_amount)
+    interest_with_payment = 0
+    for month in range(12):
+        interest_charge = balance_with_payment * monthly_rate
+        interest_with_payment += interest_charge
+        balance_with_payment = max(0, balance_with_payment + interest_charge - card.minimum_payment)
+    new_util = ((card.current_balance - payment_amount) / card.credit_limit) * 100
+    return ExpectedImpact(
+        interest_saved=round(max(0, interest_with_min - interest_with_payment), 2),
+        utilization_improvement=round(card.utilization_percentage - new_util, 2),
+    )
+
+
+def benchmark_payment_impact():
+    """Two 12-month loops per card vs one closed-form pass over all cards"""
+    print_section("BENCHMARK 9: Payment Impact (12-month loops vs closed form)")
+
+    rng = np.random.default_rng(17)
+    cards = []
+    for idx in range(2_000):
+        balance = float(rng.uniform(100, 9000))
+        cards.append(CardData(
+            card_id=f"card_{idx}",
+            institution_name="Bench Bank",
+            current_balance=balance,
+            credit_limit=10_000.0,
+            utilization_percentage=balance / 100,
+            minimum_payment=max(25.0, balance * 0.03),
+            interest_rate=float(rng.uniform(10, 30)),
+        ))
+    payments = [card.current_balance * 0.4 for card in cards]
+    items = list(zip(cards, payments))
+    recommender = PaymentRecommender()
+
+    def batched(batch):
+        return recommender.calculate_impacts([card for card, _ in batch], [amount for _, amount in batch])
+
+    def per_card(batch):
+        return [recommender.calculate_impact(card, amount) for card, amount in batch]
+
+    for (card, amount), impact in zip(items, batched(items)):
+        legacy = _legacy_calculate_impact(card, amount)
+        assert abs(impact.interest_saved - legacy.interest_saved) <= 0.01
+        assert impact.utilization_improvement == legacy.utilization_improvement
+
+    for count in (1, 50, 2_000):
+        batch = items[:count]
+        legacy_total, legacy_us = _time_per_item(lambda group: [_legacy_calculate_impact(*item) for item in group], batch)
+        single_total, single_us = _time_per_item(per_card, batch)
+        batch_total, batch_us = _time_per_item(batched, batch)
+        print(f"\n  {count:,} cards")
+        print(f"    12-month loops     : {legacy_total * 1000:9.3f} ms  ({legacy_us:8.2f} us/card)")
+        print(f"    closed form, 1x1   : {single_total * 1000:9.3f} ms  ({single_us:8.2f} us/card)")
+        print(f"    calculate_impacts  : {batch_total * 1000:9.3f} ms  ({batch_us:8.2f} us/card)")
+
+
+def _legacy_parse_date(value):
+    """Reference fromisoformat + strptime fallbacks kept for comparison"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        pass
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except Exception:
+            continue
+    return None
+
+
+def benchmark_date_parsing():
+    """Exception-driven fallbacks vs the per-day memo fast path, cold memo on every run"""
+    print_section("BENCHMARK 10: Transaction Date Parsing (100k mixed formats)")
+
+    rng = random.Random(19)
+    start = datetime(2025, 1, 1)
+    formats = {
+        "YYYY-MM-DD": lambda dt: dt.strftime("%Y-%m-%d"),
+        "ISO + Z": lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "ISO + offset": lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "-05:00",
+        "YYYY/MM/DD": lambda dt: dt.strftime("%Y/%m/%d"),
+    }
+    renders = list(formats.values())
+    moments = [start + timedelta(seconds=rng.randrange(400 * 86_400)) for _ in range(100_000)]
+    mixed = [renders[idx % len(renders)](moment) for idx, moment in enumerate(moments)]
+
+    def fast(batch):
+        clear_date_memo()
+        return [parse_transaction_date(value) for value in batch]
+
+    def columnar(batch):
+        clear_date_memo()
+        return epoch_days(batch)
+
+    legacy = [_legacy_parse_date(value) for value in mixed]
+    assert fast(mixed) == legacy
+    assert columnar(mixed).tolist() == [(dt.date() - datetime(1970, 1, 1).date()).days for dt in legacy]
+
+    legacy_total, legacy_us = _time_per_item(lambda batch: [_legacy_parse_date(value) for value in batch], mixed)
+    fast_total, fast_us = _time_per_item(fast, mixed)
+    columnar_total, columnar_us = _time_per_item(columnar, mixed)
+    print(f"\n  {len(mixed):,} dates, {len(formats)} formats interleaved")
+    print(f"    legacy parser      : {legacy_total * 1000:9.3f} ms  ({legacy_us:6.3f} us/date)")
+    print(f"    fast path          : {fast_total * 1000:9.3f} ms  ({fast_us:6.3f} us/date)")
+    print(f"    epoch days column  : {columnar_total * 1000:9.3f} ms  ({columnar_us:6.3f} us/date)")
+    print(f"    speedup            : {legacy_total / max(fast_total, 1e-9):9.2f}x")
+
+    for name, render in formats.items():
+        values = [render(moment) for moment in moments[:25_000]]
+        legacy_total, _ = _time_per_item(lambda batch: [_legacy_parse_date(value) for value in batch], values)
+        fast_total, fast_us = _time_per_item(fast, values)
+        print(f"    {name:<18} : {legacy_total / max(fast_total, 1e-9):6.2f}x  ({fast_us:6.3f} us/date)")
+
+
+def _synthetic_history(count, days, seed=23):
+    """Provider-like history: half bare dates, half ISO date-times, recurring merchants"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    merchants = [
+        ("groceries", "WALMART"), ("dining", "UBER EATS"), ("travel", "AIR CANADA"), ("gas", "SHELL"),
+        ("shopping", "AMAZON"), ("entertainment", "NETFLIX"), ("utilities", "HYDRO"), (None, "MISC SHOP"),
+    ]
+    transactions = []
+    for idx in range(count):
+        moment = now - timedelta(days=rng.uniform(0, days - 1))
+        category, description = rng.choice(merchants)
+        transactions.append(StochasticTransactionData(
+            id=f"txn_{idx}",
+            card_id=f"card_{idx % 3}",
+            date=moment.strftime("%Y-%m-%d" if idx % 2 else "%Y-%m-%dT%H:%M:%S"),
+            description=f"{description} #{rng.randrange(40)}",
+            amount=round(rng.uniform(-50, 300), 2),
+            category=category,
+            balance=round(rng.uniform(0, 5000), 2) if idx % 5 == 0 else None,
+        ))
+    return transactions
+
+
+def _legacy_filter_and_normalize(transactions, lookback_days):
+    """Reference row-at-a-time normalization kept for comparison"""
+    cutoff = datetime.utcnow() - timedelta(days=lookback_days)
+    rows = []
+    for txn in transactions:
+        date = _legacy_parse_date(txn.date)
+        if date is None or date < cutoff:
+            continue
+        category = infer_shared_category(
+            raw_category=txn.category,
+            description=txn.description,
+            merchant_name=txn.merchant_name,
+        )
+        rows.append((txn.card_id, date, txn.amount, category, txn.balance))
+    return TransactionFrame.from_rows(rows)
+
+
+def benchmark_forecast_insights():
+    """Row-at-a-time normalization vs column-at-a-time, and the forecast-insights endpoint end to end"""
+    print_section("BENCHMARK 11: Forecast Insights (730-day history, 5k transactions)")
+
+    transactions = _synthetic_history(5_000, 730)
+    planner = StochasticPlanner()
+
+    legacy = _legacy_filter_and_normalize(transactions, 730)
+    frame = planner._filter_and_normalize_transactions(transactions, 730)
+    assert np.array_equal(frame.dates, legacy.dates)
+    assert np.array_equal(frame.amounts, legacy.amounts)
+    assert np.array_equal(frame.balances, legacy.balances, equal_nan=True)
+    assert [frame.category_at(i) for i in range(len(frame))] == [legacy.category_at(i) for i in range(len(legacy))]
+    assert [frame.card_ids[code] for code in frame.card_codes] == [legacy.card_ids[code] for code in legacy.card_codes]
+
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    requests = {
+        "month to date": ForecastInsightsRequest(
+            user_id="bench_user", transactions=transactions, start_date=f"{today[:8]}01", end_date=today, current_date=today,
+        ),
+        "past quarter": ForecastInsightsRequest(
+            user_id="bench_user",
+            transactions=transactions,
+            start_date=(datetime.utcnow() - timedelta(days=120)).strftime("%Y-%m-%d"),
+            end_date=(datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%d"),
+            current_date=today,
+        ),
+    }
+
+    legacy_total, legacy_us = _time_per_item(lambda batch: _legacy_filter_and_normalize(batch, 730), transactions)
+    frame_total, frame_us = _time_per_item(lambda batch: planner._filter_and_normalize_transactions(batch, 730), transactions)
+    print(f"\n  {len(transactions):,} transactions, {len(frame):,} in window")
+    print(f"    row normalization  : {legacy_total * 1000:9.3f} ms  ({legacy_us:6.3f} us/txn)")
+    print(f"    column normalize   : {frame_total * 1000:9.3f} ms  ({frame_us:6.3f} us/txn)")
+    print(f"    speedup            : {legacy_total / max(frame_total, 1e-9):9.2f}x")
+    for name, request in requests.items():
+        total, _ = _time_per_item(lambda batch: [planner.build_forecast_insights(item) for item in batch], [request])
+        print(f"    {name:<19}: {total * 1000:9.3f} ms  (full endpoint)")
+
+
+def benchmark_response_serialization():
+    """FastAPI's response_model validate-and-encode vs one pre-rendered encode, 200-item card-choice batch"""
+    print_section("BENCHMARK 12: Card-Choice Batch Response Serialization (200 items)")
+
+    request = _synthetic_card_choice_batch(200)
+    planner = StochasticPlanner(sharder=CardChoiceSharder(workers=0))
+    response = planner.choose_cards_for_batch(request, offers=_sample_card_offers())
+    field = create_model_field(name="Response_card_choice_batch", type_=CardChoiceBatchResponse, mode="serialization")
+
+    def fastapi_default(responses):
+        for item in responses:
+            asyncio.run(serialize_response(field=field, response_content=item, is_coroutine=True, dump_json=True))
+
+    def rendered(responses):
+        for item in responses:
+            RenderedJSON.of(item)
+
+    expected = asyncio.run(serialize_response(field=field, response_content=response, is_coroutine=True, dump_json=True))
+    assert json.loads(expected) == json.loads(RenderedJSON.of(response).body)
+
+    responses = [response] * 20
+    default_total, default_us = _time_per_item(fastapi_default, responses)
+    rendered_total, rendered_us = _time_per_item(rendered, responses)
+    print(f"\n  {len(response.results)} items, {len(expected) / 1024:,.0f} KiB of JSON")
+    print(f"    validate + encode : {default_us / 1000:9.3f} ms/response")
+    print(f"    rendered once     : {rendered_us / 1000:9.3f} ms/response")
+    print(f"    speedup           : {default_total / max(rendered_total, 1e-9):9.2f}x")
+
+
+def _transaction_columns(transactions, dictionary_columns=()):
+    """Columnar payload for a row list; `dictionary_columns` are sent dictionary-encoded"""
+    columns = {
+        "ids": [txn.id for txn in transactions],
+        "card_ids": [txn.card_id for txn in transactions],
+        "dates": [txn.date for txn in transactions],
+        "descriptions": [txn.description for txn in transactions],
+        "amounts": [txn.amount for txn in transactions],
+        "categories": [txn.category for txn in transactions],
+        "merchant_names": [txn.merchant_name for txn in transactions],
+        "balances": [txn.balance for txn in transactions],
+    }
+    for name in dictionary_columns:
+        values = list(dict.fromkeys(columns[name]))
+        positions = {value: code for code, value in enumerate(values)}
+        columns[name] = {"values": values, "codes": [positions[value] for value in columns[name]]}
+    return columns
+
+
+def benchmark_columnar_payload():
+    """Row-oriented vs column-oriented transaction payloads: request validation and history normalization"""
+    print_section("BENCHMARK 13: Columnar Transaction Payload (5k transactions)")
+
+    transactions = _synthetic_history(5_000, 730)
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    envelope = {"user_id": "bench_user", "start_date": f"{today[:4]}-01-01", "end_date": today, "current_date": today}
+    payloads = {
+        "rows": [txn.model_dump() for txn in transactions],
+        "columns": _transaction_columns(transactions),
+        "columns + dicts": _transaction_columns(
+            transactions, dictionary_columns=("card_ids", "dates", "descriptions", "categories", "merchant_names")
+        ),
+    }
+    bodies = {name: json.dumps({**envelope, "transactions": payload}) for name, payload in payloads.items()}
+    planner = StochasticPlanner()
+
+    with evaluation_context():
+        expected = None
+        for name, body in bodies.items():
+            request = ForecastInsightsRequest.model_validate_json(body)
+            result = planner.build_forecast_insights(request).model_dump(exclude={"computed_at"})
+            assert expected is None or result == expected
+            expected = result
+
+        print(f"\n  {len(transactions):,} transactions")
+        for name, body in bodies.items():
+            request = ForecastInsightsRequest.model_validate_json(body)
+            validate_total, _ = _time_per_item(
+                lambda batch: [ForecastInsightsRequest.model_validate_json(item) for item in batch], [body]
+            )
+            normalize_total, _ = _time_per_item(
+                lambda batch: [planner._normalize_history(item.transactions, 730) for item in batch], [request]
+            )
+            print(
+                f"    {name:<16}: {len(body) / 1024:7,.0f} KiB   validate {validate_total * 1000:7.3f} ms"
+                f"   normalize {normalize_total * 1000:7.3f} ms"
+            )
+
+
+def main():
+    """Run all benchmarks"""
+    print("\n" + "╔" + "═" * 68 + "╗")
+    print("║" + " " * 14 + "CREDIT INTELLIGENCE SERVICE - BENCHMARKS" + " " * 14 + "║")
+    print("╚" + "═" * 68 + "╝")
+
+    benchmark_category_inference()
+    benchmark_category_inference_cache()
+    benchmark_offer_ranking()
+    benchmark_transaction_frame()
+    benchmark_card_choice_sharding()
+    benchmark_q_values()
+    benchmark_payoff_curve()
+    benchmark_multi_card_payoff()
+    benchmark_payment_impact()
+    benchmark_date_parsing()
+    benchmark_forecast_insights()
+    benchmark_response_serialization()
+    benchmark_columnar_payload()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ Uses Pydantic Settings for environment variable management
 """
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -28,6 +28,49 @@ class Settings(BaseSettings):
     NEXT_PUBLIC_SUPABASE_URL: Optional[str] = None
     SUPABASE_SERVICE_ROLE_KEY: Optional[str] = None
     NEXT_PUBLIC_SUPABASE_ANON_KEY: Optional[str] = None
+
+    # Reward catalog cache (stale-while-revalidate)
+    REWARD_CATALOG_TTL_SECONDS: float = 900.0
+    REWARD_CATALOG_TIMEOUT_SECONDS: float = 8.0
+    REWARD_CATALOG_RETRY_BASE_SECONDS: float = 5.0
+    REWARD_CATALOG_RETRY_MAX_SECONDS: float = 300.0
+    REWARD_CATALOG_MAX_CONNECTIONS: int = 10
+
+    # Memoized category inferences (0 disables the cache)
+    CATEGORY_INFERENCE_CACHE_SIZE: int = 8192
+
+    # Markov category transitions: larger category spaces use a sparse matrix
+    MARKOV_DENSE_MAX_STATES: int = 48
+    MARKOV_CHAIN_CACHE_SIZE: int = 256
+
+    # Incremental per-user stochastic state (SQLite file, created on first use)
+    STOCHASTIC_STATE_PATH: str = "./data/stochastic_state.sqlite3"
+
+    # CPU-bound handler execution: "inline" (event loop), "thread" or "process" pool
+    COMPUTE_EXECUTOR_MODE: Literal["inline", "thread", "process"] = "thread"
+    COMPUTE_MAX_WORKERS: int = 4
+    # Concurrent computations per endpoint; further requests wait in a queue
+    COMPUTE_ENDPOINT_CONCURRENCY: int = 4
+    # Per-endpoint overrides as JSON, e.g. {"/card-choice-batch": 2}
+    COMPUTE_ENDPOINT_LIMITS: Dict[str, int] = {}
+    # Render cached planner responses to JSON in the worker and skip FastAPI's response_model re-validation
+    FAST_JSON_RESPONSES: bool = False
+
+    # Card-choice batches at least this long are split across this many worker processes (<2 disables)
+    CARD_CHOICE_SHARD_WORKERS: int = 0
+    CARD_CHOICE_SHARD_MIN_TRANSACTIONS: int = 128
+
+    # Card-choice policy: "one_step" lookahead, or "value_iteration" over the full MDP
+    CARD_CHOICE_POLICY: Literal["one_step", "value_iteration"] = "one_step"
+    MDP_GAMMA: float = 0.9
+    MDP_TOLERANCE: float = 1e-6
+    MDP_MAX_ITERATIONS: int = 1000
+    # The MDP state grows 9x per card; users with more cards fall back to one_step
+    MDP_MAX_CARDS: int = 3
+    MDP_POLICY_CACHE_SIZE: int = 1024
+
+    # Finished planner responses kept for repeat requests (0 keeps none; ETag / 304 still apply)
+    RESPONSE_CACHE_SIZE: int = 512
     
     # Database (if needed for caching)
     # DATABASE_URL: str = ""
@@ -0,0 +1,121 @@
+"""
+Evaluation Context
+- One clock reading per request, shared by every service the request touches
+- Due-date strings parsed once per request; repeated lookups (sort keys, per-bucket scoring) hit a dict
+- Request-scoped through contextvars, so concurrent requests on threads or event-loop tasks stay separate
+"""
+
+from __future__ import annotations
+
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+_current: ContextVar[Optional["EvaluationContext"]] = ContextVar("evaluation_context", default=None)
+
+
+def parse_naive_datetime(value: Optional[str]) -> Optional[datetime]:
+    """ISO 8601 (offset dropped) or YYYY-MM-DD / YYYY/MM/DD, as a naive datetime; None when unparseable."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        pass
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except Exception:
+            continue
+    return None
+
+
+class EvaluationContext:
+    """
+    Clock and due-date cache for one request.
+
+    `now` (local) and `utc_now` are the same instant. The two day counts
+    keep the services' existing conventions: `days_until_due` compares
+    against local time and yields None for strings with a UTC offset
+    (the analyzer, recommender and transaction insights), while
+    `days_until_due_utc` drops the offset and compares against UTC (the
+    stochastic planner).
+    """
+
+    def __init__(self, timestamp: Optional[float] = None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.now = datetime.fromtimestamp(self.timestamp)
+        self.utc_now = datetime.utcfromtimestamp(self.timestamp)
+        self._local_days: Dict[str, Optional[int]] = {}
+        self._utc_days: Dict[str, Optional[int]] = {}
+
+    def days_until_due(self, due_date_str: Optional[str]) -> Optional[int]:
+        if not due_date_str:
+            return None
+        try:
+            return self._local_days[due_date_str]
+        except KeyError:
+            pass
+        try:
+            days = (datetime.fromisoformat(due_date_str.replace("Z", "+00:00")) - self.now).days
+        except Exception:
+            # Unparseable, or an offset-aware date against the naive local clock.
+            days = None
+        self._local_days[due_date_str] = days
+        return days
+
+    def days_until_due_utc(self, due_date_str: Optional[str]) -> Optional[int]:
+        if not due_date_str:
+            return None
+        try:
+            return self._utc_days[due_date_str]
+        except KeyError:
+            pass
+        due_date = parse_naive_datetime(due_date_str)
+        days = None if due_date is None else (due_date - self.utc_now).days
+        self._utc_days[due_date_str] = days
+        return days
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"local_due_dates": len(self._local_days), "utc_due_dates": len(self._utc_days)}
+
+
+def current_evaluation_context() -> EvaluationContext:
+    """The active request's context; outside a request, a fresh one (one clock reading per call)."""
+    context = _current.get()
+    return context if context is not None else EvaluationContext()
+
+
+@contextmanager
+def evaluation_context(timestamp: Optional[float] = None) -> Iterator[EvaluationContext]:
+    """
+    Activate a context for the enclosed calls. Nested scopes reuse the
+    outer one, so a service calling another shares its clock; a
+    `timestamp` only applies when no context is active yet.
+    """
+    context = _current.get()
+    if context is not None:
+        yield context
+        return
+    context = EvaluationContext(timestamp)
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def evaluation_scope(method: F) -> F:
+    """Run a service entry point inside `evaluation_context()`."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with evaluation_context():
+            return method(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
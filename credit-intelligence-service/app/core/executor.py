@@ -0,0 +1,287 @@
+"""
+Compute Executor
+- Runs CPU-bound service calls off the event loop in a thread or process pool
+- Per-endpoint concurrency limits with queue-depth and latency metrics
+- Process workers receive requests as JSON and send responses back as JSON
+- Process workers follow the parent's taxonomy reloads (generation sent with each task)
+- Optionally renders responses to JSON in the worker (see app/core/serialization.py)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.serialization import RenderedJSON
+from app.services.category_taxonomy import sync_taxonomy, taxonomy_generation
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+ResponseT = TypeVar("ResponseT")
+
+# Worker-process copy of the last reward catalog it received, keyed by the
+# parent's catalog key so an unchanged catalog is parsed once per worker.
+_worker_offers: Tuple[Optional[int], List[Dict[str, Any]]] = (None, [])
+
+
+def _run_serialized(
+    task: Callable[..., Any],
+    request_type: Type[BaseModel],
+    request_json: str,
+    offers_key: Optional[int],
+    offers_json: Optional[str],
+    taxonomy_gen: int,
+) -> Tuple[Type[BaseModel], str]:
+    """Process-pool entry point: rebuild the request, run the task, return the response as JSON."""
+    global _worker_offers
+    # Workers keep the taxonomy they loaded at spawn; catch up with reloads done in the parent.
+    sync_taxonomy(taxonomy_gen)
+    kwargs: Dict[str, Any] = {}
+    if offers_key is not None:
+        if _worker_offers[0] != offers_key:
+            _worker_offers = (offers_key, json.loads(offers_json))
+        kwargs["offers"] = _worker_offers[1]
+
+    result = task(request_type.model_validate_json(request_json), **kwargs)
+    return type(result), result.model_dump_json()
+
+
+def _run_rendered(task: Callable[..., Any], request: BaseModel, **kwargs: Any) -> RenderedJSON:
+    """Thread-pool entry point for rendered calls: encode on the worker thread, not the event loop."""
+    return RenderedJSON.of(task(request, **kwargs))
+
+
+class _EndpointGate:
+    """Concurrency limit and counters for one endpoint."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives bind to the loop they first wait on.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 3) if finished else 0.0,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 3) if finished else 0.0,
+        }
+
+
+class ComputeExecutor:
+    """
+    Runs synchronous service calls for async handlers.
+
+    `inline` calls the task on the event loop (the original behavior),
+    `thread` uses a thread pool and `process` a process pool. Tasks must be
+    module-level functions taking a Pydantic request (plus an optional
+    `offers` catalog) and returning a Pydantic response, so process workers
+    can import them by name; requests and responses cross the process
+    boundary as JSON rather than pickled model trees.
+
+    With `render=True` a call returns a `RenderedJSON` body instead of the
+    model. `respond` renders when `fast_json` is set, for route handlers
+    that hand the body straight to FastAPI.
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 4,
+        default_limit: int = 4,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        fast_json: bool = False,
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}; expected one of {', '.join(EXECUTOR_MODES)}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.default_limit = max(1, default_limit)
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.fast_json = fast_json
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        self._gates: Dict[str, _EndpointGate] = {}
+        self._offers_payload: Tuple[Optional[List[Dict[str, Any]]], int, str] = (None, 0, "[]")
+        self._offers_keys = itertools.count(1)
+
+    @classmethod
+    def from_settings(cls) -> "ComputeExecutor":
+        return cls(
+            mode=settings.COMPUTE_EXECUTOR_MODE,
+            max_workers=settings.COMPUTE_MAX_WORKERS,
+            default_limit=settings.COMPUTE_ENDPOINT_CONCURRENCY,
+            endpoint_limits=settings.COMPUTE_ENDPOINT_LIMITS,
+            fast_json=settings.FAST_JSON_RESPONSES,
+        )
+
+    async def run(
+        self,
+        endpoint: str,
+        task: Callable[..., ResponseT],
+        request: BaseModel,
+        offers: Optional[List[Dict[str, Any]]] = None,
+        render: bool = False,
+    ) -> Any:
+        """
+        Run `task(request[, offers=offers])` under the endpoint's concurrency
+        limit. Returns the response model, or its `RenderedJSON` when `render`.
+        """
+        gate = self._gate(endpoint)
+        semaphore = gate.semaphore()
+
+        gate.queued += 1
+        gate.max_queued = max(gate.max_queued, gate.queued)
+        enqueued = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            gate.queued -= 1
+
+        started = time.perf_counter()
+        gate.wait_seconds += started - enqueued
+        gate.in_flight += 1
+        try:
+            result = await self._dispatch(task, request, offers, render)
+        except BaseException:
+            gate.failed += 1
+            raise
+        else:
+            gate.completed += 1
+            return result
+        finally:
+            gate.in_flight -= 1
+            gate.run_seconds += time.perf_counter() - started
+            semaphore.release()
+
+    async def _dispatch(
+        self,
+        task: Callable[..., ResponseT],
+        request: BaseModel,
+        offers: Optional[List[Dict[str, Any]]],
+        render: bool,
+    ) -> Any:
+        kwargs = {} if offers is None else {"offers": offers}
+        if self.mode == "inline":
+            return _run_rendered(task, request, **kwargs) if render else task(request, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            call = functools.partial(_run_rendered, task) if render else task
+            return await loop.run_in_executor(self._get_pool(), functools.partial(call, request, **kwargs))
+
+        offers_key, offers_json = self._serialized_offers(offers)
+        try:
+            response_type, response_json = await loop.run_in_executor(
+                self._get_pool(),
+                _run_serialized,
+                task,
+                type(request),
+                request.model_dump_json(),
+                offers_key,
+                offers_json,
+                taxonomy_generation(),
+            )
+        except BrokenProcessPool:
+            # A crashed worker poisons the whole pool; start a fresh one for the next call.
+            self._discard_pool()
+            raise
+        if render:
+            # The worker's JSON is the body; no model is rebuilt in this process.
+            return RenderedJSON(response_json.encode())
+        return response_type.model_validate_json(response_json)
+
+    async def respond(
+        self,
+        endpoint: str,
+        task: Callable[..., ResponseT],
+        request: BaseModel,
+        offers: Optional[List[Dict[str, Any]]] = None,
+    ) -> Any:
+        """`run` for route handlers: the response model, or a `RenderedJSON` body when `fast_json` is on."""
+        return await self.run(endpoint, task, request, offers=offers, render=self.fast_json)
+
+    def _serialized_offers(self, offers: Optional[List[Dict[str, Any]]]) -> Tuple[Optional[int], Optional[str]]:
+        """Catalog JSON, encoded once per catalog list rather than once per request."""
+        if offers is None:
+            return None, None
+        cached_offers, key, payload = self._offers_payload
+        if cached_offers is not offers:
+            key, payload = next(self._offers_keys), json.dumps(offers, default=str)
+            self._offers_payload = (offers, key, payload)
+        return key, payload
+
+    def _gate(self, endpoint: str) -> _EndpointGate:
+        gate = self._gates.get(endpoint)
+        if gate is None:
+            gate = _EndpointGate(self.endpoint_limits.get(endpoint, self.default_limit))
+            self._gates[endpoint] = gate
+        return gate
+
+    def _get_pool(self) -> Executor:
+        with self._pool_lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    # spawn: forking a process that holds event-loop, HTTP and SQLite state is unsafe.
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compute")
+            return self._pool
+
+    def _discard_pool(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "fast_json": self.fast_json,
+            "pool_started": self._pool is not None,
+            "endpoints": {endpoint: gate.stats() for endpoint, gate in sorted(self._gates.items())},
+        }
+
+
+compute_executor = ComputeExecutor.from_settings()
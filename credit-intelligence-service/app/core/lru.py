@@ -0,0 +1,119 @@
+"""
+Bounded LRU
+- The one thread-safe, size-bounded LRU behind the service's memo caches
+  (category inference, Markov chains, card policies, responses)
+- Same counters and `info()` shape everywhere: hits, misses, evictions, invalidations
+- A generation counter keeps values computed before a `clear()` from being stored after it
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+
+class BoundedLRU(Generic[K, V]):
+    """
+    Thread-safe LRU holding at most `maxsize` entries; `maxsize=0` stores nothing.
+
+    Lookups count a hit or a miss. Entries pushed out by size count as
+    evictions; entries dropped because they went stale (`is_current`
+    rejected them, or `pop`) count as invalidations. Computations run
+    outside the lock, so concurrent misses on one key may compute twice.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Incremented by `clear()`; pass it to `put` to drop values computed before a clear."""
+        return self._generation
+
+    def get(
+        self,
+        key: K,
+        default: Optional[V] = None,
+        is_current: Optional[Callable[[V], bool]] = None,
+    ) -> Optional[V]:
+        """Cached value (marked most recent), or `default`; entries failing `is_current` are dropped."""
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING and is_current is not None and not is_current(value):
+                del self._entries[key]
+                self.invalidations += 1
+                value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V, generation: Optional[int] = None) -> None:
+        """Store `value`, evicting the least recently used entries beyond `maxsize`."""
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        key: K,
+        compute: Callable[[], V],
+        is_current: Optional[Callable[[V], bool]] = None,
+    ) -> V:
+        generation = self._generation
+        value = self.get(key, _MISSING, is_current)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        self.put(key, value, generation)
+        return value
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.invalidations += 1
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
@@ -0,0 +1,115 @@
+"""
+Response Cache
+- Finished responses keyed by a canonical hash of the request body, the endpoint,
+  the reward catalog version (catalog-backed endpoints only), the taxonomy
+  generation and the calendar day (results depend on the clock)
+- Built on the shared BoundedLRU, plus a 304 counter
+- The key doubles as a weak ETag, so callers re-posting the same body revalidate
+  with If-None-Match and get an empty 304 while the entry is still cached
+- Rendered JSON bodies (FAST_JSON_RESPONSES) are stored encoded, so a hit costs no serialization
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar, Union
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.evaluation import current_evaluation_context
+from app.core.lru import BoundedLRU
+from app.core.serialization import RenderedJSON
+from app.services.category_taxonomy import taxonomy_generation
+
+ResponseT = TypeVar("ResponseT", BaseModel, RenderedJSON)
+
+
+def request_digest(endpoint: str, request: BaseModel, catalog_version: int = 0) -> str:
+    """
+    sha256 over the endpoint, catalog version, taxonomy generation, today's
+    local and UTC dates and the request body as sorted-key JSON, so field or
+    dict-key order never changes the key.
+    """
+    context = current_evaluation_context()
+    body = json.dumps(request.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256()
+    digest.update(
+        f"{endpoint}\0{catalog_version}\0{taxonomy_generation()}\0"
+        f"{context.now.date().isoformat()}\0{context.utc_now.date().isoformat()}\0".encode()
+    )
+    digest.update(body.encode())
+    return digest.hexdigest()
+
+
+def etag_for(key: str) -> str:
+    # Weak: a recomputation for the same key is equivalent, not byte-identical (timestamps).
+    return f'W/"{key}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # No "*": on these POST routes it would vouch for a body that was never computed.
+    opaque = etag[2:]
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class ResponseCache(BoundedLRU[str, Union[BaseModel, RenderedJSON]]):
+    """
+    Bounded LRU of finished responses.
+
+    A matching If-None-Match gets a 304 only while the entry is cached, so
+    a 304 always stands for a body this process computed; `maxsize=0`
+    stores nothing and never answers 304. Only successful results are
+    stored; exceptions propagate untouched.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.not_modified = 0
+
+    @classmethod
+    def from_settings(cls) -> "ResponseCache":
+        return cls(settings.RESPONSE_CACHE_SIZE)
+
+    async def serve(
+        self,
+        endpoint: str,
+        request: BaseModel,
+        http_request: Request,
+        http_response: Response,
+        compute: Callable[[], Awaitable[ResponseT]],
+        catalog_version: int = 0,
+    ) -> Union[BaseModel, Response]:
+        """
+        Answer from the cache (or with a 304 for a cached entry) when possible,
+        otherwise await `compute()` and store its result. Sets the ETag header
+        either way; a `RenderedJSON` result is returned as a finished Response.
+        Endpoints that read the reward catalog pass its `catalog_version`.
+        """
+        key = request_digest(endpoint, request, catalog_version)
+        etag = etag_for(key)
+        generation = self.generation
+        result = self.get(key)
+        if result is not None and _matches(http_request.headers.get("if-none-match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if result is None:
+            result = await compute()
+            self.put(key, result, generation)
+        if isinstance(result, RenderedJSON):
+            return result.response(headers={"ETag": etag})
+        http_response.headers["ETag"] = etag
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        # 304s are hits too; `not_modified` counts the subset answered without a body.
+        return {**super().info(), "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache.from_settings()
@@ -0,0 +1,30 @@
+"""
+Rendered JSON Responses
+- Opt-in fast path (FAST_JSON_RESPONSES): a result is encoded once, in the compute
+  worker, by pydantic-core's Rust encoder and handed to FastAPI as a finished body
+- FastAPI then neither re-validates it against `response_model` nor encodes it again
+- Process workers' JSON is passed through as-is instead of being rebuilt into models
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+from pydantic_core import to_json
+
+
+@dataclass(frozen=True)
+class RenderedJSON:
+    """An encoded response body; `response()` wraps it in a fresh Response per request."""
+
+    body: bytes
+
+    @classmethod
+    def of(cls, value: Any) -> "RenderedJSON":
+        """Encode a Pydantic model, dataclass or plain JSON-compatible value."""
+        return cls(to_json(value))
+
+    def response(self, headers: Optional[Mapping[str, str]] = None) -> Response:
+        return Response(content=self.body, media_type="application/json", headers=headers)
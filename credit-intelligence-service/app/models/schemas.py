@@ -2,8 +2,8 @@
 Pydantic Models - Request/Response Schemas
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import Any, List, Optional, Literal, Dict
+from pydantic import BaseModel, Field, model_validator, validator
+from typing import Any, List, Optional, Literal, Dict, Tuple, Union
 from datetime import datetime
 
 
@@ -54,7 +54,7 @@ class PaymentRecommendationRequest(BaseModel):
     user_id: str
     cards: List[CardData]
     available_amount: float = Field(gt=0)
-    optimization_goal: Literal["minimize_interest", "balanced", "minimize_balance"] = "balanced"
+    optimization_goal: Literal["minimize_interest", "balanced", "minimize_balance", "optimal"] = "balanced"
 
 
 class ExpectedImpact(BaseModel):
@@ -85,6 +85,8 @@ class PaymentRecommendationResponse(BaseModel):
     recommendations: List[PaymentRecommendation]
     strategy: str
     projected_savings: ProjectedSavings
+    # 12-month projected interest plus utilization penalty after these payments; lower is better.
+    objective_value: float
 
 
 # ==================== PAYOFF SIMULATION ====================
@@ -96,21 +98,67 @@ class PayoffSimulationRequest(BaseModel):
     interest_rate: float = Field(ge=0)
     minimum_payment: float = Field(gt=0)
     extra_payment: float = Field(ge=0)
+    # When set, the minimum is recomputed monthly as max(minimum_payment, percent of the balance).
+    minimum_payment_percent: Optional[float] = Field(default=None, gt=0, le=100)
+    # Fixed monthly payments, evenly spaced from minimum_payment to a one-month payoff.
+    curve_points: int = Field(default=0, ge=0, le=1000)
 
 
 class PayoffScenario(BaseModel):
     """Single payoff scenario"""
     payment_amount: float
-    months_to_payoff: int
+    months_to_payoff: Optional[int] = None  # None when the balance is not paid off within the horizon
     total_interest_paid: float
     total_amount_paid: float
-    payoff_date: str
+    payoff_date: Optional[str] = None
+    pays_off: bool = True
+
+
+class PayoffCurvePoint(BaseModel):
+    """Payoff time and cost for one fixed monthly payment"""
+    payment_amount: float
+    months_to_payoff: Optional[int] = None
+    total_interest_paid: float
 
 
 class PayoffSimulationResponse(BaseModel):
     """Response with payoff scenarios"""
     card_id: str
     scenarios: List[PayoffScenario]
+    curve: List[PayoffCurvePoint] = Field(default_factory=list)
+    horizon_months: int
+
+
+class MultiCardPayoffRequest(BaseModel):
+    """Request to compare multi-card payoff strategies under a recurring monthly budget"""
+    user_id: str
+    cards: List[CardData] = Field(min_length=1)
+    monthly_budget: float = Field(gt=0)
+    strategies: List[Literal["avalanche", "snowball", "balanced"]] = Field(
+        default_factory=lambda: ["avalanche", "snowball", "balanced"], min_length=1
+    )
+
+
+class StrategyPayoffResult(BaseModel):
+    """Month-by-month outcome of one payoff strategy"""
+    strategy: str
+    pays_off: bool
+    months_to_payoff: Optional[int] = None
+    total_interest_paid: float
+    total_amount_paid: float
+    card_payoff_months: Dict[str, Optional[int]]
+    # End-of-month balances, month 1 first.
+    card_balances: Dict[str, List[float]]
+    total_balance: List[float]
+
+
+class MultiCardPayoffResponse(BaseModel):
+    """Response comparing multi-card payoff strategies"""
+    user_id: str
+    monthly_budget: float
+    horizon_months: int
+    results: List[StrategyPayoffResult]
+    lowest_interest_strategy: str
 
 
 # ==================== TRANSACTION INSIGHTS ====================
@@ -137,6 +185,70 @@ class StochasticTransactionData(BaseModel):
     balance: Optional[float] = None
 
 
+class DictionaryColumn(BaseModel):
+    """Dictionary-encoded string column: each entry of `codes` indexes `values`"""
+    values: List[Optional[str]]
+    codes: List[int]
+
+    def decode(self) -> List[Optional[str]]:
+        if self.codes and (min(self.codes) < 0 or max(self.codes) >= len(self.values)):
+            raise ValueError(f"dictionary codes must index {len(self.values)} values")
+        return list(map(self.values.__getitem__, self.codes))
+
+
+class StochasticTransactionColumns(BaseModel):
+    """
+    Column-oriented StochasticTransactionData: parallel arrays, one entry per
+    transaction. Any string column may be sent dictionary-encoded; it is
+    decoded during validation, so the fields always hold plain lists.
+    Omitted optional columns mean None for every transaction.
+    """
+    ids: Union[List[str], DictionaryColumn]
+    card_ids: Union[List[str], DictionaryColumn]
+    dates: Union[List[str], DictionaryColumn]
+    descriptions: Union[List[str], DictionaryColumn]
+    amounts: List[float]
+    categories: Optional[Union[List[Optional[str]], DictionaryColumn]] = None
+    merchant_names: Optional[Union[List[Optional[str]], DictionaryColumn]] = None
+    balances: Optional[List[Optional[float]]] = None
+
+    @model_validator(mode="after")
+    def _decode_and_check_lengths(self) -> "StochasticTransactionColumns":
+        size = len(self.amounts)
+        for name in ("ids", "card_ids", "dates", "descriptions", "categories", "merchant_names", "balances"):
+            column = getattr(self, name)
+            if isinstance(column, DictionaryColumn):
+                decoded = column.decode()
+                if name in ("ids", "card_ids", "dates", "descriptions") and None in decoded:
+                    raise ValueError(f"{name} must not contain null values")
+                column = decoded
+                # Plain assignment: the model does not validate on assignment.
+                setattr(self, name, column)
+            if column is not None and len(column) != size:
+                raise ValueError(f"{name} has {len(column)} entries; amounts has {size}")
+        return self
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def normalized_fields(self) -> Tuple[List[Any], ...]:
+        """(dates, categories, descriptions, merchant_names, card_ids, amounts, balances), None-filled."""
+        missing = [None] * len(self.amounts)
+        return (
+            self.dates,
+            self.categories if self.categories is not None else missing,
+            self.descriptions,
+            self.merchant_names if self.merchant_names is not None else missing,
+            self.card_ids,
+            self.amounts,
+            self.balances if self.balances is not None else missing,
+        )
+
+
+# Stochastic endpoints accept transactions as an array of rows or as one columns object.
+StochasticTransactions = Union[List[StochasticTransactionData], StochasticTransactionColumns]
+
+
 class TransactionInsightRequest(BaseModel):
     """Request for transaction-level insights"""
     user_id: str
@@ -168,9 +280,11 @@ class CategoryProbability(BaseModel):
 class SpendingProbabilityRequest(BaseModel):
     """Request for Markov-chain spending category prediction"""
     user_id: str
-    transactions: List[StochasticTransactionData]
+    transactions: StochasticTransactions
     current_category: Optional[str] = None
     lookback_days: int = Field(default=180, ge=30, le=730)
+    # "nonzero" omits zero counts (and sources with no outgoing transitions) from transition_counts
+    transition_counts_format: Literal["full", "nonzero"] = "full"
 
 
 class SpendingProbabilityResponse(BaseModel):
@@ -183,6 +297,35 @@ class SpendingProbabilityResponse(BaseModel):
     computed_at: str
 
 
+class SpendingSequenceRequest(BaseModel):
+    """Request for multi-step Markov category forecasts (next N purchases)"""
+    user_id: str
+    transactions: StochasticTransactions
+    current_category: Optional[str] = None
+    lookback_days: int = Field(default=180, ge=30, le=730)
+    steps: int = Field(default=5, ge=1, le=24)
+    # Laplace pseudo-count added to every transition cell before normalizing
+    smoothing: float = Field(default=0.0, ge=0, le=10)
+
+
+class SpendingStepForecast(BaseModel):
+    """Category distribution k purchases ahead (row of P^k)"""
+    step: int
+    probabilities: List[CategoryProbability]
+    top_category: str
+
+
+class SpendingSequenceResponse(BaseModel):
+    """Response for multi-step Markov category forecasts"""
+    user_id: str
+    current_category: str
+    steps: List[SpendingStepForecast]
+    stationary_distribution: List[CategoryProbability]
+    smoothing: float
+    history_hash: str
+    computed_at: str
+
+
 class CardDecisionCandidate(BaseModel):
     """Candidate card for merchant-level card choice (MDP action set)"""
     card_id: str
@@ -276,7 +419,7 @@ class CardChoiceBatchRequest(BaseModel):
     user_id: str
     lookback_days: int = Field(default=180, ge=30, le=730)
     cards: List[CardDecisionCandidate]
-    transactions: List[StochasticTransactionData]
+    transactions: StochasticTransactions
     recent_transactions: List[StochasticTransactionData]
 
 
@@ -299,12 +442,56 @@ class CardChoiceBatchResponse(BaseModel):
     computed_at: str
 
 
+class StateIngestRequest(BaseModel):
+    """New transactions to fold into a user's stored stochastic state."""
+    user_id: str
+    transactions: List[StochasticTransactionData]
+    # Credit limits used to bucket balances; cards omitted here keep their last known limit.
+    card_limits: Dict[str, float] = Field(default_factory=dict)
+    # Cursor returned by the previous ingest; when set, a stale cursor is rejected instead of applied.
+    cursor: Optional[str] = None
+
+
+class StateIngestResponse(BaseModel):
+    """Result of applying a transaction delta to stored state."""
+    user_id: str
+    cursor: Optional[str] = None
+    last_transaction_date: Optional[str] = None
+    ingested: int
+    skipped_duplicates: int
+    skipped_late: int
+    skipped_invalid: int
+    transaction_count: int
+    computed_at: str
+
+
+class StateResetRequest(BaseModel):
+    """Drop a user's stored stochastic state (e.g. before replaying backfilled history)."""
+    user_id: str
+
+
+class StateSpendingProbabilityRequest(BaseModel):
+    """Markov next-category prediction from stored state instead of a full history payload."""
+    user_id: str
+    current_category: Optional[str] = None
+    lookback_days: int = Field(default=180, ge=30, le=730)
+    transition_counts_format: Literal["full", "nonzero"] = "full"
+
+
+class StateCardChoiceBatchRequest(BaseModel):
+    """Batched card choice from stored state; only the transactions to score are sent."""
+    user_id: str
+    lookback_days: int = Field(default=180, ge=30, le=730)
+    cards: List[CardDecisionCandidate]
+    recent_transactions: List[StochasticTransactionData]
+
+
 class NewCardOpportunitiesRequest(BaseModel):
     """Request for scenario 2: suggest external cards user does not currently own."""
     user_id: str
     lookback_days: int = Field(default=180, ge=30, le=730)
     cards: List[CardDecisionCandidate]
-    transactions: List[StochasticTransactionData]
+    transactions: StochasticTransactions
 
 
 class NewCardOpportunitiesResponse(BaseModel):
@@ -378,7 +565,7 @@ class ForecastActionPlan(BaseModel):
 
 class ForecastInsightsRequest(BaseModel):
     user_id: str
-    transactions: List[StochasticTransactionData]
+    transactions: StochasticTransactions
     start_date: str
     end_date: str
     current_date: Optional[str] = None
@@ -12,7 +12,7 @@ from app.models.schemas import (
     PaymentRecommendation,
     ExpectedImpact
 )
-from datetime import datetime
+from app.core.evaluation import current_evaluation_context, evaluation_scope
 
 
 class CreditAnalyzer:
@@ -21,6 +21,7 @@ class CreditAnalyzer:
     Uses deterministic rule-based logic.
     """
     
+    @evaluation_scope
     def analyze(self, request: AnalyzeCreditRequest) -> AnalyzeCreditResponse:
         """
         Analyze credit data and generate insights
@@ -41,7 +42,7 @@ class CreditAnalyzer:
             user_id=request.user_id,
             insights=insights,
             recommendations=recommendations,
-            analysis_timestamp=datetime.utcnow().isoformat()
+            analysis_timestamp=current_evaluation_context().utc_now.isoformat()
         )
     
     def generate_insights(self, cards: List[CardData]) -> List[CreditInsight]:
@@ -131,12 +132,7 @@ class CreditAnalyzer:
     
     def _days_until_due(self, due_date_str: str) -> Optional[int]:
         """Calculate days until payment due date. Returns None when parsing fails."""
-        try:
-            due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-            delta = due_date - datetime.now()
-            return delta.days
-        except:
-            return None
+        return current_evaluation_context().days_until_due(due_date_str)
     
     def _is_payment_overdue(self, due_date_str: str) -> bool:
         """Check if payment is overdue"""
@@ -0,0 +1,201 @@
+"""
+Card-Choice Batch Sharding
+- Scores large card-choice batches in parallel worker processes
+- The shared card-choice context is published once per request through shared memory
+- Workers score contiguous slices of the batch; results are merged back in input order
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.evaluation import current_evaluation_context, evaluation_context
+from app.models.schemas import CardChoiceBatchItem, CardDecisionCandidate, UpgradeOpportunity
+from app.services.category_taxonomy import sync_taxonomy, taxonomy_generation
+
+
+class BatchTransaction(NamedTuple):
+    """The recent-transaction fields batch scoring reads."""
+    id: str
+    card_id: Optional[str]
+    description: Optional[str]
+    category: Optional[str]
+    amount: Optional[float]
+
+
+# Worker-process copy of the request it is currently scoring, so a worker that
+# receives several slices of one request decodes the shared payload once.
+_worker_request: Tuple[Optional[str], Any, List[BatchTransaction], float] = (None, None, [], 0.0)
+
+
+def _encode_payload(context, transactions) -> bytes:
+    transitions = context.category_transitions
+    return json.dumps(
+        {
+            "evaluated_at": current_evaluation_context().timestamp,
+            "user_id": context.user_id,
+            "lookback_days": context.lookback_days,
+            "eligible_cards": [card.model_dump() for card in context.eligible_cards],
+            "category_card_spend": context.category_card_spend,
+            "transition_by_card": context.transition_by_card,
+            "upgrade_opportunities": [item.model_dump() for item in context.upgrade_opportunities],
+            "category_labels": transitions.labels if transitions is not None else None,
+            "category_transitions": transitions.dense().tolist() if transitions is not None else None,
+            "category_purchases": context.category_purchases,
+            "transactions": [
+                [txn.id, txn.card_id, txn.description, txn.category, txn.amount] for txn in transactions
+            ],
+        }
+    ).encode("utf-8")
+
+
+def _score_shard(
+    request_key: str, shm_name: str, size: int, start: int, end: int, taxonomy_gen: int
+) -> List[str]:
+    """Process-pool entry point: score transactions[start:end] of the published request."""
+    # Imported here: the planner imports this module.
+    from app.services.markov import TransitionMatrix
+    from app.services.stochastic_planner import _CardChoiceContext, stochastic_planner
+
+    global _worker_request
+    # Category normalization happens here, so follow taxonomy reloads done in the parent.
+    sync_taxonomy(taxonomy_gen)
+    if _worker_request[0] != request_key:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            payload = json.loads(bytes(shm.buf[:size]))
+        finally:
+            shm.close()
+        context = _CardChoiceContext(
+            user_id=payload["user_id"],
+            lookback_days=payload["lookback_days"],
+            eligible_cards=[CardDecisionCandidate.model_validate(card) for card in payload["eligible_cards"]],
+            category_card_spend=payload["category_card_spend"],
+            transition_by_card=payload["transition_by_card"],
+            upgrade_opportunities=[UpgradeOpportunity.model_validate(item) for item in payload["upgrade_opportunities"]],
+        )
+        if payload["category_labels"] is not None:
+            context.category_transitions = TransitionMatrix(
+                payload["category_labels"], dense=np.array(payload["category_transitions"], dtype=np.int64)
+            )
+            context.category_purchases = {
+                category: (total, count) for category, (total, count) in payload["category_purchases"].items()
+            }
+        _worker_request = (
+            request_key,
+            context,
+            [BatchTransaction(*row) for row in payload["transactions"]],
+            payload["evaluated_at"],
+        )
+
+    _, context, transactions, evaluated_at = _worker_request
+    # Due dates resolve against the parent request's clock, not the worker's.
+    with evaluation_context(evaluated_at):
+        items = stochastic_planner._score_batch_items(context, transactions[start:end])
+    return [item.model_dump_json() for item in items]
+
+
+class CardChoiceSharder:
+    """
+    Splits a card-choice batch across a process pool.
+
+    Disabled when `workers` is below 2; batches shorter than
+    `min_transactions` are scored in-process, where the pool round trip
+    would cost more than it saves.
+    """
+
+    def __init__(self, workers: int = 0, min_transactions: int = 128):
+        self.workers = max(0, workers)
+        self.min_transactions = max(2, min_transactions)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+
+    @classmethod
+    def from_settings(cls) -> "CardChoiceSharder":
+        return cls(
+            workers=settings.CARD_CHOICE_SHARD_WORKERS,
+            min_transactions=settings.CARD_CHOICE_SHARD_MIN_TRANSACTIONS,
+        )
+
+    def should_shard(self, transaction_count: int) -> bool:
+        return self.workers > 1 and transaction_count >= self.min_transactions
+
+    def score(self, context, transactions: List[Any]) -> List[CardChoiceBatchItem]:
+        """Score every transaction against `context`, returning items in input order."""
+        payload = _encode_payload(context, transactions)
+        request_key = f"{os.getpid()}:{next(self._request_ids)}"
+        shm = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+        try:
+            shm.buf[: len(payload)] = payload
+            pool = self._get_pool()
+            generation = taxonomy_generation()
+            futures = [
+                pool.submit(_score_shard, request_key, shm.name, len(payload), start, end, generation)
+                for start, end in _chunk_bounds(len(transactions), self.workers)
+            ]
+            try:
+                chunks = [future.result() for future in futures]
+            except BrokenProcessPool:
+                self._discard_pool()
+                raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return [CardChoiceBatchItem.model_validate_json(item) for chunk in chunks for item in chunk]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _discard_pool(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "min_transactions": self.min_transactions,
+            "pool_started": self._pool is not None,
+        }
+
+
+def _chunk_bounds(count: int, parts: int) -> List[Tuple[int, int]]:
+    """Contiguous [start, end) slices of near-equal size."""
+    parts = max(1, min(parts, count))
+    size, extra = divmod(count, parts)
+    bounds = []
+    start = 0
+    for part in range(parts):
+        end = start + size + (1 if part < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+card_choice_sharder = CardChoiceSharder.from_settings()
@@ -10,8 +10,12 @@ from __future__ import annotations
 import json
 import os
 import re
+from collections import deque
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.lru import BoundedLRU
 
 
 DEFAULT_OTHER_CATEGORY = "other"
@@ -86,11 +90,162 @@ def _load_shared_taxonomy() -> Dict[str, object]:
     }
 
 
+class _KeywordAutomaton:
+    """
+    Aho-Corasick automaton compiled from every taxonomy keyword.
+
+    Each state records the lowest category index (file order) of any keyword
+    ending there, so one left-to-right scan answers "which is the first category
+    with a keyword inside this text" without per-keyword substring checks.
+    """
+
+    _NO_MATCH = 1 << 30
+
+    def __init__(self, keywords_by_category: Dict[str, List[str]]):
+        self.categories: List[str] = list(keywords_by_category.keys())
+        goto: List[Dict[str, int]] = [{}]
+        best: List[int] = [self._NO_MATCH]
+        self._empty_keyword_best = self._NO_MATCH
+
+        for index, keywords in enumerate(keywords_by_category.values()):
+            for keyword in keywords:
+                if not keyword:
+                    self._empty_keyword_best = min(self._empty_keyword_best, index)
+                    continue
+                node = 0
+                for ch in keyword:
+                    nxt = goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[node][ch] = nxt
+                        goto.append({})
+                        best.append(self._NO_MATCH)
+                    node = nxt
+                best[node] = min(best[node], index)
+
+        # Resolve failure links breadth-first and fold them into a full DFA so the
+        # scan is a single dict lookup per character.
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            best[node] = min(best[node], best[fail[node]])
+            transitions = dict(delta[fail[node]])
+            transitions.update(goto[node])
+            delta[node] = transitions
+            for ch, child in goto[node].items():
+                fail[child] = delta[fail[node]].get(ch, 0)
+                queue.append(child)
+
+        self._delta = delta
+        self._best = best
+
+    def first_matches(self, text: str, raw_length: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return (first category matched inside text[:raw_length], first category matched anywhere).
+
+        A keyword ending before raw_length lies entirely inside the raw prefix,
+        which lets both precedence tiers share one scan.
+        """
+        best_raw = self._NO_MATCH
+        best_all = self._NO_MATCH
+        if text and self._empty_keyword_best < self._NO_MATCH:
+            best_all = self._empty_keyword_best
+            if raw_length > 0:
+                best_raw = self._empty_keyword_best
+
+        delta = self._delta
+        best = self._best
+        node = 0
+        for position, ch in enumerate(text):
+            node = delta[node].get(ch, 0)
+            found = best[node]
+            if found < best_all:
+                best_all = found
+            if position < raw_length:
+                if found < best_raw:
+                    best_raw = found
+                    if best_raw == 0:
+                        break
+            elif best_all == 0:
+                break
+
+        return self._category(best_raw), self._category(best_all)
+
+    def _category(self, index: int) -> Optional[str]:
+        if index >= self._NO_MATCH:
+            return None
+        return self.categories[index]
+
+
+class _CategoryInferenceCache(BoundedLRU[Tuple[Optional[str], Optional[str], Optional[str]], str]):
+    """
+    Bounded, thread-safe LRU memo for category inference.
+
+    Transaction streams repeat the same merchant strings constantly, so most
+    lookups are hits. `clear()` bumps the generation, so results computed
+    against an older taxonomy are not stored after a reload.
+    """
+
+
 _TAXONOMY = _load_shared_taxonomy()
 OTHER_CATEGORY = str(_TAXONOMY["otherCategory"])
 UNKNOWN_LABELS = set(_TAXONOMY["unknownLabels"])
 SHARED_CATEGORY_KEYWORDS: Dict[str, List[str]] = _TAXONOMY["keywords"]
 SHARED_CATEGORIES = tuple(list(SHARED_CATEGORY_KEYWORDS.keys()) + [OTHER_CATEGORY])
+_KEYWORD_MATCHER = _KeywordAutomaton(SHARED_CATEGORY_KEYWORDS)
+_INFERENCE_CACHE = _CategoryInferenceCache(settings.CATEGORY_INFERENCE_CACHE_SIZE)
+# Bumped by every reload, so results derived from an older taxonomy can be told apart.
+_TAXONOMY_GENERATION = 0
+
+
+def reload_taxonomy() -> Tuple[str, ...]:
+    """Re-read the shared taxonomy file, recompile the matcher and drop memoized inferences."""
+    global _TAXONOMY, OTHER_CATEGORY, UNKNOWN_LABELS, SHARED_CATEGORY_KEYWORDS, SHARED_CATEGORIES, _KEYWORD_MATCHER
+    global _TAXONOMY_GENERATION
+
+    taxonomy = _load_shared_taxonomy()
+    keywords: Dict[str, List[str]] = taxonomy["keywords"]
+    other_category = str(taxonomy["otherCategory"])
+    matcher = _KeywordAutomaton(keywords)
+
+    _TAXONOMY = taxonomy
+    OTHER_CATEGORY = other_category
+    UNKNOWN_LABELS = set(taxonomy["unknownLabels"])
+    SHARED_CATEGORY_KEYWORDS = keywords
+    SHARED_CATEGORIES = tuple(list(keywords.keys()) + [other_category])
+    _KEYWORD_MATCHER = matcher
+    _INFERENCE_CACHE.clear()
+    _TAXONOMY_GENERATION += 1
+    return SHARED_CATEGORIES
+
+
+def taxonomy_generation() -> int:
+    """Number of reloads since startup; part of cache keys for taxonomy-dependent results."""
+    return _TAXONOMY_GENERATION
+
+
+def sync_taxonomy(generation: int) -> None:
+    """
+    Worker-process hook: reload when the parent's taxonomy generation differs
+    from this process's, then adopt the parent's generation number.
+    """
+    global _TAXONOMY_GENERATION
+
+    if generation != _TAXONOMY_GENERATION:
+        reload_taxonomy()
+        _TAXONOMY_GENERATION = generation
+
+
+def category_inference_cache_info() -> Dict[str, int]:
+    """Hit/miss/eviction counters for the category inference memo."""
+    return _INFERENCE_CACHE.info()
+
+
+def clear_category_inference_cache() -> None:
+    _INFERENCE_CACHE.clear()
 
 
 def _to_slug(value: str) -> str:
@@ -104,6 +259,17 @@ def infer_shared_category(
     raw_category: Optional[str],
     description: Optional[str] = None,
     merchant_name: Optional[str] = None,
+) -> str:
+    return _INFERENCE_CACHE.get_or_compute(
+        (raw_category, description, merchant_name),
+        lambda: _infer_shared_category_uncached(raw_category, description, merchant_name),
+    )
+
+
+def _infer_shared_category_uncached(
+    raw_category: Optional[str],
+    description: Optional[str],
+    merchant_name: Optional[str],
 ) -> str:
     raw = (raw_category or "").strip().lower()
     source = f"{raw} {description or ''} {merchant_name or ''}".strip().lower()
@@ -114,13 +280,18 @@ def infer_shared_category(
     if raw in SHARED_CATEGORIES:
         return raw
 
-    for category, keywords in SHARED_CATEGORY_KEYWORDS.items():
-        if raw and any(keyword in raw for keyword in keywords):
-            return category
-
-    for category, keywords in SHARED_CATEGORY_KEYWORDS.items():
-        if any(keyword in source for keyword in keywords):
-            return category
+    # Raw-category hits take precedence over description/merchant hits; within
+    # each tier the first category in file order wins.
+    if source.startswith(raw):
+        raw_match, source_match = _KEYWORD_MATCHER.first_matches(source, len(raw))
+    else:
+        raw_match, _ = _KEYWORD_MATCHER.first_matches(raw, len(raw))
+        _, source_match = _KEYWORD_MATCHER.first_matches(source, 0)
+
+    if raw_match:
+        return raw_match
+    if source_match:
+        return source_match
 
     # Normalize common unknown labels into "other".
     if raw in UNKNOWN_LABELS:
@@ -0,0 +1,122 @@
+"""
+Transaction Date Parsing
+- Fast path for the formats providers send: YYYY-MM-DD, YYYY/MM/DD and ISO 8601
+  date-times with Z or +HH:MM offsets
+- Bare dates are sliced once per distinct day into a memo table (datetime + epoch day)
+- Anything off the fast path goes to `parse_naive_datetime`, which defines the result
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.evaluation import parse_naive_datetime
+
+# Marks unparseable entries in `epoch_days` / `epoch_microseconds_column` output.
+MISSING_EPOCH_DAY = np.iinfo(np.int64).min
+# Distinct 10-character prefixes kept before the day memo starts over.
+DAY_MEMO_LIMIT = 1 << 16
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_DAY_MICROSECONDS = 86_400_000_000
+_MICROSECOND = timedelta(microseconds=1)
+_UNSEEN = object()
+
+# "YYYY-MM-DD" / "YYYY/MM/DD" -> (midnight, epoch day), or None when not a valid day.
+_day_memo: Dict[str, Optional[Tuple[datetime, int]]] = {}
+
+
+def _day(prefix: str) -> Optional[Tuple[datetime, int]]:
+    entry = _day_memo.get(prefix, _UNSEEN)
+    if entry is not _UNSEEN:
+        return entry  # type: ignore[return-value]
+
+    entry = None
+    separator = prefix[4:5]
+    if (
+        len(prefix) == 10
+        and separator in ("-", "/")
+        and prefix[7] == separator
+        and prefix.isascii()
+        and (prefix[:4] + prefix[5:7] + prefix[8:]).isdigit()
+    ):
+        try:
+            day = datetime(int(prefix[:4]), int(prefix[5:7]), int(prefix[8:]))
+            entry = (day, day.toordinal() - _EPOCH_ORDINAL)
+        except ValueError:
+            pass
+
+    if len(_day_memo) >= DAY_MEMO_LIMIT:
+        _day_memo.clear()
+    _day_memo[prefix] = entry
+    return entry
+
+
+def parse_transaction_date(value: Optional[str]) -> Optional[datetime]:
+    """Naive datetime for a provider date string; same result as `parse_naive_datetime`."""
+    if not value:
+        return None
+
+    if len(value) == 10:
+        entry = _day(value)
+        if entry is not None:
+            return entry[0]
+        return parse_naive_datetime(value)
+
+    # Date-times: the C parser beats slicing in Python, and reads a trailing Z itself.
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return parse_naive_datetime(value)
+    # The offset is dropped, not applied: wall-clock time as sent.
+    return parsed if parsed.tzinfo is None else parsed.replace(tzinfo=None)
+
+
+def epoch_day(value: Optional[str]) -> Optional[int]:
+    """Days since 1970-01-01 for a provider date string, or None when unparseable."""
+    if value and len(value) == 10:
+        entry = _day(value)
+        if entry is not None:
+            return entry[1]
+    parsed = parse_transaction_date(value)
+    return None if parsed is None else parsed.toordinal() - _EPOCH_ORDINAL
+
+
+def epoch_microseconds(value: Optional[str]) -> Optional[int]:
+    """Microseconds since 1970-01-01 (wall clock, offset dropped), or None when unparseable."""
+    if value and len(value) == 10:
+        entry = _day(value)
+        if entry is not None:
+            return entry[1] * _DAY_MICROSECONDS
+    parsed = parse_transaction_date(value)
+    return None if parsed is None else (parsed - _EPOCH) // _MICROSECOND
+
+
+def epoch_microseconds_column(values: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    int64 `epoch_microseconds` for a column of date strings, parsing each
+    distinct string once; unparseable entries hold MISSING_EPOCH_DAY.
+    """
+    parsed = {}
+    for value in set(values):
+        micros = epoch_microseconds(value)
+        parsed[value] = MISSING_EPOCH_DAY if micros is None else micros
+    return np.fromiter(map(parsed.__getitem__, values), dtype=np.int64, count=len(values))
+
+
+def epoch_days(values: Iterable[Optional[str]]) -> np.ndarray:
+    """int64 epoch days for a column of date strings; unparseable entries hold MISSING_EPOCH_DAY."""
+    days = [epoch_day(value) for value in values]
+    return np.fromiter(
+        (MISSING_EPOCH_DAY if day is None else day for day in days),
+        dtype=np.int64,
+        count=len(days),
+    )
+
+
+def clear_date_memo() -> None:
+    _day_memo.clear()
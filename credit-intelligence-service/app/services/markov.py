@@ -0,0 +1,232 @@
+"""
+Markov Transition Matrix
+- Transition counts built from integer-coded states with one np.bincount
+- Dense ndarray for small category spaces, CSR arrays for large provider-extended ones
+- Multi-step and stationary distributions, memoized per transition-count digest
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.lru import BoundedLRU
+
+
+class TransitionMatrix:
+    """
+    Category-to-category transition counts over a fixed, ordered label space.
+
+    Dense matrices hold a (K, K) int64 array. Sparse matrices keep only the
+    observed pairs in CSR form (`indptr`, `indices`, `data`), which stays
+    small when provider categories push K well past the shared taxonomy.
+    """
+
+    def __init__(
+        self,
+        labels: List[str],
+        dense: Optional[np.ndarray] = None,
+        indptr: Optional[np.ndarray] = None,
+        indices: Optional[np.ndarray] = None,
+        data: Optional[np.ndarray] = None,
+    ):
+        self.labels = labels
+        self._positions = {label: idx for idx, label in enumerate(labels)}
+        self._dense = dense
+        self._indptr = indptr
+        self._indices = indices
+        self._data = data
+
+    @classmethod
+    def from_states(cls, states: np.ndarray, labels: List[str], dense_max_states: int) -> "TransitionMatrix":
+        """Count consecutive (src, dst) pairs in a sequence of label indices."""
+        size = len(labels)
+        return cls._from_flat(states[:-1] * size + states[1:], None, labels, dense_max_states)
+
+    @classmethod
+    def from_pair_counts(
+        cls,
+        src: np.ndarray,
+        dst: np.ndarray,
+        counts: np.ndarray,
+        labels: List[str],
+        dense_max_states: int,
+    ) -> "TransitionMatrix":
+        """Build from pre-aggregated (src, dst, count) triples; repeated pairs are summed."""
+        return cls._from_flat(src * len(labels) + dst, counts, labels, dense_max_states)
+
+    @classmethod
+    def _from_flat(
+        cls,
+        flat: np.ndarray,
+        weights: Optional[np.ndarray],
+        labels: List[str],
+        dense_max_states: int,
+    ) -> "TransitionMatrix":
+        size = len(labels)
+        if size <= dense_max_states:
+            dense = np.bincount(flat, weights=weights, minlength=size * size).astype(np.int64, copy=False)
+            return cls(labels, dense=dense.reshape(size, size))
+
+        # np.unique sorts the flat codes, which is row-major order, i.e. CSR order.
+        pairs, inverse = np.unique(flat, return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1), weights=weights, minlength=pairs.size)
+        rows, cols = np.divmod(pairs, size)
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        return cls(labels, indptr=indptr, indices=cols, data=counts.astype(np.int64))
+
+    @property
+    def size(self) -> int:
+        return len(self.labels)
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._dense is None
+
+    def index(self, label: str) -> int:
+        return self._positions[label]
+
+    def row(self, src: int) -> np.ndarray:
+        """Counts out of state `src` as a dense int64 vector."""
+        if self._dense is not None:
+            return self._dense[src]
+        row = np.zeros(self.size, dtype=np.int64)
+        start, end = self._indptr[src], self._indptr[src + 1]
+        row[self._indices[start:end]] = self._data[start:end]
+        return row
+
+    def dense(self) -> np.ndarray:
+        """Full (K, K) count matrix."""
+        if self._dense is not None:
+            return self._dense
+        matrix = np.zeros((self.size, self.size), dtype=np.int64)
+        rows = np.repeat(np.arange(self.size), np.diff(self._indptr))
+        matrix[rows, self._indices] = self._data
+        return matrix
+
+    def nonzero(self) -> Iterator[Tuple[int, int, int]]:
+        """Observed (src, dst, count) triples in row-major order."""
+        if self._dense is not None:
+            rows, cols = np.nonzero(self._dense)
+            counts = self._dense[rows, cols]
+        else:
+            rows = np.repeat(np.arange(self.size), np.diff(self._indptr))
+            cols, counts = self._indices, self._data
+        return zip(rows.tolist(), cols.tolist(), counts.tolist())
+
+    def to_dict(self, nonzero_only: bool = False) -> Dict[str, Dict[str, int]]:
+        """
+        Nested {src: {dst: count}} view.
+
+        The full form lists every label pair; `nonzero_only` keeps just the
+        observed transitions and drops sources with no outgoing transitions.
+        """
+        labels = self.labels
+        if nonzero_only:
+            compact: Dict[str, Dict[str, int]] = {}
+            for src, dst, count in self.nonzero():
+                compact.setdefault(labels[src], {})[labels[dst]] = count
+            return compact
+
+        return {
+            labels[src]: dict(zip(labels, counts))
+            for src, counts in enumerate(self.dense().tolist())
+        }
+
+
+@dataclass(frozen=True)
+class MarkovChain:
+    """Row-stochastic transition probabilities and their long-run distribution."""
+    labels: Tuple[str, ...]
+    probabilities: np.ndarray
+    stationary: np.ndarray
+
+    def step_distributions(self, start: int, steps: int) -> np.ndarray:
+        """
+        Category distributions for the next `steps` transitions out of `start`.
+
+        Row k-1 equals row `start` of P^k. Propagating one row vector costs a
+        vector-matrix product per step, cheaper than forming each power of P.
+        """
+        distributions = np.empty((steps, len(self.labels)), dtype=np.float64)
+        current = self.probabilities[start]
+        for step in range(steps):
+            distributions[step] = current
+            current = current @ self.probabilities
+        return distributions
+
+
+def history_digest(counts: np.ndarray, labels: List[str], smoothing: float) -> str:
+    """Stable hash of a transition history; equal counts produce equal chains."""
+    digest = hashlib.sha256()
+    digest.update("\x1f".join(labels).encode("utf-8"))
+    digest.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+    digest.update(repr(float(smoothing)).encode("ascii"))
+    return digest.hexdigest()
+
+
+def build_markov_chain(counts: np.ndarray, labels: List[str], smoothing: float = 0.0) -> MarkovChain:
+    """
+    Normalize transition counts into a Markov chain.
+
+    `smoothing` adds that pseudo-count to every cell (Laplace smoothing).
+    Rows that remain empty (unseen categories, or one seen only as the last
+    purchase) follow the observed destination mix, so they neither trap
+    probability mass nor leak it into categories the user never bought in.
+    Only a history with no transitions at all falls back to uniform.
+    """
+    weights = counts.astype(np.float64) + smoothing
+    totals = weights.sum(axis=1, keepdims=True)
+    size = len(labels)
+    observed = counts.sum(axis=0).astype(np.float64)
+    observed_total = observed.sum()
+    fallback = observed / observed_total if observed_total > 0 else np.full(size, 1.0 / max(size, 1))
+    probabilities = np.divide(
+        weights,
+        totals,
+        out=np.broadcast_to(fallback, weights.shape).copy(),
+        where=totals > 0,
+    )
+    return MarkovChain(
+        labels=tuple(labels),
+        probabilities=probabilities,
+        stationary=stationary_distribution(probabilities),
+    )
+
+
+def stationary_distribution(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Long-run category distribution pi with pi = pi P.
+
+    Uses the left eigenvector for the eigenvalue closest to 1. Chains with
+    several closed classes have no unique answer; when the eigenvector mixes
+    signs the limit of a uniform start under P^(2^n), by repeated squaring,
+    is used instead.
+    """
+    size = probabilities.shape[0]
+    if size == 0:
+        return np.zeros(0)
+
+    eigenvalues, eigenvectors = np.linalg.eig(probabilities.T)
+    vector = np.real(eigenvectors[:, int(np.argmin(np.abs(eigenvalues - 1.0)))])
+    vector = vector if vector.sum() >= 0 else -vector
+    tolerance = 1e-12 * max(float(np.abs(vector).max()), 1.0)
+    if vector.min() >= -tolerance and vector.sum() > tolerance:
+        vector = np.clip(vector, 0.0, None)
+        return vector / vector.sum()
+
+    power = probabilities
+    for _ in range(64):
+        squared = power @ power
+        if np.allclose(squared, power, atol=1e-12):
+            break
+        power = squared
+    return np.full(size, 1.0 / size) @ power
+
+
+class MarkovChainCache(BoundedLRU[str, MarkovChain]):
+    """Bounded, thread-safe LRU of MarkovChain results keyed by history digest."""
@@ -0,0 +1,212 @@
+"""
+Card-Choice MDP Solver
+- Value iteration over (purchase category x per-card utilization bucket x per-card due bucket) states
+- Factored transitions: each Bellman backup contracts one state axis at a time
+- Solved tables cached per user and recomputed when the model inputs change
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Sequence, Tuple
+
+import numpy as np
+
+from app.core.lru import BoundedLRU
+
+# 0-3 days to the payment due date, 4-7 days, and everything else (including unknown).
+DUE_BUCKETS = ("due_soon", "due_week", "later")
+
+
+@dataclass(frozen=True)
+class CardChoiceModel:
+    """
+    MDP inputs for one user's cards, K cards over C categories.
+
+    Each card's own state is a (utilization bucket, due bucket) pair, so the
+    full state is (category, card_1 state, ..., card_K state). Charging card
+    `a` with a purchase in category c moves it to `charged_buckets[a, c, u]`
+    before its observed utilization transition applies; other cards follow
+    their observed transitions. Categories follow the user's category chain
+    and due buckets advance with the average time between purchases.
+    """
+    card_ids: Tuple[str, ...]
+    categories: Tuple[str, ...]
+    category_transitions: np.ndarray  # (C, C), row-stochastic
+    utilization_transitions: np.ndarray  # (K, U, U), row-stochastic
+    charged_buckets: np.ndarray  # (K, C, U) utilization bucket right after a typical category-c purchase
+    due_transitions: np.ndarray  # (K, D, D), row-stochastic
+    rewards: np.ndarray  # (K, C, U, D) immediate reward of charging card k
+    gamma: float
+
+    def digest(self) -> str:
+        """Stable hash of every model input; equal digests solve to equal tables."""
+        digest = hashlib.sha256()
+        digest.update("\x1f".join(self.card_ids).encode("utf-8"))
+        digest.update(b"\x1e")
+        digest.update("\x1f".join(self.categories).encode("utf-8"))
+        for array in (
+            self.category_transitions,
+            self.utilization_transitions,
+            self.charged_buckets,
+            self.due_transitions,
+            self.rewards,
+        ):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        digest.update(repr(float(self.gamma)).encode("ascii"))
+        return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CardChoicePolicy:
+    """
+    Solved card-choice tables.
+
+    `q[a]` and `continuation[a]` are indexed by (category, card_1 state, ...,
+    card_K state), where a card state is `utilization_index * 3 + due_index`.
+    `continuation[a]` is the expected discounted value of the next state after
+    charging card `a`, so Q = reward + gamma * continuation.
+    """
+    card_ids: Tuple[str, ...]
+    categories: Tuple[str, ...]
+    gamma: float
+    q: np.ndarray
+    continuation: np.ndarray
+    policy: np.ndarray
+    iterations: int
+    converged: bool
+    digest: str
+
+    def state(self, category_index: int, card_states: Sequence[Tuple[int, int]]) -> Tuple[int, ...]:
+        """Table index for a category and each card's (utilization index, due index)."""
+        return (category_index,) + tuple(u * len(DUE_BUCKETS) + d for u, d in card_states)
+
+    def best_card(self, category_index: int, card_states: Sequence[Tuple[int, int]]) -> str:
+        return self.card_ids[int(self.policy[self.state(category_index, card_states)])]
+
+
+def due_bucket_index(days_to_due) -> int:
+    if days_to_due is not None and 0 <= days_to_due <= 3:
+        return 0
+    if days_to_due is not None and 4 <= days_to_due <= 7:
+        return 1
+    return 2
+
+
+def due_cycle_transitions(days_per_step: float) -> np.ndarray:
+    """
+    Due-bucket chain for a monthly statement cycle, advanced once per purchase.
+
+    The buckets span 4, 4 and about 23 days of a 31-day cycle; a bucket is
+    left with probability (days elapsed per purchase / bucket length), and
+    `due_soon` rolls over to the next cycle's `later`.
+    """
+    leave = [min(1.0, days_per_step / length) for length in (4.0, 4.0, 23.0)]
+    return np.array(
+        [
+            [1.0 - leave[0], 0.0, leave[0]],
+            [leave[1], 1.0 - leave[1], 0.0],
+            [0.0, leave[2], 1.0 - leave[2]],
+        ]
+    )
+
+
+def solve_card_choice_mdp(model: CardChoiceModel, tolerance: float, max_iterations: int) -> CardChoicePolicy:
+    """
+    Value iteration, V <- max_a [R_a + gamma * E_a V], until the largest
+    change is below `tolerance` or `max_iterations` backups have run.
+    """
+    cards = len(model.card_ids)
+    categories = len(model.categories)
+    due = len(DUE_BUCKETS)
+    utilization = model.utilization_transitions.shape[1]
+    card_states = utilization * due
+
+    # Per-card (utilization, due) transition over the flattened card state.
+    passive = np.stack(
+        [np.kron(model.utilization_transitions[k], model.due_transitions[k]) for k in range(cards)]
+    )
+    # Charged transition of each card, per purchase category: (K, C, S, S).
+    charged = np.stack(
+        [
+            np.stack(
+                [
+                    np.kron(model.utilization_transitions[k][model.charged_buckets[k, c]], model.due_transitions[k])
+                    for c in range(categories)
+                ]
+            )
+            for k in range(cards)
+        ]
+    )
+    rewards = []
+    for a in range(cards):
+        shape = [categories] + [1] * cards
+        shape[a + 1] = card_states
+        rewards.append(model.rewards[a].reshape(categories, card_states).reshape(shape))
+
+    values = np.zeros((categories,) + (card_states,) * cards)
+    q = np.empty((cards,) + values.shape)
+    continuation = np.empty_like(q)
+    iterations = 0
+    converged = False
+    while iterations < max_iterations:
+        iterations += 1
+        for a in range(cards):
+            continuation[a] = _expected_next_value(values, model.category_transitions, passive, charged[a], a)
+            q[a] = rewards[a] + model.gamma * continuation[a]
+        updated = q.max(axis=0)
+        delta = float(np.abs(updated - values).max())
+        values = updated
+        if delta < tolerance:
+            converged = True
+            break
+
+    return CardChoicePolicy(
+        card_ids=model.card_ids,
+        categories=model.categories,
+        gamma=model.gamma,
+        q=q,
+        continuation=continuation,
+        policy=q.argmax(axis=0),
+        iterations=iterations,
+        converged=converged,
+        digest=model.digest(),
+    )
+
+
+def _expected_next_value(
+    values: np.ndarray,
+    category_transitions: np.ndarray,
+    passive: np.ndarray,
+    charged: np.ndarray,
+    action: int,
+) -> np.ndarray:
+    """E[V(s') | s, charge card `action`], contracting one factor of the transition at a time."""
+    # Next category first; axis 0 then indexes the current purchase category.
+    expected = np.tensordot(category_transitions, values, axes=([1], [0]))
+    for k in range(passive.shape[0]):
+        axis = k + 1
+        if k == action:
+            expected = np.moveaxis(
+                np.einsum("cij,c...j->c...i", charged, np.moveaxis(expected, axis, -1)), -1, axis
+            )
+        else:
+            expected = np.moveaxis(np.tensordot(expected, passive[k], axes=([axis], [1])), -1, axis)
+    return expected
+
+
+class CardPolicyCache(BoundedLRU[str, Tuple[str, CardChoicePolicy]]):
+    """
+    Thread-safe LRU of solved policies, one entry per user.
+
+    An entry is reused while the user's model digest and solver settings are
+    unchanged; a new key (new transition counts, cards or rates) replaces it.
+    """
+
+    def get_or_solve(self, user_id: str, key: str, solve: Callable[[], CardChoicePolicy]) -> CardChoicePolicy:
+        """Cached policy while `key` (model digest plus solver settings) is unchanged, else `solve()`."""
+        return self.get_or_compute(user_id, lambda: (key, solve()), lambda entry: entry[0] == key)[1]
+
+    def invalidate(self, user_id: str) -> None:
+        self.pop(user_id)
@@ -12,6 +12,72 @@ from app.models.schemas import (
     ExpectedImpact,
     ProjectedSavings
 )
+from app.core.evaluation import current_evaluation_context, evaluation_scope
+
+import heapq
+import math
+
+import numpy as np
+
+# Months of minimum payments over which interest saved is projected.
+IMPACT_HORIZON_MONTHS = 12
+# Below this many cards the per-card closed form beats NumPy's per-call overhead.
+IMPACT_BATCH_MIN_CARDS = 16
+# (utilization %, cost per dollar of balance above it) for the optimal goal's
+# objective; the costs add up, so balance above 70% is charged 0.05 + 0.10.
+UTILIZATION_PENALTY_TIERS = ((30.0, 0.05), (70.0, 0.10))
+
+
+def projected_interest(
+    balance: float,
+    monthly_rate: float,
+    payment: float,
+    months: int = IMPACT_HORIZON_MONTHS
+) -> float:
+    """
+    Interest charged over `months` months of a constant monthly payment.
+
+    Closed form of: charge = balance * rate; balance = max(0, balance +
+    charge - payment), summed over the months. With g = 1 + rate the
+    balance after k payments is b g^k - P (g^k - 1) / rate, so the interest
+    over the first m months is b (g^m - 1) - P ((g^m - 1) / rate - m),
+    where m stops at the payoff month (the first k with a zero balance).
+    """
+    if monthly_rate <= 0 or balance <= 0:
+        return 0.0
+    growth_rate = math.log1p(monthly_rate)
+    charged_months = months
+    if payment > balance * monthly_rate:
+        # Payoff month -log(1 - b rate / P) / log(1 + rate); never when the payment does not cover interest.
+        charged_months = min(months, math.ceil(-math.log1p(-balance * monthly_rate / payment) / growth_rate))
+    growth = math.expm1(charged_months * growth_rate)
+    return max(balance * growth - payment * (growth / monthly_rate - charged_months), 0.0)
+
+
+def projected_interest_array(
+    balances: np.ndarray,
+    monthly_rates: np.ndarray,
+    payments: np.ndarray,
+    months: int = IMPACT_HORIZON_MONTHS
+) -> np.ndarray:
+    """`projected_interest` over arrays of cards in one NumPy pass."""
+    balances = np.asarray(balances, dtype=np.float64)
+    monthly_rates = np.asarray(monthly_rates, dtype=np.float64)
+    payments = np.asarray(payments, dtype=np.float64)
+
+    accruing = (monthly_rates > 0) & (balances > 0)
+    growth_rate = np.log1p(monthly_rates)
+    amortizes = accruing & (payments > balances * monthly_rates)
+    payoff = np.full(balances.shape, np.inf)
+    payoff[amortizes] = (
+        -np.log1p(-balances[amortizes] * monthly_rates[amortizes] / payments[amortizes]) / growth_rate[amortizes]
+    )
+    charged_months = np.minimum(np.ceil(payoff), months)
+
+    growth = np.expm1(charged_months * growth_rate)
+    annuity = np.divide(growth, monthly_rates, out=np.zeros_like(growth), where=accruing)
+    interest = balances * growth - payments * (annuity - charged_months)
+    return np.where(accruing, np.maximum(interest, 0.0), 0.0)
 
 
 class PaymentRecommender:
@@ -22,6 +88,7 @@ class PaymentRecommender:
     Handles the scenario: User owes $2000 across 3 cards but has only $1000 to pay
     """
     
+    @evaluation_scope
     def recommend(
         self,
         request: PaymentRecommendationRequest
@@ -33,6 +100,7 @@ class PaymentRecommender:
         - minimize_interest: Avalanche method (highest APR first)
         - balanced: Hybrid approach using ML + rules
         - minimize_balance: Snowball method (smallest balance first)
+        - optimal: exact minimum of projected interest + utilization penalty
         """
         cards = request.cards
         available_amount = request.available_amount
@@ -45,19 +113,24 @@ class PaymentRecommender:
         elif goal == "minimize_balance":
             recommendations = self.prioritize_by_balance(cards, available_amount)
             strategy = "Snowball Method: Pay smallest balances first for quick wins and motivation"
+        elif goal == "optimal":
+            recommendations = self.optimal_allocation(cards, available_amount)
+            strategy = "Optimal Allocation: Minimize projected interest and high-utilization balances within your budget"
         else:  # balanced
             recommendations = self.balanced_approach(cards, available_amount)
             strategy = "Balanced Approach: Optimize interest savings with due-date and utilization awareness"
         
         # Calculate projected savings
         projected_savings = self.calculate_projected_savings(cards, recommendations)
+        allocated = {rec.card_id: rec.suggested_amount for rec in recommendations}
         
         return PaymentRecommendationResponse(
             user_id=request.user_id,
             total_amount=available_amount,
             recommendations=recommendations,
             strategy=strategy,
-            projected_savings=projected_savings
+            projected_savings=projected_savings,
+            objective_value=round(self.allocation_objective(cards, allocated), 2)
         )
     
     def prioritize_by_interest(
@@ -122,9 +195,10 @@ class PaymentRecommender:
 
         # Build recommendations sorted by balance ascending so priority 1 = smallest
         sorted_for_display = sorted(cards, key=lambda c: c.current_balance)
+        amounts = [round(allocated.get(card.card_id, 0), 2) for card in sorted_for_display]
+        impacts = self.calculate_impacts(sorted_for_display, amounts)
         recommendations = []
-        for priority, card in enumerate(sorted_for_display, 1):
-            suggested_amount = round(allocated.get(card.card_id, 0), 2)
+        for priority, (card, suggested_amount, impact) in enumerate(zip(sorted_for_display, amounts, impacts), 1):
             if suggested_amount <= 0:
                 continue
 
@@ -163,7 +237,6 @@ class PaymentRecommender:
             if apr > 0:
                 parts.append(f"APR: {apr:.2f}%.")
 
-            impact = self.calculate_impact(card, suggested_amount)
             recommendations.append(PaymentRecommendation(
                 card_id=card.card_id,
                 suggested_amount=suggested_amount,
@@ -204,17 +277,7 @@ class PaymentRecommender:
             if headroom <= 0:
                 scores[card.card_id] = 0.0
                 continue
-            days = self._calculate_days_until_due(card.payment_due_date)
-            if days is not None and days < 0:
-                urgency = 5.0   # overdue
-            elif days is not None and days <= 7:
-                urgency = 3.0
-            elif days is not None and days <= 14:
-                urgency = 2.0
-            elif days is not None and days <= 30:
-                urgency = 1.5
-            else:
-                urgency = 1.0
+            urgency = self._urgency_multiplier(card.payment_due_date)
             apr = card.interest_rate if card.interest_rate is not None else 0.0
             util = card.utilization_percentage or 0
             scores[card.card_id] = (apr / 100) * urgency * (1 + util / 100)
@@ -233,6 +296,98 @@ class PaymentRecommender:
 
         return self._build_recommendations_from_allocation(cards, allocated)
 
+    def optimal_allocation(
+        self,
+        cards: List[CardData],
+        available_amount: float
+    ) -> List[PaymentRecommendation]:
+        """
+        Optimal Allocation: Pay minimums on ALL cards first, then place each
+        remaining dollar where it lowers `allocation_objective` the most.
+
+        Each card's objective is piecewise linear and convex in its
+        remaining balance: projected interest changes slope only where the
+        payoff month under minimum payments changes, and the utilization
+        penalty only at its tiers. Greedily taking the steepest segment
+        across cards (a max-heap holding each card's next segment) is
+        therefore exact. Segments with zero benefit are still filled,
+        highest APR first, so the whole budget is used.
+        """
+        total_minimums = sum(card.minimum_payment for card in cards)
+        if available_amount < total_minimums:
+            return self._emergency_allocation(cards, available_amount)
+
+        allocated = {card.card_id: min(card.minimum_payment, card.current_balance) for card in cards}
+        remaining = available_amount - sum(allocated.values())
+
+        # Ties go to the higher APR, then the earlier due date.
+        order = sorted(
+            range(len(cards)),
+            key=lambda k: (-(cards[k].interest_rate or 0), self._due_sort_key(cards[k].payment_due_date))
+        )
+        segments = [self._objective_segments(card, card.current_balance - allocated[card.card_id]) for card in cards]
+        heap = [(-segments[k][0][0], rank, k, 0) for rank, k in enumerate(order) if segments[k]]
+        heapq.heapify(heap)
+
+        while heap and remaining > 0:
+            _, rank, k, position = heapq.heappop(heap)
+            length = min(segments[k][position][1], remaining)
+            allocated[cards[k].card_id] += length
+            remaining -= length
+            if position + 1 < len(segments[k]):
+                heapq.heappush(heap, (-segments[k][position + 1][0], rank, k, position + 1))
+
+        return self._build_recommendations_from_allocation(
+            cards, {card_id: round(amount, 2) for card_id, amount in allocated.items()}
+        )
+
+    def allocation_objective(self, cards: List[CardData], allocated: Dict[str, float]) -> float:
+        """
+        Projected 12-month interest (minimum payments from the paid-down
+        balance) plus the utilization penalty on the paid-down balance.
+        """
+        return sum(
+            self._card_objective(card, max(0, card.current_balance - allocated.get(card.card_id, 0)))
+            for card in cards
+        )
+
+    def _card_objective(self, card: CardData, balance: float) -> float:
+        monthly_rate = (card.interest_rate / 100 / 12) if card.interest_rate else 0.0
+        penalty = sum(
+            cost * max(0.0, balance - card.credit_limit * threshold / 100)
+            for threshold, cost in UTILIZATION_PENALTY_TIERS
+        )
+        return projected_interest(balance, monthly_rate, card.minimum_payment) + penalty
+
+    def _objective_segments(self, card: CardData, balance: float) -> List[Tuple[float, float]]:
+        """
+        (benefit per dollar, dollars) segments of paying `balance` down to 0,
+        steepest first. Breakpoints: the largest balance minimum payments
+        clear in j months, for j < 12, and the utilization tiers.
+        """
+        if balance <= 0:
+            return []
+        monthly_rate = (card.interest_rate / 100 / 12) if card.interest_rate else 0.0
+        breakpoints = {0.0, balance}
+        if monthly_rate > 0 and card.minimum_payment > 0:
+            growth_rate = math.log1p(monthly_rate)
+            for months in range(1, IMPACT_HORIZON_MONTHS):
+                cleared = card.minimum_payment * -math.expm1(-months * growth_rate) / monthly_rate
+                if cleared < balance:
+                    breakpoints.add(cleared)
+        for threshold, _ in UTILIZATION_PENALTY_TIERS:
+            tier = card.credit_limit * threshold / 100
+            if 0 < tier < balance:
+                breakpoints.add(tier)
+
+        points = sorted(breakpoints, reverse=True)
+        segments = []
+        for high, low in zip(points, points[1:]):
+            # The objective is linear between breakpoints, so the chord is the slope.
+            slope = (self._card_objective(card, high) - self._card_objective(card, low)) / (high - low)
+            segments.append((max(slope, 0.0), high - low))
+        return segments
+
     def _build_recommendations_from_allocation(
         self,
         cards: List[CardData],
@@ -246,9 +401,10 @@ class PaymentRecommender:
             cards,
             key=lambda c: (-(c.interest_rate or 0), self._due_sort_key(c.payment_due_date))
         )
+        amounts = [round(allocated.get(card.card_id, 0), 2) for card in sorted_cards]
+        impacts = self.calculate_impacts(sorted_cards, amounts)
         recommendations = []
-        for priority, card in enumerate(sorted_cards, 1):
-            suggested_amount = round(allocated.get(card.card_id, 0), 2)
+        for priority, (card, suggested_amount, impact) in enumerate(zip(sorted_cards, amounts, impacts), 1):
             if suggested_amount <= 0:
                 continue
 
@@ -313,7 +469,6 @@ class PaymentRecommender:
 
             reasoning_text = " ".join(parts)
 
-            impact = self.calculate_impact(card, suggested_amount)
             recommendations.append(PaymentRecommendation(
                 card_id=card.card_id,
                 suggested_amount=suggested_amount,
@@ -349,15 +504,17 @@ class PaymentRecommender:
             )
         )
         
-        for priority, card in enumerate(sorted_cards, 1):
+        amounts = []
+        for card in sorted_cards:
             if remaining_funds <= 0:
                 break
-
             suggested_amount = min(card.minimum_payment, remaining_funds, card.current_balance)
             remaining_funds -= suggested_amount
-            remaining_days = self._calculate_days_until_due(card.payment_due_date)
+            amounts.append(suggested_amount)
 
-            impact = self.calculate_impact(card, suggested_amount)
+        impacts = self.calculate_impacts(sorted_cards[:len(amounts)], amounts)
+        for priority, (card, suggested_amount, impact) in enumerate(zip(sorted_cards, amounts, impacts), 1):
+            remaining_days = self._calculate_days_until_due(card.payment_due_date)
 
             if remaining_days is not None and remaining_days < 0:
                 due_note = "This payment is already overdue  pay immediately."
@@ -395,37 +552,50 @@ class PaymentRecommender:
         - Interest saved over 12 months
         - Utilization improvement
         """
-        # Calculate interest saved
-        monthly_rate = (card.interest_rate / 100 / 12) if card.interest_rate else 0.0
-        
-        # Interest without extra payment (only minimum)
-        balance_with_min = card.current_balance
-        interest_with_min = 0
-        for month in range(12):
-            interest_charge = balance_with_min * monthly_rate
-            interest_with_min += interest_charge
-            balance_with_min = max(0, balance_with_min + interest_charge - card.minimum_payment)
-        
-        # Interest with suggested payment
-        balance_with_payment = max(0, card.current_balance - payment_amount)
-        interest_with_payment = 0
-        for month in range(12):
-            interest_charge = balance_with_payment * monthly_rate
-            interest_with_payment += interest_charge
-            balance_with_payment = max(0, balance_with_payment + interest_charge - card.minimum_payment)
-        
-        interest_saved = max(0, interest_with_min - interest_with_payment)
-        
-        # Calculate utilization improvement
-        current_util = card.utilization_percentage
-        new_balance = card.current_balance - payment_amount
-        new_util = (new_balance / card.credit_limit) * 100
-        utilization_improvement = current_util - new_util
-        
-        return ExpectedImpact(
-            interest_saved=round(interest_saved, 2),
-            utilization_improvement=round(utilization_improvement, 2)
-        )
+        return self.calculate_impacts([card], [payment_amount])[0]
+
+    def calculate_impacts(
+        self,
+        cards: List[CardData],
+        payment_amounts: List[float]
+    ) -> List[ExpectedImpact]:
+        """
+        Expected impact of paying `payment_amounts[i]` on `cards[i]`, for all cards at once
+
+        Interest saved compares 12 months of minimum payments from the
+        current balance against the same months after this payment, using
+        the closed-form `projected_interest` (one NumPy pass for larger batches).
+        """
+        if not cards:
+            return []
+
+        balances = [card.current_balance for card in cards]
+        paid_down = [max(0, card.current_balance - amount) for card, amount in zip(cards, payment_amounts)]
+        monthly_rates = [(card.interest_rate / 100 / 12) if card.interest_rate else 0.0 for card in cards]
+        minimums = [card.minimum_payment for card in cards]
+
+        if len(cards) >= IMPACT_BATCH_MIN_CARDS:
+            interest_saved = np.maximum(
+                0,
+                projected_interest_array(balances, monthly_rates, minimums)
+                - projected_interest_array(paid_down, monthly_rates, minimums),
+            ).tolist()
+        else:
+            interest_saved = [
+                max(0, projected_interest(balance, rate, minimum) - projected_interest(remaining, rate, minimum))
+                for balance, remaining, rate, minimum in zip(balances, paid_down, monthly_rates, minimums)
+            ]
+
+        impacts = []
+        for card, payment_amount, saved in zip(cards, payment_amounts, interest_saved):
+            # Calculate utilization improvement
+            new_balance = card.current_balance - payment_amount
+            new_util = (new_balance / card.credit_limit) * 100
+            impacts.append(ExpectedImpact(
+                interest_saved=round(saved, 2),
+                utilization_improvement=round(card.utilization_percentage - new_util, 2)
+            ))
+        return impacts
     
     def calculate_projected_savings(
         self,
@@ -448,16 +618,20 @@ class PaymentRecommender:
     
     def _calculate_days_until_due(self, due_date_str: Optional[str]) -> Optional[int]:
         """Calculate days until payment due. Returns None when due date is unavailable/invalid."""
-        if not due_date_str:
-            return None
-        
-        try:
-            from datetime import datetime
-            due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-            delta = due_date - datetime.now()
-            return delta.days
-        except:
-            return None
+        return current_evaluation_context().days_until_due(due_date_str)
+
+    def _urgency_multiplier(self, due_date_str: Optional[str]) -> float:
+        """Balanced-allocation weight for how soon a card is due."""
+        days = self._calculate_days_until_due(due_date_str)
+        if days is not None and days < 0:
+            return 5.0   # overdue
+        if days is not None and days <= 7:
+            return 3.0
+        if days is not None and days <= 14:
+            return 2.0
+        if days is not None and days <= 30:
+            return 1.5
+        return 1.0
 
     def _due_sort_key(self, due_date_str: Optional[str]) -> Tuple[int, int]:
         """Sort helper: valid due dates first (earlier first), missing due dates last."""
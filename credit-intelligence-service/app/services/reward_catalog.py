@@ -0,0 +1,521 @@
+"""
+Reward Catalog Provider
+Async, pooled loader for the Supabase credit_card_offers catalog.
+
+- One shared httpx.AsyncClient (connection pool) per event loop
+- TTL with stale-while-revalidate: stale copies are served while a background refresh runs
+- Single-flight: concurrent callers share one in-flight fetch
+- Failed fetches back off exponentially instead of caching an empty catalog forever
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from app.core.config import settings
+
+
+OFFER_COLUMNS = (
+    "id,name,issuer,earn_rate_grocery,earn_rate_travel,earn_rate_dining,earn_rate_other,annual_fee,is_active"
+)
+
+REWARD_BUCKETS = ("groceries", "travel", "dining", "default")
+
+
+def normalize_identity(value: Optional[str]) -> str:
+    """Lowercase alphanumeric tokens joined by single spaces ("RBC Visa+" -> "rbc visa")."""
+    if not value:
+        return ""
+
+    normalized = "".join(ch.lower() if ch.isalnum() else " " for ch in value)
+    return " ".join(token for token in normalized.split() if token)
+
+
+def offer_to_rate_map(offer: Dict[str, Any]) -> Dict[str, float]:
+    """Parse an offer's earn-rate columns into {bucket: rate} with rates as fractions."""
+    def normalize(raw_value: Any) -> float:
+        try:
+            raw = float(raw_value)
+        except Exception:
+            return 0.0
+
+        if raw <= 0:
+            return 0.0
+        if raw <= 0.2:
+            return raw
+        if raw <= 10:
+            return raw / 100
+        return raw / 1000
+
+    categories = {
+        "groceries": normalize(offer.get("earn_rate_grocery")),
+        "travel": normalize(offer.get("earn_rate_travel")),
+        "dining": normalize(offer.get("earn_rate_dining")),
+        "default": normalize(offer.get("earn_rate_other")),
+    }
+
+    return {key: value for key, value in categories.items() if value > 0}
+
+
+def _safe_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
+@dataclass
+class _RankedOffer:
+    position: int
+    rate: float
+    annual_fee: Optional[float]
+    offer_id: Any
+    name: Any
+    issuer: Any
+    # (position, rate) of every offer sharing this issuer+name identity, in catalog order.
+    members: List[Tuple[int, float]]
+
+    def first_position_above(self, current_best_rate: float) -> int:
+        """Catalog position where this identity first beats current_best_rate (de-dup insertion order)."""
+        for position, rate in self.members:
+            if rate > current_best_rate:
+                return position
+        return self.position
+
+
+class _BucketRanking:
+    """Deduplicated offers for one reward bucket, split by fee and sorted by rate (highest first)."""
+
+    def __init__(self, entries: List[_RankedOffer]):
+        no_fee = [e for e in entries if e.annual_fee is None or e.annual_fee <= 0]
+        with_fee = [e for e in entries if not (e.annual_fee is None or e.annual_fee <= 0)]
+        self.groups: Tuple[List[_RankedOffer], ...] = tuple(
+            sorted(group, key=lambda e: (-e.rate, e.position)) for group in (no_fee, with_fee)
+        )
+        self._neg_rates: Tuple[List[float], ...] = tuple([-e.rate for e in group] for group in self.groups)
+
+    def better_than(self, current_best_rate: float, limit: int) -> List[List[_RankedOffer]]:
+        """
+        Per fee group, the offers whose rate beats current_best_rate, best first.
+
+        Each slice holds `limit` offers plus any that tie the last one on
+        rounded reward rate, since tie order is only known per query.
+        """
+        picked: List[List[_RankedOffer]] = []
+        for group, neg_rates in zip(self.groups, self._neg_rates):
+            count = bisect.bisect_left(neg_rates, -current_best_rate)
+            end = min(count, limit)
+            while 0 < end < count and round(group[end].rate, 4) == round(group[end - 1].rate, 4):
+                end += 1
+            picked.append(group[:end])
+        return picked
+
+
+class RewardCatalogIndex:
+    """
+    Catalog preprocessed once per load for institution -> reward-map resolution.
+
+    Holds normalized issuer/name keys, a token inverted index and pre-parsed
+    rate maps, so resolving a card touches only the offers that can score.
+    Scores keep the original semantics: 100 exact key match, 80 substring
+    match (issuer checked before name), otherwise the best token overlap.
+    """
+
+    def __init__(self, offers: List[Dict[str, Any]]):
+        self.offers = offers
+        self.rate_maps: List[Dict[str, float]] = [offer_to_rate_map(offer) for offer in offers]
+        self._keys: List[Tuple[str, ...]] = []
+        self._key_tokens: List[Tuple[Set[str], ...]] = []
+        self._offers_by_key: Dict[str, List[int]] = defaultdict(list)
+        self._offers_by_token: Dict[str, List[int]] = defaultdict(list)
+
+        for position, offer in enumerate(offers):
+            keys = tuple(
+                key
+                for key in (normalize_identity(offer.get("issuer")), normalize_identity(offer.get("name")))
+                if key
+            )
+            self._keys.append(keys)
+            self._key_tokens.append(tuple(set(key.split()) for key in keys))
+            for key in dict.fromkeys(keys):
+                self._offers_by_key[key].append(position)
+            for token in set().union(*self._key_tokens[-1]):
+                self._offers_by_token[token].append(position)
+
+        self._resolved: Dict[str, Optional[Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        self._bucket_rankings = {bucket: self._rank_bucket(bucket) for bucket in REWARD_BUCKETS}
+
+    def top_offers_for_bucket(
+        self,
+        bucket: str,
+        current_best_rate: float,
+        estimated_monthly_spend: float,
+        limit: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """
+        Best offers for a reward bucket that beat current_best_rate.
+
+        No-fee offers rank ahead of fee offers, then by incremental reward and
+        rate. Only the head of each pre-sorted fee group is materialized.
+        """
+        limit = max(1, limit)
+        ranking = self._bucket_rankings.get(bucket) or self._bucket_rankings["default"]
+
+        ranked = []
+        for fee_flag, group in enumerate(ranking.better_than(current_best_rate, limit)):
+            for entry in group:
+                monthly_incremental = round(estimated_monthly_spend * (entry.rate - current_best_rate), 2)
+                ranked.append(
+                    (
+                        fee_flag,
+                        -monthly_incremental,
+                        -round(entry.rate, 4),
+                        entry.first_position_above(current_best_rate),
+                        entry,
+                    )
+                )
+
+        top = []
+        for _, _, _, _, entry in heapq.nsmallest(limit, ranked, key=lambda row: row[:4]):
+            monthly_incremental = estimated_monthly_spend * (entry.rate - current_best_rate)
+            top.append(
+                {
+                    "offer_id": entry.offer_id,
+                    "name": entry.name,
+                    "issuer": entry.issuer,
+                    "reward_rate": round(entry.rate, 4),
+                    "annual_fee": entry.annual_fee,
+                    "estimated_monthly_incremental_reward": round(monthly_incremental, 2),
+                    "estimated_annual_incremental_reward": round(monthly_incremental * 12.0, 2),
+                }
+            )
+        return top
+
+    def best_offer_for_bucket(self, bucket: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """Highest-rate offer for a bucket (earliest in the catalog on ties)."""
+        ranking = self._bucket_rankings.get(bucket) or self._bucket_rankings["default"]
+        heads = [group[0] for group in ranking.groups if group]
+        if not heads:
+            return None, 0.0
+        best = min(heads, key=lambda e: (-e.rate, e.position))
+        return self.offers[best.position], best.rate
+
+    def _rank_bucket(self, bucket: str) -> _BucketRanking:
+        # Keep the highest-rate offer per issuer+name identity; it is the one that
+        # wins de-duplication for any current_best_rate it beats.
+        winners: Dict[str, _RankedOffer] = {}
+        for position, offer in enumerate(self.offers):
+            rate_map = self.rate_maps[position]
+            rate = rate_map.get(bucket)
+            if rate is None:
+                rate = rate_map.get("default", 0.0)
+            if rate <= 0:
+                continue
+
+            key = normalize_identity(f"{offer.get('issuer')} {offer.get('name')}")
+            existing = winners.get(key)
+            members = existing.members if existing else []
+            members.append((position, rate))
+            if existing is None or rate > existing.rate:
+                winners[key] = _RankedOffer(
+                    position=position,
+                    rate=rate,
+                    annual_fee=_safe_float(offer.get("annual_fee")),
+                    offer_id=offer.get("id"),
+                    name=offer.get("name"),
+                    issuer=offer.get("issuer"),
+                    members=members,
+                )
+        return _BucketRanking(list(winners.values()))
+
+    def reward_map_for_institution(self, institution_name: Optional[str]) -> Optional[Dict[str, float]]:
+        """Merged best-match reward map for an institution, memoized per name."""
+        institution_key = normalize_identity(institution_name)
+        if not institution_key:
+            return None
+
+        with self._lock:
+            if institution_key in self._resolved:
+                cached = self._resolved[institution_key]
+                return dict(cached) if cached else None
+
+        resolved = self._resolve(institution_key)
+        with self._lock:
+            self._resolved[institution_key] = resolved
+        return dict(resolved) if resolved else None
+
+    def _resolve(self, institution_key: str) -> Optional[Dict[str, float]]:
+        institution_tokens = set(institution_key.split())
+
+        candidates: Set[int] = set()
+        for key, positions in self._offers_by_key.items():
+            if institution_key in key or key in institution_key:
+                candidates.update(positions)
+        for token in institution_tokens:
+            candidates.update(self._offers_by_token.get(token, ()))
+
+        best_score = -1
+        best_positions: List[int] = []
+        for position in sorted(candidates):
+            score = self._score(institution_key, institution_tokens, position)
+            if score < 0:
+                continue
+            if score > best_score:
+                best_score = score
+                best_positions = [position]
+            elif score == best_score:
+                best_positions.append(position)
+
+        if not best_positions:
+            return None
+
+        # Merge best-matching offers to keep the highest available rate per category.
+        merged: Dict[str, float] = {}
+        for position in best_positions:
+            for category, value in self.rate_maps[position].items():
+                merged[category] = max(merged.get(category, 0.0), value)
+
+        return merged or None
+
+    def _score(self, institution_key: str, institution_tokens: Set[str], position: int) -> int:
+        keys = self._keys[position]
+        if not keys:
+            return -1
+
+        for key in keys:
+            if institution_key == key:
+                return 100
+            if institution_key in key or key in institution_key:
+                return 80
+
+        best_overlap = max(len(institution_tokens.intersection(tokens)) for tokens in self._key_tokens[position])
+        if best_overlap == 0:
+            return -1
+        return best_overlap
+
+
+class RewardCatalogProvider:
+    """Cached view of active reward offers with background revalidation."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 900.0,
+        timeout_seconds: float = 8.0,
+        retry_base_seconds: float = 5.0,
+        retry_max_seconds: float = 300.0,
+        max_connections: int = 10,
+        supabase_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_connections = max_connections
+        self._supabase_url = supabase_url
+        self._api_key = api_key
+        self._env_loaded = False
+
+        self._offers: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = float("-inf")
+        self._version = 0
+        self._digest: Optional[str] = None
+        self._consecutive_failures = 0
+        self._retry_after = 0.0
+        self._last_error: Optional[str] = None
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "RewardCatalogProvider":
+        return cls(
+            ttl_seconds=settings.REWARD_CATALOG_TTL_SECONDS,
+            timeout_seconds=settings.REWARD_CATALOG_TIMEOUT_SECONDS,
+            retry_base_seconds=settings.REWARD_CATALOG_RETRY_BASE_SECONDS,
+            retry_max_seconds=settings.REWARD_CATALOG_RETRY_MAX_SECONDS,
+            max_connections=settings.REWARD_CATALOG_MAX_CONNECTIONS,
+        )
+
+    @property
+    def version(self) -> int:
+        """Incremented every time a catalog with different content is installed."""
+        return self._version
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return the current catalog without I/O (empty until the first successful load)."""
+        return self._offers or []
+
+    def prime(self, offers: List[Dict[str, Any]]) -> None:
+        """Install a catalog directly (tests, worker processes, warm starts)."""
+        self._install([offer for offer in offers if isinstance(offer, dict)])
+
+    def invalidate(self) -> None:
+        """Mark the catalog stale and start revalidating it in the background when a loop is running."""
+        self._fetched_at = float("-inf")
+        self._consecutive_failures = 0
+        self._retry_after = 0.0
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._offers is not None:
+            self._start_refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "version": self._version,
+            "offers": len(self._offers or []),
+            "age_seconds": round(now - self._fetched_at, 3) if self._fetched_at > float("-inf") else None,
+            "stale": not self._is_fresh(now),
+            "consecutive_failures": self._consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self._retry_after - now), 3),
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+            "last_error": self._last_error,
+        }
+
+    async def get_offers(self) -> List[Dict[str, Any]]:
+        """
+        Return the catalog, loading it on first use.
+
+        Fresh copies are returned as-is. Stale copies are returned immediately
+        while a single background refresh revalidates them. Only a cold cache
+        waits on the network, and only outside a failure back-off window.
+        """
+        now = time.monotonic()
+        if self._offers is not None:
+            if not self._is_fresh(now) and now >= self._retry_after:
+                self._start_refresh()
+            return self._offers
+
+        if now < self._retry_after:
+            return []
+        await self.refresh()
+        return self.snapshot()
+
+    async def refresh(self) -> None:
+        """Fetch the catalog now, joining any refresh that is already in flight."""
+        task = self._start_refresh()
+        await asyncio.shield(task)
+
+    async def aclose(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+        self._refresh_task = None
+
+    def _is_fresh(self, now: float) -> bool:
+        return self._offers is not None and (now - self._fetched_at) < self.ttl_seconds
+
+    def _start_refresh(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh_once())
+            self._refresh_task = task
+        return task
+
+    async def _refresh_once(self) -> None:
+        endpoint, headers = self._resolve_endpoint()
+        if endpoint is None:
+            return
+
+        params = {
+            "select": OFFER_COLUMNS,
+            "is_active": "eq.true",
+            "limit": "1000",
+        }
+        try:
+            response = await self._get_client().get(endpoint, headers=headers, params=params)
+            response.raise_for_status()
+            payload = response.json()
+            if not isinstance(payload, list):
+                raise ValueError("Reward catalog response was not a list")
+        except Exception as e:
+            self._record_failure(e)
+            return
+
+        self._install([item for item in payload if isinstance(item, dict)])
+
+    def _install(self, offers: List[Dict[str, Any]]) -> None:
+        # A TTL refresh usually returns the same rows; keep the version (and the list
+        # callers may key on) so caches keyed by the version stay valid.
+        digest = hashlib.sha256(json.dumps(offers, sort_keys=True, default=str).encode()).hexdigest()
+        if digest != self._digest or self._offers is None:
+            self._offers = offers
+            self._digest = digest
+            self._version += 1
+        self._fetched_at = time.monotonic()
+        self._consecutive_failures = 0
+        self._retry_after = 0.0
+        self._last_error = None
+
+    def _record_failure(self, error: Exception) -> None:
+        self._consecutive_failures += 1
+        delay = min(
+            self.retry_max_seconds,
+            self.retry_base_seconds * (2 ** (self._consecutive_failures - 1)),
+        )
+        self._retry_after = time.monotonic() + delay
+        self._last_error = f"{type(error).__name__}: {error}"
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _resolve_endpoint(self) -> Tuple[Optional[str], Dict[str, str]]:
+        if not self._env_loaded:
+            # Allow the service to run from its own folder while still reading root project env files.
+            load_dotenv(dotenv_path=".env", override=False)
+            load_dotenv(dotenv_path="../.env", override=False)
+            load_dotenv(dotenv_path="../.env.local", override=False)
+            self._env_loaded = True
+
+        supabase_url = self._supabase_url or os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+        api_key = (
+            self._api_key
+            or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+            or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
+        )
+        if not supabase_url or not api_key:
+            return None, {}
+
+        endpoint = f"{supabase_url.rstrip('/')}/rest/v1/credit_card_offers"
+        headers = {
+            "apikey": api_key,
+            "Authorization": f"Bearer {api_key}",
+        }
+        return endpoint, headers
+
+
+reward_catalog = RewardCatalogProvider.from_settings()
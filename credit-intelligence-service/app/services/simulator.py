@@ -3,14 +3,199 @@ Payoff Simulator Service
 Simulates loan payoff scenarios with different payment amounts
 """
 
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from app.models.schemas import (
+    CardData,
+    MultiCardPayoffRequest,
+    MultiCardPayoffResponse,
     PayoffSimulationRequest,
     PayoffSimulationResponse,
-    PayoffScenario
+    PayoffScenario,
+    PayoffCurvePoint,
+    StrategyPayoffResult
 )
-from datetime import datetime, timedelta
-import math
+from app.core.evaluation import current_evaluation_context, evaluation_scope
+from app.services.recommender import PaymentRecommender
+from datetime import timedelta
+
+import numpy as np
+
+# Balances still outstanding after this many months are reported as not paid off.
+PAYOFF_HORIZON_MONTHS = 600
+# Aggressive scenario: pay at least this share of the starting balance each month.
+AGGRESSIVE_BALANCE_SHARE = 0.10
+# Month-by-month balances below half a cent are float residue and count as paid off.
+PAID_OFF_TOLERANCE = 0.005
+
+
+class InsufficientBudgetError(Exception):
+    """Raised when a monthly budget does not cover the cards' minimum payments."""
+
+    def __init__(self, message: str, code: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.code = code
+        self.details = details or {}
+
+    def __reduce__(self):
+        return type(self), (str(self), self.code, self.details)
+
+
+def payoff_schedule(
+    balance: float,
+    monthly_rate: float,
+    payments: np.ndarray,
+    horizon: int = PAYOFF_HORIZON_MONTHS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Closed-form payoff of `balance` under each fixed monthly payment.
+
+    Returns (months, interest, paid) arrays. `months` is -1 where the
+    payment does not clear the balance within `horizon` months (including
+    payments at or below the monthly interest); interest and paid then
+    cover the whole horizon. Each month interest accrues first and the
+    payment is applied after, so the last payment is the remainder.
+    """
+    payments = np.asarray(payments, dtype=np.float64)
+    months = np.full(payments.shape, -1, dtype=np.int64)
+    interest = np.zeros(payments.shape)
+    paid = np.zeros(payments.shape)
+
+    if monthly_rate == 0:
+        exact = np.ceil(balance / payments - 1e-9)
+        pays_off = exact <= horizon
+        months[pays_off] = np.maximum(exact[pays_off], 1)
+        paid[pays_off] = balance
+        paid[~pays_off] = payments[~pays_off] * horizon
+        return months, interest, paid
+
+    growth_rate = np.log1p(monthly_rate)
+    amortizes = payments > balance * monthly_rate
+    exact = np.full(payments.shape, np.inf)
+    # n = -log(1 - balance * rate / payment) / log(1 + rate)
+    exact[amortizes] = -np.log1p(-balance * monthly_rate / payments[amortizes]) / growth_rate
+    # Tolerance so an exact whole number of payments is not rounded up to an empty extra month.
+    count = np.ceil(exact - 1e-9)
+    pays_off = count <= horizon
+    count = np.where(pays_off, np.maximum(count, 1), horizon)
+
+    # Balance after k payments: B(1+r)^k - P((1+r)^k - 1) / r.
+    full = np.where(pays_off, count - 1, count)
+    accrued = np.expm1(full * growth_rate)
+    remaining = balance * (1 + accrued) - payments * accrued / monthly_rate
+    paid = np.where(pays_off, full * payments + remaining * (1 + monthly_rate), full * payments)
+    interest = np.where(pays_off, paid - balance, remaining - balance + paid)
+    months[pays_off] = count[pays_off]
+    return months, interest, paid
+
+
+def simulate_payment_paths(
+    balance: float,
+    monthly_rate: float,
+    minimum_payment: float,
+    minimum_percent: Optional[float],
+    extras: np.ndarray,
+    floors: np.ndarray,
+    horizon: int = PAYOFF_HORIZON_MONTHS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Month-by-month payoff for payments that change with the balance.
+
+    Scenario s pays max(minimum + extras[s], floors[s]) each month, where
+    the minimum is max(minimum_payment, minimum_percent of the balance).
+    All scenarios advance together, one array operation per month. Returns
+    (months, interest, paid, first_payment) with the conventions of
+    `payoff_schedule`.
+    """
+    extras = np.asarray(extras, dtype=np.float64)
+    floors = np.asarray(floors, dtype=np.float64)
+    balances = np.full(extras.shape, float(balance))
+    months = np.full(extras.shape, -1, dtype=np.int64)
+    interest = np.zeros(extras.shape)
+    paid = np.zeros(extras.shape)
+    first_payment = None
+
+    for month in range(1, horizon + 1):
+        active = months < 0
+        if not active.any():
+            break
+        minimum = minimum_payment
+        if minimum_percent is not None:
+            minimum = np.maximum(minimum_payment, balances * (minimum_percent / 100))
+        if first_payment is None:
+            first_payment = np.maximum(minimum + extras, floors)
+
+        charge = np.where(active, balances * monthly_rate, 0.0)
+        due = balances + charge
+        payment = np.where(active, np.minimum(np.maximum(minimum + extras, floors), due), 0.0)
+        interest += charge
+        paid += payment
+        balances = due - payment
+        months[active & (balances < PAID_OFF_TOLERANCE)] = month
+
+    return months, interest, paid, first_payment
+
+
+def simulate_multi_card_payoff(
+    balances: np.ndarray,
+    monthly_rates: np.ndarray,
+    minimum_payments: np.ndarray,
+    credit_limits: np.ndarray,
+    budget: float,
+    priority: np.ndarray,
+    weights: np.ndarray,
+    horizon: int = PAYOFF_HORIZON_MONTHS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pay K cards from one recurring budget under S strategies at once.
+
+    Each month interest accrues, every card receives its minimum, and the
+    rest of the budget is split: strategy s first gives each card
+    `weights[s, k] * (1 + utilization)` of it (capped at the balance),
+    then fills the remaining balances in `priority[s]` order. All-zero
+    weight rows are pure priority strategies. The budget stays fixed, so
+    minimums freed by a paid-off card roll over to the others.
+
+    Returns (trajectory (M, S, K) end-of-month balances, interest (S, K),
+    paid (S, K), payoff_month (S, K)); payoff_month is -1 for cards still
+    owing after `horizon` months and 0 for cards that start at zero.
+    """
+    strategies = priority.shape[0]
+    balance = np.tile(np.asarray(balances, dtype=np.float64), (strategies, 1))
+    interest = np.zeros_like(balance)
+    paid = np.zeros_like(balance)
+    payoff_month = np.where(balance > 0, -1, 0)
+    fill = np.empty_like(balance)
+    rows = np.arange(strategies)[:, None]
+    trajectory = []
+
+    for month in range(1, horizon + 1):
+        if (payoff_month >= 0).all():
+            break
+        charge = balance * monthly_rates
+        due = balance + charge
+        minimum = np.minimum(minimum_payments, due)
+        extra = budget - minimum.sum(axis=1)
+        headroom = due - minimum
+
+        # Proportional shares, then a priority-ordered fill of what they leave.
+        scores = np.where(headroom > 0, weights * (1 + balance / credit_limits), 0.0)
+        total = scores.sum(axis=1, keepdims=True)
+        share = np.divide(scores * extra[:, None], total, out=np.zeros_like(scores), where=total > 0)
+        share = np.minimum(share, headroom)
+        room = (headroom - share)[rows, priority]
+        before = np.cumsum(room, axis=1) - room
+        fill[rows, priority] = np.minimum(np.maximum((extra - share.sum(axis=1))[:, None] - before, 0.0), room)
+
+        payment = minimum + share + fill
+        balance = due - payment
+        balance[balance < PAID_OFF_TOLERANCE] = 0.0
+        interest += charge
+        paid += payment
+        payoff_month[(payoff_month < 0) & (balance == 0)] = month
+        trajectory.append(balance)
+
+    shape = (0,) + balance.shape
+    return (np.stack(trajectory) if trajectory else np.zeros(shape)), interest, paid, payoff_month
 
 
 class PayoffSimulator:
@@ -18,33 +203,62 @@ class PayoffSimulator:
     Loan payoff calculator
     Simulates time to payoff with different payment strategies
     """
-    
-    def __init__(self):
+
+    def __init__(self, horizon_months: int = PAYOFF_HORIZON_MONTHS):
         """Initialize simulator"""
-        pass
-    
+        self.horizon_months = horizon_months
+        self._recommender = PaymentRecommender()
+
+    @evaluation_scope
     def simulate(
         self,
         request: PayoffSimulationRequest
     ) -> PayoffSimulationResponse:
         """
         Simulate payoff scenarios
-        
-        TODO: Implement simulation logic
-        - Generate 3-5 scenarios with different payment amounts
+
         - Scenario 1: Minimum payment only
         - Scenario 2: Minimum + extra payment from request
         - Scenario 3: Minimum + 2x extra payment
-        - Scenario 4: Aggressive payoff (e.g., 10% of balance per month)
-        - Calculate for each:
-          - Months to payoff
-          - Total interest paid
-          - Total amount paid
-          - Payoff date
+        - Scenario 4: Aggressive payoff (at least 10% of the starting balance per month)
+
+        Fixed payments use the closed-form amortization formula; when the
+        minimum tracks the balance (`minimum_payment_percent`) every
+        scenario is stepped month by month in one vectorized pass. The
+        optional curve evaluates `curve_points` fixed payments at once.
         """
-        # TODO: Implementation needed
-        raise NotImplementedError("Payoff simulation not implemented")
-    
+        balance = request.current_balance
+        monthly_rate = request.interest_rate / 12 / 100
+        extras, floors = self._scenario_plans(request)
+
+        if request.minimum_payment_percent is None:
+            payments = np.maximum(request.minimum_payment + extras, floors)
+            months, interest, paid = payoff_schedule(balance, monthly_rate, payments, self.horizon_months)
+        else:
+            months, interest, paid, payments = simulate_payment_paths(
+                balance,
+                monthly_rate,
+                request.minimum_payment,
+                request.minimum_payment_percent,
+                extras,
+                floors,
+                self.horizon_months
+            )
+
+        scenarios = [
+            self._build_scenario(payment, month, total_interest, total_paid)
+            for payment, month, total_interest, total_paid in zip(
+                payments.tolist(), months.tolist(), interest.tolist(), paid.tolist()
+            )
+        ]
+
+        return PayoffSimulationResponse(
+            card_id=request.card_id,
+            scenarios=scenarios,
+            curve=self.payoff_curve(balance, request.interest_rate, request.minimum_payment, request.curve_points),
+            horizon_months=self.horizon_months
+        )
+
     def calculate_payoff(
         self,
         balance: float,
@@ -53,39 +267,158 @@ class PayoffSimulator:
     ) -> PayoffScenario:
         """
         Calculate payoff scenario for given payment amount
-        
-        TODO: Implement calculation
-        - Use amortization formula
-        - Account for compound interest
-        - Calculate months to payoff
-        - Sum total interest paid
-        - Handle edge cases (payment < interest accrual)
-        
-        Formula reference:
+
         Monthly interest rate = annual_rate / 12 / 100
         Months = -log(1 - (balance * rate / payment)) / log(1 + rate)
+
+        A payment at or below the first month's interest never pays the
+        balance down; the scenario is then reported over the horizon with
+        `pays_off` false.
+        """
+        months, interest, paid = payoff_schedule(
+            balance, interest_rate / 12 / 100, np.array([monthly_payment]), self.horizon_months
+        )
+        return self._build_scenario(monthly_payment, int(months[0]), float(interest[0]), float(paid[0]))
+
+    def payoff_curve(
+        self,
+        balance: float,
+        interest_rate: float,
+        minimum_payment: float,
+        points: int
+    ) -> List[PayoffCurvePoint]:
+        """Months and interest for `points` fixed payments from the minimum up to a one-month payoff."""
+        if points <= 0:
+            return []
+        monthly_rate = interest_rate / 12 / 100
+        top = max(balance * (1 + monthly_rate), minimum_payment)
+        payments = np.linspace(minimum_payment, top, points)
+        months, interest, _ = payoff_schedule(balance, monthly_rate, payments, self.horizon_months)
+        return [
+            PayoffCurvePoint(
+                payment_amount=round(payment, 2),
+                months_to_payoff=month if month >= 0 else None,
+                total_interest_paid=round(total_interest, 2)
+            )
+            for payment, month, total_interest in zip(payments.tolist(), months.tolist(), interest.tolist())
+        ]
+
+    @evaluation_scope
+    def compare_strategies(
+        self,
+        request: MultiCardPayoffRequest
+    ) -> MultiCardPayoffResponse:
         """
-        # TODO: Implementation needed
-        
-        # Placeholder calculation
-        monthly_rate = (interest_rate / 12 / 100)
-        
-        # Edge case: payment doesn't cover interest
-        if monthly_payment <= balance * monthly_rate:
-            # Return very long payoff time or error
-            pass
-        
-        # Calculate months to payoff
-        months_to_payoff = 0  # TODO: Calculate
-        total_interest_paid = 0.0  # TODO: Calculate
-        total_amount_paid = balance + total_interest_paid
-        
-        payoff_date = (datetime.now() + timedelta(days=30 * months_to_payoff)).isoformat()
-        
+        Run avalanche, snowball and balanced payoff over the full horizon
+
+        - Avalanche: extra budget to the highest APR first
+        - Snowball: extra budget to the smallest starting balance first
+        - Balanced: extra budget split by APR x due-date urgency x utilization,
+          as in PaymentRecommender.balanced_approach; any remainder goes
+          to the highest APR first
+        """
+        cards = request.cards
+        balances = np.array([card.current_balance for card in cards])
+        aprs = np.array([card.interest_rate or 0.0 for card in cards])
+        minimums = np.array([card.minimum_payment for card in cards])
+        monthly_rates = aprs / 12 / 100
+
+        first_minimums = float(np.minimum(minimums, balances * (1 + monthly_rates)).sum())
+        if first_minimums > request.monthly_budget:
+            raise InsufficientBudgetError(
+                "The monthly budget does not cover the minimum payments.",
+                code="BUDGET_BELOW_MINIMUMS",
+                details={"monthly_budget": request.monthly_budget, "total_minimums": round(first_minimums, 2)}
+            )
+
+        avalanche = np.argsort(-aprs, kind="stable")
+        priorities = {
+            "avalanche": avalanche,
+            "snowball": np.argsort(balances, kind="stable"),
+            "balanced": avalanche,
+        }
+        urgency = np.array([self._recommender._urgency_multiplier(card.payment_due_date) for card in cards])
+        balanced_weights = (aprs / 100) * urgency
+        strategies = list(dict.fromkeys(request.strategies))
+
+        trajectory, interest, paid, payoff_month = simulate_multi_card_payoff(
+            balances,
+            monthly_rates,
+            minimums,
+            np.array([card.credit_limit for card in cards]),
+            request.monthly_budget,
+            np.stack([priorities[strategy] for strategy in strategies]),
+            np.stack([balanced_weights if strategy == "balanced" else np.zeros(len(cards)) for strategy in strategies]),
+            self.horizon_months
+        )
+
+        results = [
+            self._strategy_result(strategy, cards, trajectory[:, row], interest[row], paid[row], payoff_month[row])
+            for row, strategy in enumerate(strategies)
+        ]
+        return MultiCardPayoffResponse(
+            user_id=request.user_id,
+            monthly_budget=request.monthly_budget,
+            horizon_months=self.horizon_months,
+            results=results,
+            lowest_interest_strategy=min(results, key=lambda result: result.total_interest_paid).strategy
+        )
+
+    def _strategy_result(
+        self,
+        strategy: str,
+        cards: List[CardData],
+        trajectory: np.ndarray,
+        interest: np.ndarray,
+        paid: np.ndarray,
+        payoff_month: np.ndarray
+    ) -> StrategyPayoffResult:
+        pays_off = bool((payoff_month >= 0).all())
+        months = int(payoff_month.max()) if pays_off else None
+        # Trajectories stop at this strategy's own payoff month.
+        trajectory = np.round(trajectory[:months] if pays_off else trajectory, 2)
+        return StrategyPayoffResult(
+            strategy=strategy,
+            pays_off=pays_off,
+            months_to_payoff=months,
+            total_interest_paid=round(float(interest.sum()), 2),
+            total_amount_paid=round(float(paid.sum()), 2),
+            card_payoff_months={
+                card.card_id: month if month >= 0 else None
+                for card, month in zip(cards, payoff_month.tolist())
+            },
+            card_balances={card.card_id: column for card, column in zip(cards, trajectory.T.tolist())},
+            total_balance=np.round(trajectory.sum(axis=1), 2).tolist()
+        )
+
+    def _scenario_plans(self, request: PayoffSimulationRequest) -> Tuple[np.ndarray, np.ndarray]:
+        """(extra over the minimum, payment floor) per scenario, without duplicates."""
+        plans = [(0.0, 0.0)]
+        if request.extra_payment > 0:
+            plans += [(request.extra_payment, 0.0), (request.extra_payment * 2, 0.0)]
+        aggressive = (0.0, round(request.current_balance * AGGRESSIVE_BALANCE_SHARE, 2))
+        if aggressive[1] > request.minimum_payment + plans[-1][0]:
+            plans.append(aggressive)
+        extras, floors = zip(*plans)
+        return np.array(extras), np.array(floors)
+
+    def _build_scenario(
+        self,
+        payment_amount: float,
+        months_to_payoff: int,
+        total_interest_paid: float,
+        total_amount_paid: float
+    ) -> PayoffScenario:
+        pays_off = months_to_payoff >= 0
+        payoff_date = None
+        if pays_off:
+            payoff_date = (current_evaluation_context().now + timedelta(days=30 * months_to_payoff)).isoformat()
+
         return PayoffScenario(
-            payment_amount=monthly_payment,
-            months_to_payoff=months_to_payoff,
-            total_interest_paid=total_interest_paid,
-            total_amount_paid=total_amount_paid,
-            payoff_date=payoff_date
+            payment_amount=round(payment_amount, 2),
+            months_to_payoff=months_to_payoff if pays_off else None,
+            total_interest_paid=round(total_interest_paid, 2),
+            total_amount_paid=round(total_amount_paid, 2),
+            payoff_date=payoff_date,
+            pays_off=pays_off
         )
@@ -0,0 +1,405 @@
+"""
+Stochastic State Store
+- SQLite-backed per-user aggregates for the stochastic planner
+- Applies transaction deltas incrementally behind a cursor, so callers send
+  only new transactions instead of the full history on every request
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+# (transaction_id, card_id, date, amount, category, observed_category, balance)
+# `category` is the inferred shared category used for transitions and spend;
+# `observed_category` is the normalized provider label used to size the category space.
+StateRow = Tuple[str, str, datetime, float, str, str, Optional[float]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_cursor (
+    user_id TEXT PRIMARY KEY,
+    last_date TEXT NOT NULL,
+    last_category TEXT NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen_transactions (
+    user_id TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, transaction_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS category_transitions (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, month, src, dst)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS category_observations (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS card_tails (
+    user_id TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    last_bucket TEXT,
+    credit_limit REAL,
+    PRIMARY KEY (user_id, card_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS utilization_transitions (
+    user_id TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, card_id, month, src, dst)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly_spend (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    amount REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, month, category, card_id)
+) WITHOUT ROWID;
+"""
+
+_USER_TABLES = (
+    "user_cursor",
+    "seen_transactions",
+    "category_transitions",
+    "category_observations",
+    "card_tails",
+    "utilization_transitions",
+    "monthly_spend",
+)
+
+
+class StateCursorMismatchError(Exception):
+    """Raised when a delta was built against a different cursor than the stored one."""
+
+    def __init__(self, message: str, expected: Optional[str], actual: Optional[str]):
+        super().__init__(message)
+        self.code = "STATE_CURSOR_MISMATCH"
+        self.details = {"expected_cursor": expected, "current_cursor": actual}
+
+    def __reduce__(self):
+        # Rebuild from constructor arguments when raised in a process-pool worker.
+        return type(self), (str(self), self.details["expected_cursor"], self.details["current_cursor"])
+
+
+@dataclass
+class UserCursor:
+    last_date: datetime
+    last_category: str
+    transaction_count: int
+
+    @property
+    def token(self) -> str:
+        """Opaque cursor handed back to clients; changes with every applied delta."""
+        return f"{self.last_date.isoformat()}#{self.transaction_count}"
+
+
+@dataclass
+class DeltaResult:
+    cursor: Optional[UserCursor]
+    ingested: int
+    skipped_duplicates: int
+    skipped_late: int
+
+
+def utilization_bucket(balance: Optional[float], credit_limit: Optional[float]) -> Optional[str]:
+    """Planner utilization bucket for a balance, or None when it cannot be computed."""
+    if balance is None or not credit_limit or credit_limit <= 0:
+        return None
+    utilization = max(0.0, min(100.0, (balance / credit_limit) * 100))
+    if utilization < 30:
+        return "low"
+    if utilization < 70:
+        return "medium"
+    return "high"
+
+
+class StateStore:
+    """
+    Per-user Markov, utilization-transition and spend aggregates in SQLite.
+
+    Transactions are applied in date order after the user's cursor. Category
+    and utilization transitions are bucketed by the month of the later
+    transaction, and spend by month, category and card, so reads can apply a
+    lookback window at month granularity. Rows dated before the cursor are
+    skipped and reported; backfilling history means resetting the user and
+    replaying it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def cursor(self, user_id: str) -> Optional[UserCursor]:
+        with self._lock:
+            return self._read_cursor(self._connection(), user_id)
+
+    def apply_delta(
+        self,
+        user_id: str,
+        rows: Iterable[StateRow],
+        card_limits: Optional[Dict[str, float]] = None,
+        expected_cursor: Optional[str] = None,
+    ) -> DeltaResult:
+        """
+        Fold new transactions into the user's aggregates in one SQLite transaction.
+
+        Work is proportional to the delta: only the user's cursor, the tails of
+        the cards in the delta and the touched counters are read or written.
+        """
+        rows = sorted(rows, key=lambda row: row[2])
+        card_limits = card_limits or {}
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._read_cursor(conn, user_id)
+                if expected_cursor is not None and (cursor.token if cursor else None) != expected_cursor:
+                    raise StateCursorMismatchError(
+                        "Delta was built against a different state cursor; resync from the current cursor.",
+                        expected=expected_cursor,
+                        actual=cursor.token if cursor else None,
+                    )
+
+                seen = self._seen_ids(conn, user_id, [row[0] for row in rows])
+                fresh: List[StateRow] = []
+                duplicates = late = 0
+                for row in rows:
+                    if row[0] in seen:
+                        duplicates += 1
+                    elif cursor is not None and row[2] < cursor.last_date:
+                        late += 1
+                    else:
+                        seen.add(row[0])
+                        fresh.append(row)
+
+                if fresh:
+                    cursor = self._fold(conn, user_id, cursor, fresh, card_limits)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return DeltaResult(cursor=cursor, ingested=len(fresh), skipped_duplicates=duplicates, skipped_late=late)
+
+    def reset(self, user_id: str) -> None:
+        """Drop everything stored for a user."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table in _USER_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def category_transitions(self, user_id: str, since_month: str) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT src, dst, SUM(count) FROM category_transitions "
+                "WHERE user_id = ? AND month >= ? GROUP BY src, dst",
+                (user_id, since_month),
+            ).fetchall()
+
+    def category_observations(self, user_id: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(
+                self._connection().execute(
+                    "SELECT category, count FROM category_observations WHERE user_id = ?",
+                    (user_id,),
+                ).fetchall()
+            )
+
+    def utilization_transitions(self, user_id: str, since_month: str) -> Dict[str, Dict[str, Dict[str, int]]]:
+        with self._lock:
+            records = self._connection().execute(
+                "SELECT card_id, src, dst, SUM(count) FROM utilization_transitions "
+                "WHERE user_id = ? AND month >= ? GROUP BY card_id, src, dst",
+                (user_id, since_month),
+            ).fetchall()
+        counts: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for card_id, src, dst, count in records:
+            counts.setdefault(card_id, {}).setdefault(src, {})[dst] = int(count)
+        return counts
+
+    def spend_by_category_and_card(self, user_id: str, since_month: str) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            records = self._connection().execute(
+                "SELECT category, card_id, SUM(amount) FROM monthly_spend "
+                "WHERE user_id = ? AND month >= ? GROUP BY category, card_id ORDER BY category, card_id",
+                (user_id, since_month),
+            ).fetchall()
+        spend: Dict[str, Dict[str, float]] = {}
+        for category, card_id, amount in records:
+            spend.setdefault(category, {})[card_id] = float(amount)
+        return spend
+
+    def purchases_by_category(self, user_id: str, since_month: str) -> Dict[str, Tuple[float, int]]:
+        """Positive spend total and purchase count per category since `since_month`."""
+        with self._lock:
+            records = self._connection().execute(
+                "SELECT category, SUM(amount), SUM(count) FROM monthly_spend "
+                "WHERE user_id = ? AND month >= ? GROUP BY category ORDER BY category",
+                (user_id, since_month),
+            ).fetchall()
+        return {category: (float(amount), int(count)) for category, amount, count in records}
+
+    def _read_cursor(self, conn: sqlite3.Connection, user_id: str) -> Optional[UserCursor]:
+        record = conn.execute(
+            "SELECT last_date, last_category, transaction_count FROM user_cursor WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        if record is None:
+            return None
+        return UserCursor(
+            last_date=datetime.fromisoformat(record[0]),
+            last_category=record[1],
+            transaction_count=int(record[2]),
+        )
+
+    def _seen_ids(self, conn: sqlite3.Connection, user_id: str, transaction_ids: List[str]) -> Set[str]:
+        seen: Set[str] = set()
+        distinct = list(dict.fromkeys(transaction_ids))
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(distinct), 500):
+            chunk = distinct[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            seen.update(
+                txn_id for (txn_id,) in conn.execute(
+                    f"SELECT transaction_id FROM seen_transactions WHERE user_id = ? AND transaction_id IN ({placeholders})",
+                    (user_id, *chunk),
+                )
+            )
+        return seen
+
+    def _fold(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str,
+        cursor: Optional[UserCursor],
+        rows: List[StateRow],
+        card_limits: Dict[str, float],
+    ) -> UserCursor:
+        card_ids = list(dict.fromkeys(row[1] for row in rows))
+        tails: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        for card_id in card_ids:
+            record = conn.execute(
+                "SELECT last_bucket, credit_limit FROM card_tails WHERE user_id = ? AND card_id = ?",
+                (user_id, card_id),
+            ).fetchone()
+            stored_limit = record[1] if record else None
+            tails[card_id] = (record[0] if record else None, card_limits.get(card_id, stored_limit))
+
+        category_pairs: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        observations: Dict[str, int] = defaultdict(int)
+        bucket_pairs: Dict[Tuple[str, str, str, str], int] = defaultdict(int)
+        spend: Dict[Tuple[str, str, str], List[float]] = {}
+
+        previous_category = cursor.last_category if cursor else None
+        for _, card_id, date, amount, category, observed_category, balance in rows:
+            month = date.strftime("%Y-%m")
+            observations[observed_category] += 1
+            if previous_category is not None:
+                category_pairs[(month, previous_category, category)] += 1
+            previous_category = category
+
+            last_bucket, credit_limit = tails[card_id]
+            bucket = utilization_bucket(balance, credit_limit)
+            if last_bucket is not None and bucket is not None:
+                bucket_pairs[(card_id, month, last_bucket, bucket)] += 1
+            tails[card_id] = (bucket, credit_limit)
+
+            if amount > 0:
+                totals = spend.setdefault((month, category, card_id), [0.0, 0])
+                totals[0] += amount
+                totals[1] += 1
+
+        conn.executemany(
+            "INSERT INTO category_transitions (user_id, month, src, dst, count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, month, src, dst) DO UPDATE SET count = count + excluded.count",
+            [(user_id, month, src, dst, count) for (month, src, dst), count in category_pairs.items()],
+        )
+        conn.executemany(
+            "INSERT INTO category_observations (user_id, category, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, category) DO UPDATE SET count = count + excluded.count",
+            [(user_id, category, count) for category, count in observations.items()],
+        )
+        conn.executemany(
+            "INSERT INTO utilization_transitions (user_id, card_id, month, src, dst, count) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, card_id, month, src, dst) DO UPDATE SET count = count + excluded.count",
+            [(user_id, card_id, month, src, dst, count) for (card_id, month, src, dst), count in bucket_pairs.items()],
+        )
+        conn.executemany(
+            "INSERT INTO monthly_spend (user_id, month, category, card_id, amount, count) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, month, category, card_id) DO UPDATE SET "
+            "amount = amount + excluded.amount, count = count + excluded.count",
+            [(user_id, month, category, card_id, total, count) for (month, category, card_id), (total, count) in spend.items()],
+        )
+        conn.executemany(
+            "INSERT INTO card_tails (user_id, card_id, last_bucket, credit_limit) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, card_id) DO UPDATE SET "
+            "last_bucket = excluded.last_bucket, credit_limit = excluded.credit_limit",
+            [(user_id, card_id, bucket, credit_limit) for card_id, (bucket, credit_limit) in tails.items()],
+        )
+        conn.executemany(
+            "INSERT INTO seen_transactions (user_id, transaction_id) VALUES (?, ?)",
+            [(user_id, row[0]) for row in rows],
+        )
+
+        updated = UserCursor(
+            last_date=rows[-1][2],
+            last_category=rows[-1][4],
+            transaction_count=(cursor.transaction_count if cursor else 0) + len(rows),
+        )
+        conn.execute(
+            "INSERT INTO user_cursor (user_id, last_date, last_category, transaction_count, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET "
+            "last_date = excluded.last_date, last_category = excluded.last_category, "
+            "transaction_count = excluded.transaction_count, updated_at = excluded.updated_at",
+            (user_id, updated.last_date.isoformat(), updated.last_category, updated.transaction_count,
+             datetime.utcnow().isoformat()),
+        )
+        return updated
+
+
+state_store = StateStore(settings.STOCHASTIC_STATE_PATH)
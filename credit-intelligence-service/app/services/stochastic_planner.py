@@ -6,22 +6,33 @@ Stochastic Planner Service
 
 from __future__ import annotations
 
-from collections import defaultdict
-from dataclasses import dataclass
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-import os
-from typing import Any, Dict, List, Optional, Tuple
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
 
-import httpx
-from dotenv import load_dotenv
 from app.core.config import settings
+from app.core.evaluation import current_evaluation_context, evaluation_scope
 
 from app.models.schemas import (
     SpendingProbabilityRequest,
     SpendingProbabilityResponse,
+    SpendingSequenceRequest,
+    SpendingSequenceResponse,
+    SpendingStepForecast,
+    StateIngestRequest,
+    StateIngestResponse,
+    StateSpendingProbabilityRequest,
+    StateCardChoiceBatchRequest,
     CategoryProbability,
     CardChoiceRequest,
     CardChoiceResponse,
+    CardChoiceBatchRequest,
+    CardChoiceBatchResponse,
+    CardChoiceBatchItem,
     NewCardOpportunitiesRequest,
     NewCardOpportunitiesResponse,
     CardActionValue,
@@ -39,18 +50,113 @@ from app.models.schemas import (
     ForecastNextSpendProbability,
     ForecastActionPlan,
     ForecastActionItem,
+    StochasticTransactionColumns,
+)
+from app.services import category_taxonomy
+from app.services.category_taxonomy import infer_shared_category
+from app.services.card_choice_shards import CardChoiceSharder, card_choice_sharder
+from app.services.date_parsing import epoch_microseconds_column, parse_transaction_date
+from app.services.mdp_solver import (
+    DUE_BUCKETS,
+    CardChoiceModel,
+    CardChoicePolicy,
+    CardPolicyCache,
+    due_bucket_index,
+    due_cycle_transitions,
+    solve_card_choice_mdp,
+)
+from app.services.markov import (
+    MarkovChainCache,
+    TransitionMatrix,
+    build_markov_chain,
+    history_digest,
 )
-from app.services.category_taxonomy import SHARED_CATEGORIES, infer_shared_category
+from app.services.reward_catalog import (
+    RewardCatalogIndex,
+    RewardCatalogProvider,
+    normalize_identity,
+    offer_to_rate_map,
+    reward_catalog,
+)
+from app.services.state_store import StateStore, state_store
+from app.services.transaction_frame import TransactionFrame
+
+UTILIZATION_BUCKETS = ("low", "medium", "high")
+# Utilization assumed for each bucket when scoring a purchase made from it.
+UTILIZATION_MIDPOINTS = np.array([20.0, 50.0, 85.0])
+# Penalty for charging a card in each of DUE_BUCKETS.
+DUE_PENALTIES = np.array([1.5, 0.5, 0.0])
+
+# Spend that no rewards card earns on; ignored when sizing upgrade opportunities.
+UPGRADE_EXCLUDED_CATEGORIES = {
+    "payments", "income", "transfers", "cash", "fees", "taxes", "government",
+    "rent", "mortgage",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Transaction fields read by `_normalize_history`, in unpacking order.
+_NORMALIZED_FIELDS = attrgetter("date", "category", "description", "merchant_name", "card_id", "amount", "balance")
+
+
+@dataclass
+class _NormalizedHistory:
+    """
+    Request transactions normalized once, for every computation in the request.
+
+    `frame` covers `lookback_days`; shorter lookbacks window it. The raw provider
+    categories cover all transactions, in window or not, since they size the
+    Markov category space.
+    """
+    frame: TransactionFrame
+    lookback_days: int
+    raw_categories: Tuple[Optional[str], ...]
 
 
 @dataclass
-class _Txn:
-    card_id: str
-    date: datetime
-    amount: float
-    category: str
-    description: str
-    balance: Optional[float]
+class _CardChoiceContext:
+    """Merchant-independent card-choice state, shared across a batch request."""
+    user_id: str
+    lookback_days: int
+    eligible_cards: List[Any]
+    # Positive spend per category, then per card, over the lookback window.
+    category_card_spend: Dict[str, Dict[str, float]]
+    transition_by_card: Dict[str, Dict[str, Dict[str, float]]]
+    upgrade_opportunities: List[UpgradeOpportunity]
+    # Category chain and positive (total, count) per category; only gathered for the value-iteration policy.
+    category_transitions: Optional[TransitionMatrix] = None
+    category_purchases: Optional[Dict[str, Tuple[float, int]]] = None
+    # Built on first use from the fields above.
+    scoring_grid: Optional["_CardScoringGrid"] = field(default=None, repr=False, compare=False)
+
+
+class _CardScoringGrid:
+    """
+    Per-request card parameters for Q-values over (cards x utilization buckets).
+
+    Covers the eligible cards that have a transition row for their current
+    utilization bucket, in eligible-card order. Everything except the reward
+    rate is merchant-independent; rates are resolved once per category.
+    """
+
+    def __init__(self, cards: List[Any], transitions: np.ndarray, state_index: np.ndarray, due_index: np.ndarray):
+        self.cards = cards
+        # (K, 3) transition probabilities out of each card's current bucket.
+        self.transitions = transitions
+        self.state_index = state_index
+        self.due_index = due_index
+        self.due_penalty = DUE_PENALTIES[due_index]
+        self.limit_floor = np.array([max(card.credit_limit, 1.0) for card in cards], dtype=np.float64)
+        self.credit_limits = np.array([card.credit_limit for card in cards], dtype=np.float64)
+        self.balances = np.array([card.current_balance for card in cards], dtype=np.float64)
+        self.apr_fraction = np.array(
+            [(card.interest_rate if card.interest_rate is not None else 0.0) / 100.0 for card in cards],
+            dtype=np.float64,
+        )
+        self._rates: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.cards)
 
 
 class NoRewardDataError(Exception):
@@ -66,6 +172,10 @@ class NoRewardDataError(Exception):
         self.skipped_cards = skipped_cards or []
         self.code = code
 
+    def __reduce__(self):
+        # Rebuild from constructor arguments when raised in a process-pool worker.
+        return type(self), (str(self), self.skipped_cards, self.code)
+
 
 class InsufficientDataError(Exception):
     """Raised when deterministic computation cannot proceed due to missing empirical data."""
@@ -75,27 +185,55 @@ class InsufficientDataError(Exception):
         self.code = code
         self.details = details or {}
 
+    def __reduce__(self):
+        return type(self), (str(self), self.code, self.details)
+
 
 class StochasticPlanner:
     """Hybrid stochastic engine for category and card decisions."""
 
-    def __init__(self):
-        self._reward_catalog_cache: Optional[List[Dict[str, Any]]] = None
-        self._env_loaded: bool = False
+    def __init__(
+        self,
+        catalog: Optional[RewardCatalogProvider] = None,
+        store: Optional[StateStore] = None,
+        sharder: Optional[CardChoiceSharder] = None,
+        card_choice_policy: Optional[str] = None,
+    ):
+        self._reward_catalog = catalog or reward_catalog
+        self._state_store = store or state_store
+        self._sharder = sharder or card_choice_sharder
+        self._catalog_index: Optional[RewardCatalogIndex] = None
+        self._chain_cache = MarkovChainCache(settings.MARKOV_CHAIN_CACHE_SIZE)
+        # "one_step" lookahead or the "value_iteration" MDP policy.
+        self._card_choice_policy = card_choice_policy or settings.CARD_CHOICE_POLICY
+        self._policy_cache = CardPolicyCache(settings.MDP_POLICY_CACHE_SIZE)
 
     def invalidate_reward_catalog_cache(self) -> None:
-        self._reward_catalog_cache = None
+        self._reward_catalog.invalidate()
 
+    @evaluation_scope
     def predict_spending_probability(
         self,
         request: SpendingProbabilityRequest,
     ) -> SpendingProbabilityResponse:
-        category_space = self._derive_category_space(request.transactions)
-        transactions = self._filter_and_normalize_transactions(
-            transactions=request.transactions,
+        return self._spending_probability_from_history(
+            user_id=request.user_id,
+            history=self._normalize_history(request.transactions, request.lookback_days),
             lookback_days=request.lookback_days,
+            current_category=request.current_category,
+            transition_counts_format=request.transition_counts_format,
         )
 
+    def _spending_probability_from_history(
+        self,
+        user_id: str,
+        history: _NormalizedHistory,
+        lookback_days: int,
+        current_category: Optional[str],
+        transition_counts_format: str,
+    ) -> SpendingProbabilityResponse:
+        transactions = self._history_window(history, lookback_days)
+
         if len(transactions) < 2:
             raise InsufficientDataError(
                 "At least two in-window transactions are required to compute transition probabilities.",
@@ -103,12 +241,71 @@ class StochasticPlanner:
                 details={"required_transactions": 2, "observed_transactions": len(transactions)},
             )
 
-        transitions = self._build_category_transition_counts(transactions, category_space)
-        current_category = self._normalize_category(request.current_category) if request.current_category else transactions[-1].category
+        transitions = self._build_category_transition_counts(transactions, self._history_category_space(history))
+        current_category = self._normalize_category(current_category) if current_category else transactions.category_at(-1)
+        return self._spending_probability_response(
+            user_id=user_id,
+            transitions=transitions,
+            current_category=current_category,
+            transition_counts_format=transition_counts_format,
+        )
+
+    @evaluation_scope
+    def predict_spending_probability_from_state(
+        self,
+        request: StateSpendingProbabilityRequest,
+    ) -> SpendingProbabilityResponse:
+        """Same prediction as predict_spending_probability, read from the user's stored transition counts."""
+        cursor = self._state_store.cursor(request.user_id)
+        if cursor is None:
+            raise InsufficientDataError(
+                "No stored transaction state for this user; ingest transactions first.",
+                code="STATE_NOT_FOUND",
+            )
+
+        transitions = self._state_category_transitions(request.user_id, self._state_since_month(request.lookback_days))
+        if transitions is None:
+            raise InsufficientDataError(
+                "At least two in-window transactions are required to compute transition probabilities.",
+                code="INSUFFICIENT_SPENDING_HISTORY",
+                details={"required_transactions": 2, "observed_transactions": cursor.transaction_count},
+            )
+        current_category = self._normalize_category(request.current_category) if request.current_category else cursor.last_category
+        return self._spending_probability_response(
+            user_id=request.user_id,
+            transitions=transitions,
+            current_category=current_category,
+            transition_counts_format=request.transition_counts_format,
+        )
+
+    def _state_category_transitions(self, user_id: str, since_month: str) -> Optional[TransitionMatrix]:
+        """Stored category transition counts since `since_month`, or None when there are none."""
+        pairs = self._state_store.category_transitions(user_id, since_month)
+        if not pairs:
+            return None
+        category_space = self._category_space_from_counts(self._state_store.category_observations(user_id))
+        position = {category: idx for idx, category in enumerate(category_space)}
+        other = position["other"]
+        return TransitionMatrix.from_pair_counts(
+            np.array([position.get(src, other) for src, _, _ in pairs], dtype=np.intp),
+            np.array([position.get(dst, other) for _, dst, _ in pairs], dtype=np.intp),
+            np.array([count for _, _, count in pairs], dtype=np.float64),
+            category_space,
+            dense_max_states=settings.MARKOV_DENSE_MAX_STATES,
+        )
+
+    def _spending_probability_response(
+        self,
+        user_id: str,
+        transitions: TransitionMatrix,
+        current_category: str,
+        transition_counts_format: str,
+    ) -> SpendingProbabilityResponse:
+        category_space = transitions.labels
         current_category = current_category if current_category in category_space else "other"
 
-        row = transitions[current_category]
-        row_total = sum(row.values())
+        row = transitions.row(transitions.index(current_category)).tolist()
+        row_total = sum(row)
         if row_total <= 0:
             raise InsufficientDataError(
                 "No observed outgoing transitions for the selected current category.",
@@ -117,51 +314,266 @@ class StochasticPlanner:
             )
 
         probs = []
-        for cat in category_space:
-            p = row.get(cat, 0) / row_total
+        for cat, count in zip(category_space, row):
+            p = count / row_total
             probs.append(CategoryProbability(category=cat, probability=round(p, 6)))
 
         probs.sort(key=lambda x: x.probability, reverse=True)
         top_category = probs[0].category if probs else "other"
 
         return SpendingProbabilityResponse(
-            user_id=request.user_id,
+            user_id=user_id,
             current_category=current_category,
             probabilities=probs,
             top_category=top_category,
-            transition_counts={
-                src: {dst: int(counts.get(dst, 0)) for dst in category_space}
-                for src, counts in transitions.items()
-            },
-            computed_at=datetime.utcnow().isoformat(),
+            transition_counts=transitions.to_dict(nonzero_only=transition_counts_format == "nonzero"),
+            computed_at=current_evaluation_context().utc_now.isoformat(),
         )
 
+    @evaluation_scope
+    def forecast_spending_sequence(
+        self,
+        request: SpendingSequenceRequest,
+    ) -> SpendingSequenceResponse:
+        """
+        Category distributions for each of the next `steps` purchases, plus the
+        stationary distribution, from the same transition counts as
+        predict_spending_probability.
+        """
+        return self._spending_sequence_from_history(
+            user_id=request.user_id,
+            history=self._normalize_history(request.transactions, request.lookback_days),
+            lookback_days=request.lookback_days,
+            current_category=request.current_category,
+            steps=request.steps,
+            smoothing=request.smoothing,
+        )
+
+    def _spending_sequence_from_history(
+        self,
+        user_id: str,
+        history: _NormalizedHistory,
+        lookback_days: int,
+        current_category: Optional[str],
+        steps: int,
+        smoothing: float,
+    ) -> SpendingSequenceResponse:
+        category_space = self._history_category_space(history)
+        transactions = self._history_window(history, lookback_days)
+
+        if len(transactions) < 2:
+            raise InsufficientDataError(
+                "At least two in-window transactions are required to compute transition probabilities.",
+                code="INSUFFICIENT_SPENDING_HISTORY",
+                details={"required_transactions": 2, "observed_transactions": len(transactions)},
+            )
+
+        counts = self._build_category_transition_counts(transactions, category_space).dense()
+        current_category = self._normalize_category(current_category) if current_category else transactions.category_at(-1)
+        current_category = current_category if current_category in category_space else "other"
+        current_index = category_space.index(current_category)
+
+        if smoothing <= 0 and counts[current_index].sum() <= 0:
+            raise InsufficientDataError(
+                "No observed outgoing transitions for the selected current category.",
+                code="INSUFFICIENT_CATEGORY_TRANSITIONS",
+                details={"current_category": current_category},
+            )
+
+        history_hash = history_digest(counts, category_space, smoothing)
+        chain = self._chain_cache.get_or_compute(
+            history_hash,
+            lambda: build_markov_chain(counts, category_space, smoothing=smoothing),
+        )
+
+        step_forecasts = []
+        for step, distribution in enumerate(chain.step_distributions(current_index, steps), start=1):
+            probabilities = self._ranked_category_probabilities(category_space, distribution)
+            step_forecasts.append(
+                SpendingStepForecast(
+                    step=step,
+                    probabilities=probabilities,
+                    top_category=probabilities[0].category,
+                )
+            )
+
+        return SpendingSequenceResponse(
+            user_id=user_id,
+            current_category=current_category,
+            steps=step_forecasts,
+            stationary_distribution=self._ranked_category_probabilities(category_space, chain.stationary),
+            smoothing=smoothing,
+            history_hash=history_hash,
+            computed_at=current_evaluation_context().utc_now.isoformat(),
+        )
+
+    def markov_chain_cache_info(self) -> Dict[str, int]:
+        return self._chain_cache.info()
+
+    def _ranked_category_probabilities(self, category_space: List[str], distribution) -> List[CategoryProbability]:
+        probs = [
+            CategoryProbability(category=cat, probability=round(min(max(float(p), 0.0), 1.0), 6))
+            for cat, p in zip(category_space, distribution)
+        ]
+        probs.sort(key=lambda x: x.probability, reverse=True)
+        return probs
+
+    @evaluation_scope
     def choose_card_for_merchant(
         self,
         request: CardChoiceRequest,
+        offers: Optional[List[Dict[str, Any]]] = None,
     ) -> CardChoiceResponse:
-        if not request.cards:
-            raise NoRewardDataError("No benefit to card yet", [])
+        context = self._build_card_choice_context(
+            user_id=request.user_id,
+            cards=request.cards,
+            transactions=request.transactions,
+            lookback_days=request.lookback_days,
+            offers=offers,
+        )
+        return self._choose_card_with_context(
+            context=context,
+            merchant_name=request.merchant_name,
+            merchant_category=request.merchant_category,
+            used_card_id=request.used_card_id,
+            estimated_amount=request.estimated_amount,
+        )
 
-        offers = self._load_reward_catalog()
-        resolved_reward_maps, skipped_card_ids = self._resolve_reward_maps(request.cards, offers)
-        eligible_cards = []
-        for card in request.cards:
-            reward_map = resolved_reward_maps.get(card.card_id)
-            if not reward_map:
-                continue
-            card.estimated_reward_rate_by_category = reward_map
-            eligible_cards.append(card)
+    @evaluation_scope
+    def choose_cards_for_batch(
+        self,
+        request: CardChoiceBatchRequest,
+        offers: Optional[List[Dict[str, Any]]] = None,
+    ) -> CardChoiceBatchResponse:
+        """
+        Score every recent transaction against one shared context.
 
-        if not eligible_cards:
-            raise NoRewardDataError("No benefit to card yet", skipped_card_ids)
+        History normalization, reward-map resolution, utilization transitions and
+        upgrade opportunities do not depend on the merchant, so they are built once
+        per request instead of once per recent transaction.
+        """
+        return self._choose_cards_for_batch(
+            user_id=request.user_id,
+            recent_transactions=request.recent_transactions,
+            build_context=lambda: self._build_card_choice_context(
+                user_id=request.user_id,
+                cards=request.cards,
+                transactions=request.transactions,
+                lookback_days=request.lookback_days,
+                offers=offers,
+            ),
+        )
 
-        merchant_category = self._normalize_category(request.merchant_category or request.merchant_name)
+    @evaluation_scope
+    def choose_cards_for_batch_from_state(
+        self,
+        request: StateCardChoiceBatchRequest,
+        offers: Optional[List[Dict[str, Any]]] = None,
+    ) -> CardChoiceBatchResponse:
+        """Batched card choice with history aggregates read from the user's stored state."""
+        return self._choose_cards_for_batch(
+            user_id=request.user_id,
+            recent_transactions=request.recent_transactions,
+            build_context=lambda: self._build_card_choice_context_from_state(
+                user_id=request.user_id,
+                cards=request.cards,
+                lookback_days=request.lookback_days,
+                offers=offers,
+            ),
+        )
 
-        txns = self._filter_and_normalize_transactions(
-            transactions=request.transactions,
-            lookback_days=request.lookback_days,
+    def _choose_cards_for_batch(
+        self,
+        user_id: str,
+        recent_transactions,
+        build_context: Callable[[], _CardChoiceContext],
+    ) -> CardChoiceBatchResponse:
+        scored = [txn for txn in recent_transactions if abs(float(txn.amount or 0)) > 0]
+        context: Optional[_CardChoiceContext] = None
+        context_error: Optional[Exception] = None
+        if scored:
+            try:
+                context = build_context()
+            except (InsufficientDataError, NoRewardDataError) as e:
+                context_error = e
+
+        if not scored:
+            results: List[CardChoiceBatchItem] = []
+        elif context_error is not None:
+            results = [self._skipped_batch_item(txn, context_error) for txn in scored]
+        elif self._sharder.should_shard(len(scored)):
+            results = self._sharder.score(context, scored)
+        else:
+            results = self._score_batch_items(context, scored)
+
+        return CardChoiceBatchResponse(
+            user_id=user_id,
+            results=results,
+            computed_at=current_evaluation_context().utc_now.isoformat(),
+        )
+
+    def _score_batch_items(self, context: _CardChoiceContext, transactions) -> List[CardChoiceBatchItem]:
+        """Card choice for each recent transaction; expected data gaps become skipped items."""
+        if not transactions:
+            return []
+        merchant_names = [txn.description or "Unknown merchant" for txn in transactions]
+        merchant_categories = [
+            self._normalize_category(txn.category or name) for txn, name in zip(transactions, merchant_names)
+        ]
+        amounts = np.array([abs(float(txn.amount or 0)) for txn in transactions], dtype=np.float64)
+        q_grid = self._action_values(context, merchant_categories, amounts)
+
+        items: List[CardChoiceBatchItem] = []
+        for position, txn in enumerate(transactions):
+            try:
+                choice = self._choose_card_with_context(
+                    context=context,
+                    merchant_name=merchant_names[position],
+                    merchant_category=txn.category,
+                    used_card_id=txn.card_id,
+                    estimated_amount=float(amounts[position]),
+                    q_values=tuple(values[position] for values in q_grid),
+                )
+            except (InsufficientDataError, NoRewardDataError) as e:
+                items.append(self._skipped_batch_item(txn, e))
+                continue
+            items.append(
+                CardChoiceBatchItem(
+                    transaction_id=txn.id,
+                    used_card_id=txn.card_id,
+                    merchant_name=merchant_names[position],
+                    merchant_category=txn.category,
+                    estimated_amount=float(amounts[position]),
+                    card_choice=choice,
+                )
+            )
+        return items
+
+    def _skipped_batch_item(self, txn, error: Exception) -> CardChoiceBatchItem:
+        return CardChoiceBatchItem(
+            transaction_id=txn.id,
+            used_card_id=txn.card_id,
+            merchant_name=txn.description or "Unknown merchant",
+            merchant_category=txn.category,
+            estimated_amount=abs(float(txn.amount or 0)),
+            skipped_code=error.code,
+            skipped_reason=str(error),
         )
+
+    def _build_card_choice_context(
+        self,
+        user_id: str,
+        cards,
+        transactions,
+        lookback_days: int,
+        offers: Optional[List[Dict[str, Any]]] = None,
+    ) -> _CardChoiceContext:
+        """Resolve everything card choice needs that is independent of the merchant."""
+        offers = offers if offers is not None else self._load_reward_catalog()
+        eligible_cards = self._reward_eligible_cards(cards, offers)
+
+        history = self._normalize_history(transactions, lookback_days)
+        txns = history.frame
         if len(txns) < 2:
             raise InsufficientDataError(
                 "At least two in-window transactions are required for card-choice transition modeling.",
@@ -175,53 +587,148 @@ class StochasticPlanner:
             card_limits=card_limits,
         )
 
-        gamma = 0.9
-        action_values: List[CardActionValue] = []
+        upgrade_opportunities = self._build_upgrade_opportunities(
+            txns=txns,
+            cards=eligible_cards,
+            offers=offers,
+            lookback_days=lookback_days,
+        )
+
+        context = _CardChoiceContext(
+            user_id=user_id,
+            lookback_days=lookback_days,
+            eligible_cards=eligible_cards,
+            category_card_spend=txns.sum_by_category_and_card(txns.amounts > 0),
+            transition_by_card=transition_by_card,
+            upgrade_opportunities=upgrade_opportunities,
+        )
+        if self._card_choice_policy == "value_iteration":
+            positive = txns.amounts > 0
+            context.category_transitions = self._build_category_transition_counts(
+                txns, self._history_category_space(history)
+            )
+            counts = txns.count_by_category(positive)
+            context.category_purchases = {
+                category: (total, counts[category]) for category, total in txns.sum_by_category(positive).items()
+            }
+        return context
 
+    def _build_card_choice_context_from_state(
+        self,
+        user_id: str,
+        cards,
+        lookback_days: int,
+        offers: Optional[List[Dict[str, Any]]] = None,
+    ) -> _CardChoiceContext:
+        """
+        Card-choice context from stored aggregates.
+
+        Utilization buckets were assigned with the credit limits known at ingest
+        time, and the lookback window applies at month granularity.
+        """
+        offers = offers if offers is not None else self._load_reward_catalog()
+        eligible_cards = self._reward_eligible_cards(cards, offers)
+
+        cursor = self._state_store.cursor(user_id)
+        observed = cursor.transaction_count if cursor else 0
+        if observed < 2:
+            raise InsufficientDataError(
+                "At least two in-window transactions are required for card-choice transition modeling.",
+                code="INSUFFICIENT_TRANSACTION_HISTORY",
+                details={"required_transactions": 2, "observed_transactions": observed},
+            )
+
+        since_month = self._state_since_month(lookback_days)
+        stored_transitions = self._state_store.utilization_transitions(user_id, since_month)
+        transition_by_card = {}
         for card in eligible_cards:
-            transitions = transition_by_card.get(card.card_id)
-            if not transitions:
+            stored = stored_transitions.get(card.card_id)
+            if not stored:
                 continue
-            state_bucket = self._bucket_for_utilization(card.utilization_percentage)
-            state_row = transitions.get(state_bucket)
-            if not state_row:
+            counts = {
+                src: {dst: stored.get(src, {}).get(dst, 0) for dst in UTILIZATION_BUCKETS}
+                for src in UTILIZATION_BUCKETS
+            }
+            normalized = self._normalize_bucket_counts(counts)
+            if normalized:
+                transition_by_card[card.card_id] = normalized
+
+        category_card_spend = self._state_store.spend_by_category_and_card(user_id, since_month)
+        spend_by_category = {
+            category: sum(by_card.values())
+            for category, by_card in category_card_spend.items()
+            if category not in UPGRADE_EXCLUDED_CATEGORIES
+        }
+
+        context = _CardChoiceContext(
+            user_id=user_id,
+            lookback_days=lookback_days,
+            eligible_cards=eligible_cards,
+            category_card_spend=category_card_spend,
+            transition_by_card=transition_by_card,
+            upgrade_opportunities=self._upgrade_opportunities_from_spend(
+                spend_by_category, eligible_cards, offers, lookback_days
+            ),
+        )
+        if self._card_choice_policy == "value_iteration":
+            context.category_transitions = self._state_category_transitions(user_id, since_month)
+            context.category_purchases = self._state_store.purchases_by_category(user_id, since_month)
+        return context
+
+    def _reward_eligible_cards(self, cards, offers: List[Dict[str, Any]]) -> List[Any]:
+        """Cards with a resolvable reward map, annotated with it; raises when none qualify."""
+        if not cards:
+            raise NoRewardDataError("No benefit to card yet", [])
+
+        resolved_reward_maps, skipped_card_ids = self._resolve_reward_maps(cards, offers)
+        eligible_cards = []
+        for card in cards:
+            reward_map = resolved_reward_maps.get(card.card_id)
+            if not reward_map:
                 continue
+            card.estimated_reward_rate_by_category = reward_map
+            eligible_cards.append(card)
 
-            immediate = self._state_reward(
-                card=card,
-                util_bucket=state_bucket,
-                merchant_category=merchant_category,
-                estimated_amount=request.estimated_amount,
-            )
-            expected_next = sum(
-                state_row[dst] * self._state_reward(
-                    card=card,
-                    util_bucket=dst,
-                    merchant_category=merchant_category,
-                    estimated_amount=request.estimated_amount,
-                )
-                for dst in ("low", "medium", "high")
-            )
+        if not eligible_cards:
+            raise NoRewardDataError("No benefit to card yet", skipped_card_ids)
+        return eligible_cards
 
-            post_util = min(
-                100.0,
-                max(
-                    0.0,
-                    ((card.current_balance + request.estimated_amount) / card.credit_limit) * 100,
-                ),
-            )
+    def _choose_card_with_context(
+        self,
+        context: _CardChoiceContext,
+        merchant_name: str,
+        merchant_category: Optional[str],
+        used_card_id: Optional[str],
+        estimated_amount: float,
+        q_values: Optional[Tuple[np.ndarray, ...]] = None,
+    ) -> CardChoiceResponse:
+        """
+        Score one purchase against the shared context.
 
-            q_value = immediate + gamma * expected_next
+        `q_values` are this purchase's rows of `_action_values`; batch scoring
+        passes them in so every purchase shares one broadcasted computation.
+        """
+        eligible_cards = context.eligible_cards
 
-            action_values.append(
-                CardActionValue(
-                    card_id=card.card_id,
-                    q_value=round(q_value, 6),
-                    immediate_reward=round(immediate, 6),
-                    expected_next_value=round(expected_next, 6),
-                    estimated_post_utilization=round(post_util, 2),
-                )
+        merchant_category = self._normalize_category(merchant_category or merchant_name)
+
+        grid = self._card_scoring_grid(context)
+        if q_values is None:
+            q_values = tuple(
+                values[0] for values in self._action_values(context, [merchant_category], np.array([estimated_amount]))
             )
+        immediate, expected_next, q, post_util = (values.tolist() for values in q_values)
+
+        action_values: List[CardActionValue] = [
+            CardActionValue(
+                card_id=card.card_id,
+                q_value=round(q[k], 6),
+                immediate_reward=round(immediate[k], 6),
+                expected_next_value=round(expected_next[k], 6),
+                estimated_post_utilization=round(post_util[k], 2),
+            )
+            for k, card in enumerate(grid.cards)
+        ]
 
         if not action_values:
             raise InsufficientDataError(
@@ -233,12 +740,11 @@ class StochasticPlanner:
         recommended = action_values[0].card_id if action_values else eligible_cards[0].card_id
 
         inferred_baseline_card_id, estimated_monthly_spend = self._infer_baseline_and_monthly_spend(
-            txns=txns,
-            merchant_category=merchant_category,
-            lookback_days=request.lookback_days,
+            spend_by_card=context.category_card_spend.get(merchant_category, {}),
+            lookback_days=context.lookback_days,
         )
 
-        explicit_used_card = request.used_card_id
+        explicit_used_card = used_card_id
         card_ids = {card.card_id for card in eligible_cards}
         baseline_card_id = explicit_used_card if explicit_used_card in card_ids else inferred_baseline_card_id
 
@@ -254,16 +760,11 @@ class StochasticPlanner:
             merchant_category,
         )
 
-        baseline_reward = request.estimated_amount * baseline_rate
-        recommended_reward = request.estimated_amount * recommended_rate
+        baseline_reward = estimated_amount * baseline_rate
+        recommended_reward = estimated_amount * recommended_rate
         incremental_reward = max(0.0, recommended_reward - baseline_reward)
 
-        upgrade_opportunities = self._build_upgrade_opportunities(
-            txns=txns,
-            cards=eligible_cards,
-            offers=offers,
-            lookback_days=request.lookback_days,
-        )
+        upgrade_opportunities = context.upgrade_opportunities
         upgrade_opportunity = upgrade_opportunities[0] if upgrade_opportunities else None
 
         min_incremental = max(0.0, float(settings.MIN_INCREMENTAL_REWARD_DOLLARS))
@@ -297,15 +798,15 @@ class StochasticPlanner:
                 estimated_annual_incremental_reward=round(annual_incremental, 4),
                 message={
                     "en": (
-                        f"For this {request.merchant_name} transaction, use card {recommended} instead of card "
+                        f"For this {merchant_name} transaction, use card {recommended} instead of card "
                         f"{baseline_card_id} to earn about ${incremental_reward:.2f} more in rewards."
                     ),
                     "fr": (
-                        f"Pour cette transaction chez {request.merchant_name}, utilisez la carte {recommended} "
+                        f"Pour cette transaction chez {merchant_name}, utilisez la carte {recommended} "
                         f"au lieu de {baseline_card_id} pour gagner environ {incremental_reward:.2f}$ de plus en recompenses."
                     ),
                     "ar": (
-                        f"لهذه المعاملة لدى {request.merchant_name}، استخدم البطاقة {recommended} بدلا من "
+                        f"لهذه المعاملة لدى {merchant_name}، استخدم البطاقة {recommended} بدلا من "
                         f"{baseline_card_id} للحصول على مكافآت إضافية تقارب ${incremental_reward:.2f}."
                     ),
                 },
@@ -313,17 +814,17 @@ class StochasticPlanner:
 
         reason = {
             "en": (
-                f"Recommended card {recommended} for {request.merchant_name} ({merchant_category}) "
+                f"Recommended card {recommended} for {merchant_name} ({merchant_category}) "
                 "using an MDP objective that balances reward earning, utilization risk, due-date pressure, "
                 "and expected future state value."
             ),
             "fr": (
-                f"Carte recommandee {recommended} pour {request.merchant_name} ({merchant_category}) "
+                f"Carte recommandee {recommended} pour {merchant_name} ({merchant_category}) "
                 "avec un objectif MDP equilibrant recompenses, risque d'utilisation, urgence d'echeance "
                 "et valeur future attendue."
             ),
             "ar": (
-                f"البطاقة الموصى بها {recommended} لدى {request.merchant_name} ({merchant_category}) "
+                f"البطاقة الموصى بها {recommended} لدى {merchant_name} ({merchant_category}) "
                 "باستخدام هدف قرار MDP يوازن بين المكافآت ومخاطر الاستخدام وضغط تاريخ الاستحقاق والقيمة المستقبلية."
             ),
         }
@@ -341,8 +842,8 @@ class StochasticPlanner:
             )
 
         return CardChoiceResponse(
-            user_id=request.user_id,
-            merchant_name=request.merchant_name,
+            user_id=context.user_id,
+            merchant_name=merchant_name,
             merchant_category=merchant_category,
             recommended_card_id=recommended,
             policy_reasoning=reason,
@@ -352,22 +853,24 @@ class StochasticPlanner:
             upgrade_opportunity=upgrade_opportunity,
             new_card_opportunities=upgrade_opportunities,
             upgrade_opportunities=upgrade_opportunities,
-            computed_at=datetime.utcnow().isoformat(),
+            computed_at=current_evaluation_context().utc_now.isoformat(),
         )
 
+    @evaluation_scope
     def recommend_new_card_opportunities(
         self,
         request: NewCardOpportunitiesRequest,
+        offers: Optional[List[Dict[str, Any]]] = None,
     ) -> NewCardOpportunitiesResponse:
         """Scenario 2 only: suggest external cards based on concentrated category spending."""
         if not request.cards:
             return NewCardOpportunitiesResponse(
                 user_id=request.user_id,
                 opportunities=[],
-                computed_at=datetime.utcnow().isoformat(),
+                computed_at=current_evaluation_context().utc_now.isoformat(),
             )
 
-        offers = self._load_reward_catalog()
+        offers = offers if offers is not None else self._load_reward_catalog()
         resolved_reward_maps, _ = self._resolve_reward_maps(request.cards, offers)
         eligible_cards = []
         for card in request.cards:
@@ -381,7 +884,7 @@ class StochasticPlanner:
             return NewCardOpportunitiesResponse(
                 user_id=request.user_id,
                 opportunities=[],
-                computed_at=datetime.utcnow().isoformat(),
+                computed_at=current_evaluation_context().utc_now.isoformat(),
             )
 
         txns = self._filter_and_normalize_transactions(
@@ -399,27 +902,68 @@ class StochasticPlanner:
         return NewCardOpportunitiesResponse(
             user_id=request.user_id,
             opportunities=opportunities,
-            computed_at=datetime.utcnow().isoformat(),
+            computed_at=current_evaluation_context().utc_now.isoformat(),
         )
 
+    @evaluation_scope
+    def ingest_transactions(self, request: StateIngestRequest) -> StateIngestResponse:
+        """Normalize a transaction delta and fold it into the user's stored state."""
+        rows = []
+        skipped_invalid = 0
+        for txn in request.transactions:
+            date = self._safe_parse_date(txn.date)
+            if date is None:
+                skipped_invalid += 1
+                continue
+            category = infer_shared_category(
+                raw_category=txn.category,
+                description=txn.description,
+                merchant_name=txn.merchant_name,
+            )
+            rows.append(
+                (txn.id, txn.card_id, date, txn.amount, category, self._normalize_category(txn.category), txn.balance)
+            )
+
+        result = self._state_store.apply_delta(
+            user_id=request.user_id,
+            rows=rows,
+            card_limits=request.card_limits,
+            expected_cursor=request.cursor,
+        )
+        cursor = result.cursor
+        return StateIngestResponse(
+            user_id=request.user_id,
+            cursor=cursor.token if cursor else None,
+            last_transaction_date=cursor.last_date.isoformat() if cursor else None,
+            ingested=result.ingested,
+            skipped_duplicates=result.skipped_duplicates,
+            skipped_late=result.skipped_late,
+            skipped_invalid=skipped_invalid,
+            transaction_count=cursor.transaction_count if cursor else 0,
+            computed_at=current_evaluation_context().utc_now.isoformat(),
+        )
+
+    def reset_state(self, user_id: str) -> None:
+        self._state_store.reset(user_id)
+        self._policy_cache.invalidate(user_id)
+
+    @evaluation_scope
     def build_forecast_insights(
         self,
         request: ForecastInsightsRequest,
     ) -> ForecastInsightsResponse:
-        txns = self._filter_and_normalize_transactions(
-            transactions=request.transactions,
-            lookback_days=730,
-        )
+        history = self._normalize_history(request.transactions, lookback_days=730)
+        txns = history.frame
 
         start_date = request.start_date[:10]
         end_date = request.end_date[:10]
-        today_iso = (request.current_date or datetime.utcnow().strftime("%Y-%m-%d"))[:10]
+        today_iso = (request.current_date or current_evaluation_context().utc_now.strftime("%Y-%m-%d"))[:10]
 
-        filtered = [t for t in txns if start_date <= t.date.strftime("%Y-%m-%d") <= end_date and t.amount > 0]
+        positive = txns.amounts > 0
+        filtered = positive & txns.day_range_mask(start_date, end_date)
+        filtered_count = int(np.count_nonzero(filtered))
 
-        range_totals: Dict[str, float] = defaultdict(float)
-        for txn in filtered:
-            range_totals[txn.category] += txn.amount
+        range_totals = txns.sum_by_category(filtered)
 
         top_categories = sorted(
             [ForecastCategoryTotal(category=cat, amount=round(amount, 2)) for cat, amount in range_totals.items()],
@@ -427,10 +971,7 @@ class StochasticPlanner:
             reverse=True,
         )[:5]
 
-        monthly_totals: Dict[str, float] = defaultdict(float)
-        for txn in filtered:
-            ym = txn.date.strftime("%Y-%m")
-            monthly_totals[ym] += txn.amount
+        monthly_totals = txns.sum_by_month(filtered)
 
         monthly_trend = [
             ForecastMonthlyPoint(month=ym, total=round(total, 2))
@@ -469,13 +1010,7 @@ class StochasticPlanner:
                 prev_end_dt = start_dt - timedelta(days=1)
                 prev_start_dt = prev_end_dt - timedelta(days=period_days - 1)
 
-            prev_totals: Dict[str, float] = defaultdict(float)
-            for txn in txns:
-                if txn.amount <= 0:
-                    continue
-                d = txn.date
-                if prev_start_dt <= d <= prev_end_dt:
-                    prev_totals[txn.category] += txn.amount
+            prev_totals = txns.sum_by_category(positive & txns.date_range_mask(prev_start_dt, prev_end_dt))
 
             for item in top_categories:
                 current_amount = float(item.amount)
@@ -519,19 +1054,10 @@ class StochasticPlanner:
             is_mtd = start_date == month_start_iso and end_date == today_iso
 
             if is_mtd:
-                this_month_totals: Dict[str, float] = defaultdict(float)
-                per_month_category_totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
-                per_month_spend_totals: Dict[str, float] = defaultdict(float)
-
-                for txn in txns:
-                    if txn.amount <= 0:
-                        continue
-                    d = txn.date.strftime("%Y-%m-%d")
-                    ym = txn.date.strftime("%Y-%m")
-                    per_month_category_totals[ym][txn.category] += txn.amount
-                    per_month_spend_totals[ym] += txn.amount
-                    if month_start_iso <= d <= today_iso:
-                        this_month_totals[txn.category] += txn.amount
+                this_month = positive & txns.day_range_mask(month_start_iso, today_iso)
+                this_month_totals = txns.sum_by_category(this_month)
+                per_month_category_totals = txns.sum_by_month_and_category(positive)
+                per_month_spend_totals = txns.sum_by_month(positive)
 
                 full_past_months = sorted([ym for ym in per_month_category_totals.keys() if ym < month_iso])[-6:]
 
@@ -567,7 +1093,7 @@ class StochasticPlanner:
                     elapsed_pct = day_of_month / max(month_days, 1)
                     projected_month_end = mtd_spend / max(elapsed_pct, 0.1)
 
-                    txn_count = len([t for t in txns if month_start_iso <= t.date.strftime("%Y-%m-%d") <= today_iso and t.amount > 0])
+                    txn_count = int(np.count_nonzero(this_month))
                     confidence = "High" if txn_count >= 25 else "Medium" if txn_count >= 12 else "Low"
                     volatility = 0.08 if confidence == "High" else 0.13 if confidence == "Medium" else 0.2
                     projected_low = projected_month_end * (1 - volatility)
@@ -596,15 +1122,14 @@ class StochasticPlanner:
             pass
 
         try:
-            if end_date >= today_iso and len(filtered) >= 2:
+            if end_date >= today_iso and filtered_count >= 2:
                 current_category = top_categories[0].category if top_categories else None
-                spend_prob = self.predict_spending_probability(
-                    SpendingProbabilityRequest(
-                        user_id=request.user_id,
-                        transactions=request.transactions,
-                        current_category=current_category,
-                        lookback_days=180,
-                    )
+                spend_prob = self._spending_probability_from_history(
+                    user_id=request.user_id,
+                    history=history,
+                    lookback_days=180,
+                    current_category=current_category,
+                    transition_counts_format="full",
                 )
 
                 next_spend_prediction = ForecastNextSpendPrediction(
@@ -709,7 +1234,7 @@ class StochasticPlanner:
             forecast_snapshot=forecast_snapshot,
             next_spend_prediction=next_spend_prediction,
             action_plan=action_plan,
-            computed_at=datetime.utcnow().isoformat(),
+            computed_at=current_evaluation_context().utc_now.isoformat(),
         )
 
     def _days_in_month(self, year: int, month: int) -> int:
@@ -725,13 +1250,24 @@ class StochasticPlanner:
         Build a stable but flexible category universe for Markov outputs.
         Starts with shared taxonomy and adds frequent provider categories.
         """
-        categories = set(SHARED_CATEGORIES)
+        return self._category_space_from_raw_categories([getattr(txn, "category", None) for txn in transactions or []])
+
+    def _history_category_space(self, history: _NormalizedHistory) -> List[str]:
+        return self._category_space_from_raw_categories(history.raw_categories)
+
+    def _category_space_from_raw_categories(self, raw_categories) -> List[str]:
         observed_counts: Dict[str, int] = defaultdict(int)
 
-        for txn in transactions or []:
-            category = self._normalize_category(getattr(txn, "category", None))
+        # Providers repeat a handful of raw labels; normalize each distinct one once.
+        for raw_category, count in Counter(raw_categories).items():
+            category = self._normalize_category(raw_category)
             if category:
-                observed_counts[category] += 1
+                observed_counts[category] += count
+
+        return self._category_space_from_counts(observed_counts)
+
+    def _category_space_from_counts(self, observed_counts: Dict[str, int]) -> List[str]:
+        categories = set(category_taxonomy.SHARED_CATEGORIES)
 
         # Include custom provider categories when they appear repeatedly.
         for category, count in observed_counts.items():
@@ -745,23 +1281,18 @@ class StochasticPlanner:
 
         return ordered
 
+    def _state_since_month(self, lookback_days: int) -> str:
+        """First `YYYY-MM` bucket inside a lookback window over stored state."""
+        return (current_evaluation_context().utc_now - timedelta(days=lookback_days)).strftime("%Y-%m")
+
     def _infer_baseline_and_monthly_spend(
         self,
-        txns: List[_Txn],
-        merchant_category: str,
+        spend_by_card: Dict[str, float],
         lookback_days: int,
     ) -> Tuple[Optional[str], float]:
-        if not txns:
+        if not spend_by_card:
             return None, 0.0
 
-        filtered = [t for t in txns if t.category == merchant_category and t.amount > 0]
-        if not filtered:
-            return None, 0.0
-
-        spend_by_card: Dict[str, float] = defaultdict(float)
-        for txn in filtered:
-            spend_by_card[txn.card_id] += txn.amount
-
         baseline_card_id = max(spend_by_card.items(), key=lambda x: x[1])[0]
         category_total = sum(spend_by_card.values())
 
@@ -770,79 +1301,96 @@ class StochasticPlanner:
 
         return baseline_card_id, round(monthly_spend, 2)
 
-    def _filter_and_normalize_transactions(self, transactions, lookback_days: int) -> List[_Txn]:
-        cutoff = datetime.utcnow() - timedelta(days=lookback_days)
-        parsed: List[_Txn] = []
-
-        for txn in transactions:
-            date = self._safe_parse_date(txn.date)
-            if date is None or date < cutoff:
-                continue
-
-            category = infer_shared_category(
-                raw_category=txn.category,
-                description=txn.description,
-                merchant_name=txn.merchant_name,
+    def _filter_and_normalize_transactions(self, transactions, lookback_days: int) -> TransactionFrame:
+        return self._normalize_history(transactions, lookback_days).frame
+
+    def _normalize_history(self, transactions, lookback_days: int) -> _NormalizedHistory:
+        cutoff = current_evaluation_context().utc_now - timedelta(days=lookback_days)
+        cutoff_micros = (cutoff - _EPOCH) // _MICROSECOND
+        if not transactions:
+            frame = TransactionFrame.from_columns([], np.empty(0, dtype=np.int64), [], [], [])
+            return _NormalizedHistory(frame=frame, lookback_days=lookback_days, raw_categories=())
+
+        # Column-at-a-time: attribute reads, date parsing and category inference
+        # run once per distinct value instead of once per transaction.
+        if isinstance(transactions, StochasticTransactionColumns):
+            # Already column-oriented and validated in bulk; no per-row objects at all.
+            dates, raw_categories, descriptions, merchant_names, card_ids, amounts, balances = (
+                transactions.normalized_fields()
             )
-
-            parsed.append(
-                _Txn(
-                    card_id=txn.card_id,
-                    date=date,
-                    amount=txn.amount,
-                    category=category,
-                    description=txn.description or "",
-                    balance=txn.balance,
-                )
+            raw_categories = tuple(raw_categories)
+        else:
+            dates, raw_categories, descriptions, merchant_names, card_ids, amounts, balances = zip(
+                *map(_NORMALIZED_FIELDS, transactions)
             )
+        micros = epoch_microseconds_column(dates)
+        keep = np.flatnonzero(micros >= cutoff_micros)
+        rows = keep.tolist()
+
+        keys = [(raw_categories[i], descriptions[i], merchant_names[i]) for i in rows]
+        inferred = {key: infer_shared_category(*key) for key in dict.fromkeys(keys)}
+        frame = TransactionFrame.from_columns(
+            card_ids=[card_ids[i] for i in rows],
+            micros=micros[keep],
+            amounts=np.array(amounts, dtype=np.float64)[keep],
+            categories=list(map(inferred.__getitem__, keys)),
+            balances=[balances[i] for i in rows],
+        )
+        return _NormalizedHistory(frame=frame, lookback_days=lookback_days, raw_categories=raw_categories)
 
-        parsed.sort(key=lambda t: t.date)
-        return parsed
+    def _history_window(self, history: _NormalizedHistory, lookback_days: int) -> TransactionFrame:
+        """The history's frame cut to a lookback no longer than its own, at the same evaluation clock."""
+        if lookback_days > history.lookback_days:
+            raise ValueError(f"lookback_days={lookback_days} exceeds the normalized {history.lookback_days}-day history")
+        if lookback_days == history.lookback_days:
+            return history.frame
+        return history.frame.since(current_evaluation_context().utc_now - timedelta(days=lookback_days))
 
     def _build_category_transition_counts(
         self,
-        transactions: List[_Txn],
+        transactions: TransactionFrame,
         category_space: List[str],
-    ) -> Dict[str, Dict[str, int]]:
-        transitions = {src: {dst: 0 for dst in category_space} for src in category_space}
-
-        if len(transactions) < 2:
-            return transitions
-
-        for prev_txn, next_txn in zip(transactions[:-1], transactions[1:]):
-            src = prev_txn.category if prev_txn.category in category_space else "other"
-            dst = next_txn.category if next_txn.category in category_space else "other"
-            transitions[src][dst] += 1
-
-        return transitions
+    ) -> TransitionMatrix:
+        position = {category: idx for idx, category in enumerate(category_space)}
+        other = position["other"]
+        # Frame category code -> row in the transition matrix, folding unknowns into "other".
+        to_space = np.array([position.get(category, other) for category in transactions.categories], dtype=np.intp)
+        return TransitionMatrix.from_states(
+            to_space[transactions.category_codes],
+            category_space,
+            dense_max_states=settings.MARKOV_DENSE_MAX_STATES,
+        )
 
     def _build_card_bucket_transitions(
         self,
-        transactions: List[_Txn],
+        transactions: TransactionFrame,
         card_limits: Dict[str, float],
     ) -> Dict[str, Dict[str, Dict[str, float]]]:
-        grouped: Dict[str, List[_Txn]] = defaultdict(list)
-        for txn in transactions:
-            if txn.card_id in card_limits:
-                grouped[txn.card_id].append(txn)
+        card_count = len(transactions.card_ids)
+        limits = np.array([card_limits.get(card_id, 0) for card_id in transactions.card_ids], dtype=np.float64)
+        tracked = np.array([card_id in card_limits for card_id in transactions.card_ids], dtype=bool)
+
+        # Group rows by card while keeping date order inside each card.
+        order = np.argsort(transactions.card_codes, kind="stable")
+        cards = transactions.card_codes[order]
+        row_limits = limits[cards]
+        valid = transactions.has_balance[order] & tracked[cards] & (row_limits > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            utilization = np.clip((transactions.balances[order] / row_limits) * 100, 0.0, 100.0)
+        buckets = np.where(utilization < 30, 0, np.where(utilization < 70, 1, 2))
+
+        pairs = (cards[1:] == cards[:-1]) & valid[1:] & valid[:-1]
+        flat = (cards[:-1] * 9 + buckets[:-1] * 3 + buckets[1:])[pairs]
+        counts_by_card = np.bincount(flat, minlength=card_count * 9).reshape(card_count, 3, 3)
 
         matrices = {}
-        for card_id, txns in grouped.items():
-            txns.sort(key=lambda t: t.date)
-            counts = {s: {d: 0 for d in ("low", "medium", "high")} for s in ("low", "medium", "high")}
-            card_limit = card_limits.get(card_id, 0)
-            if card_limit <= 0:
+        for code, card_id in enumerate(transactions.card_ids):
+            if not tracked[code] or limits[code] <= 0:
                 continue
-
-            for current_txn, next_txn in zip(txns[:-1], txns[1:]):
-                current_util = self._utilization_from_txn(current_txn, card_limit)
-                next_util = self._utilization_from_txn(next_txn, card_limit)
-                if current_util is None or next_util is None:
-                    continue
-                src = self._bucket_for_utilization(current_util)
-                dst = self._bucket_for_utilization(next_util)
-                counts[src][dst] += 1
-
+            counts = {
+                src: {dst: int(counts_by_card[code, i, j]) for j, dst in enumerate(UTILIZATION_BUCKETS)}
+                for i, src in enumerate(UTILIZATION_BUCKETS)
+            }
             normalized = self._normalize_bucket_counts(counts)
             if normalized:
                 matrices[card_id] = normalized
@@ -851,41 +1399,191 @@ class StochasticPlanner:
 
     def _normalize_bucket_counts(self, counts: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, float]]:
         normalized: Dict[str, Dict[str, float]] = {}
-        for src in ("low", "medium", "high"):
+        for src in UTILIZATION_BUCKETS:
             row = counts[src]
             total = sum(row.values())
             if total <= 0:
                 continue
             normalized[src] = {
                 dst: row.get(dst, 0) / total
-                for dst in ("low", "medium", "high")
+                for dst in UTILIZATION_BUCKETS
             }
         return normalized
 
-    def _state_reward(self, card, util_bucket: str, merchant_category: str, estimated_amount: float) -> float:
-        reward_rate = self._estimate_reward_rate(card, merchant_category)
-        reward_gain = estimated_amount * reward_rate
+    def _card_scoring_grid(self, context: _CardChoiceContext) -> _CardScoringGrid:
+        """Merchant-independent card parameters, built once per context."""
+        if context.scoring_grid is not None:
+            return context.scoring_grid
 
-        util_midpoint = {"low": 20.0, "medium": 50.0, "high": 85.0}[util_bucket]
-        post_util = min(100.0, util_midpoint + (estimated_amount / max(card.credit_limit, 1.0)) * 100)
+        cards, rows, state_index, due_index = [], [], [], []
+        for card in context.eligible_cards:
+            transitions = context.transition_by_card.get(card.card_id)
+            if not transitions:
+                continue
+            state_bucket = self._bucket_for_utilization(card.utilization_percentage)
+            state_row = transitions.get(state_bucket)
+            if not state_row:
+                continue
+            cards.append(card)
+            rows.append([state_row[dst] for dst in UTILIZATION_BUCKETS])
+            state_index.append(UTILIZATION_BUCKETS.index(state_bucket))
+            due_index.append(due_bucket_index(self._days_until_due(card.payment_due_date)))
+
+        context.scoring_grid = _CardScoringGrid(
+            cards=cards,
+            transitions=np.array(rows, dtype=np.float64).reshape(len(cards), len(UTILIZATION_BUCKETS)),
+            state_index=np.array(state_index, dtype=np.intp),
+            due_index=np.array(due_index, dtype=np.intp),
+        )
+        return context.scoring_grid
+
+    def _q_values(
+        self,
+        grid: _CardScoringGrid,
+        merchant_categories: List[str],
+        amounts: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        One-step Q-values for N purchases x K cards.
+
+        The reward of a purchase made from utilization bucket b is
+        amount * rate - APR interest - utilization penalty(b) - due-date
+        penalty; Q = reward(current bucket) + gamma * E[reward(next bucket)].
+        Returns (immediate, expected_next, q, post-purchase utilization),
+        each shaped (N, K).
+        """
+        gamma = 0.9
+        amount = amounts[:, None]
+        rewards = self._bucket_rewards(grid, merchant_categories, amounts) - grid.due_penalty[:, None]
+
+        immediate = np.take_along_axis(
+            rewards, np.broadcast_to(grid.state_index[:, None], rewards.shape[:2] + (1,)), axis=2
+        )[..., 0]
+        # Summed bucket by bucket, in order, to match a scalar running sum.
+        weighted = grid.transitions * rewards
+        expected_next = 0.0 + weighted[..., 0] + weighted[..., 1] + weighted[..., 2]
+        q = immediate + gamma * expected_next
+
+        post_util = np.minimum(100.0, np.maximum(0.0, ((grid.balances + amount) / grid.credit_limits) * 100))
+        return immediate, expected_next, q, post_util
+
+    def _bucket_rewards(self, grid: _CardScoringGrid, merchant_categories: List[str], amounts: np.ndarray) -> np.ndarray:
+        """(N, K, B) reward of each purchase on each card from each utilization bucket, before the due penalty."""
+        rates = np.array([self._card_reward_rates(grid, category) for category in merchant_categories])
+        rates = rates.reshape(len(merchant_categories), len(grid))
+        amount = amounts[:, None]
+
+        base = amount * rates - (grid.apr_fraction * amount) * 0.08
+        post_bucket_util = self._post_bucket_utilization(grid, amounts)
+        util_penalty = (
+            np.where(post_bucket_util > 30, ((post_bucket_util - 30) / 70) * 2.5, 0.0)
+            + np.where(post_bucket_util > 70, 2.0, 0.0)
+        )
+        return base[..., None] - util_penalty
 
-        apr = card.interest_rate if card.interest_rate is not None else 0.0
-        interest_penalty = (apr / 100.0) * estimated_amount * 0.08
+    def _post_bucket_utilization(self, grid: _CardScoringGrid, amounts: np.ndarray) -> np.ndarray:
+        """(N, K, B) utilization after each purchase, starting from each bucket's midpoint."""
+        return np.minimum(100.0, UTILIZATION_MIDPOINTS + ((amounts[:, None] / grid.limit_floor) * 100)[..., None])
 
-        util_penalty = 0.0
-        if post_util > 30:
-            util_penalty += ((post_util - 30) / 70) * 2.5
-        if post_util > 70:
-            util_penalty += 2.0
+    def _action_values(
+        self,
+        context: _CardChoiceContext,
+        merchant_categories: List[str],
+        amounts: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `_q_values`, with the one-step expectation replaced by the solved
+        MDP continuation value when the value-iteration policy applies.
+        """
+        grid = self._card_scoring_grid(context)
+        immediate, expected_next, q, post_util = self._q_values(grid, merchant_categories, amounts)
+        policy = self._card_choice_policy_for(context)
+        if policy is None:
+            return immediate, expected_next, q, post_util
+
+        positions = {category: idx for idx, category in enumerate(policy.categories)}
+        other = positions["other"]
+        category_index = np.array([positions.get(category, other) for category in merchant_categories], dtype=np.intp)
+        card_states = tuple((grid.state_index * len(DUE_BUCKETS) + grid.due_index).tolist())
+        expected_next = policy.continuation[(slice(None), category_index) + card_states].T
+        return immediate, expected_next, immediate + policy.gamma * expected_next, post_util
+
+    def _card_choice_policy_for(self, context: _CardChoiceContext) -> Optional[CardChoicePolicy]:
+        """Solved (or cached) policy for this context, or None when the one-step policy applies."""
+        if self._card_choice_policy != "value_iteration" or context.category_transitions is None:
+            return None
+        grid = self._card_scoring_grid(context)
+        if not 1 <= len(grid) <= settings.MDP_MAX_CARDS:
+            return None
 
-        due_penalty = 0.0
-        days_to_due = self._days_until_due(card.payment_due_date)
-        if days_to_due is not None and 0 <= days_to_due <= 3:
-            due_penalty = 1.5
-        elif days_to_due is not None and 4 <= days_to_due <= 7:
-            due_penalty = 0.5
+        model = self._card_choice_model(context, grid)
+        return self._policy_cache.get_or_solve(
+            context.user_id,
+            f"{model.digest()}:{settings.MDP_TOLERANCE!r}:{settings.MDP_MAX_ITERATIONS}",
+            lambda: solve_card_choice_mdp(model, settings.MDP_TOLERANCE, settings.MDP_MAX_ITERATIONS),
+        )
 
-        return reward_gain - interest_penalty - util_penalty - due_penalty
+    def _card_choice_model(self, context: _CardChoiceContext, grid: _CardScoringGrid) -> CardChoiceModel:
+        """MDP inputs from the context: typical purchase per category, observed chains, card parameters."""
+        categories = list(context.category_transitions.labels)
+        category_chain = build_markov_chain(context.category_transitions.dense(), categories)
+
+        purchases = context.category_purchases or {}
+        purchase_count = sum(count for _, count in purchases.values())
+        overall_mean = sum(total for total, _ in purchases.values()) / purchase_count if purchase_count else 0.0
+        amounts = np.array(
+            [
+                purchases[category][0] / purchases[category][1] if purchases.get(category, (0.0, 0))[1] else overall_mean
+                for category in categories
+            ]
+        )
+
+        # Buckets never observed as a source are assumed to persist.
+        utilization = np.array(
+            [
+                [
+                    [rows[src][dst] for dst in UTILIZATION_BUCKETS] if src in rows
+                    else [float(src == dst) for dst in UTILIZATION_BUCKETS]
+                    for src in UTILIZATION_BUCKETS
+                ]
+                for rows in (context.transition_by_card[card.card_id] for card in grid.cards)
+            ]
+        )
+        # Same thresholds as _bucket_for_utilization: below 30 low, below 70 medium.
+        charged_buckets = np.searchsorted(
+            [30.0, 70.0], self._post_bucket_utilization(grid, amounts), side="right"
+        ).transpose(1, 0, 2)
+
+        cycle = due_cycle_transitions(context.lookback_days / max(purchase_count, 1))
+        due = np.stack(
+            [
+                cycle if self._days_until_due(card.payment_due_date) is not None else np.eye(len(DUE_BUCKETS))
+                for card in grid.cards
+            ]
+        )
+        rewards = self._bucket_rewards(grid, categories, amounts).transpose(1, 0, 2)
+        rewards = rewards[..., None] - DUE_PENALTIES
+
+        return CardChoiceModel(
+            card_ids=tuple(card.card_id for card in grid.cards),
+            categories=tuple(categories),
+            category_transitions=category_chain.probabilities,
+            utilization_transitions=utilization,
+            charged_buckets=charged_buckets,
+            due_transitions=due,
+            rewards=rewards,
+            gamma=settings.MDP_GAMMA,
+        )
+
+    def card_policy_cache_info(self) -> Dict[str, int]:
+        return self._policy_cache.info()
+
+    def _card_reward_rates(self, grid: _CardScoringGrid, merchant_category: str) -> np.ndarray:
+        rates = grid._rates.get(merchant_category)
+        if rates is None:
+            rates = np.array([self._estimate_reward_rate(card, merchant_category) for card in grid.cards], dtype=np.float64)
+            grid._rates[merchant_category] = rates
+        return rates
 
     def _estimate_reward_rate(self, card, merchant_category: str) -> float:
         if card.estimated_reward_rate_by_category:
@@ -916,128 +1614,27 @@ class StochasticPlanner:
         return reward_maps, skipped_card_ids
 
     def _load_reward_catalog(self) -> List[Dict[str, Any]]:
-        if self._reward_catalog_cache is not None:
-            return self._reward_catalog_cache
-
-        if not self._env_loaded:
-            # Allow the service to run from its own folder while still reading root project env files.
-            load_dotenv(dotenv_path=".env", override=False)
-            load_dotenv(dotenv_path="../.env", override=False)
-            load_dotenv(dotenv_path="../.env.local", override=False)
-            self._env_loaded = True
-
-        supabase_url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-        service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-
-        if not supabase_url or not service_role_key:
-            return []
-
-        endpoint = f"{supabase_url.rstrip('/')}/rest/v1/credit_card_offers"
-        headers = {
-            "apikey": service_role_key,
-            "Authorization": f"Bearer {service_role_key}",
-        }
-        params = {
-            "select": "id,name,issuer,earn_rate_grocery,earn_rate_travel,earn_rate_dining,earn_rate_other,annual_fee,is_active",
-            "is_active": "eq.true",
-            "limit": "1000",
-        }
-
-        offers: List[Dict[str, Any]] = []
-        try:
-            with httpx.Client(timeout=8.0) as client:
-                response = client.get(endpoint, headers=headers, params=params)
-                response.raise_for_status()
-                payload = response.json()
-                if isinstance(payload, list):
-                    offers = [item for item in payload if isinstance(item, dict)]
-        except Exception:
-            offers = []
-
-        self._reward_catalog_cache = offers
-        return offers
+        """Current catalog snapshot; async handlers refresh it via the provider before calling in."""
+        return self._reward_catalog.snapshot()
 
     def _find_reward_map_for_institution(
         self,
         institution_name: Optional[str],
         offers: List[Dict[str, Any]],
     ) -> Optional[Dict[str, float]]:
-        institution_key = self._normalize_identity(institution_name)
-        if not institution_key:
-            return None
-
-        best_score = -1
-        best_offers: List[Dict[str, Any]] = []
-
-        for offer in offers:
-            score = self._match_offer_score(institution_key, offer)
-            if score < 0:
-                continue
-            if score > best_score:
-                best_score = score
-                best_offers = [offer]
-            elif score == best_score:
-                best_offers.append(offer)
-
-        if not best_offers:
-            return None
+        return self._reward_index(offers).reward_map_for_institution(institution_name)
 
-        # Merge best-matching offers to keep the highest available rate per category.
-        merged: Dict[str, float] = {}
-        for offer in best_offers:
-            offer_map = self._offer_to_rate_map(offer)
-            for category, value in offer_map.items():
-                merged[category] = max(merged.get(category, 0.0), value)
-
-        return merged or None
-
-    def _match_offer_score(self, institution_key: str, offer: Dict[str, Any]) -> int:
-        issuer_key = self._normalize_identity(offer.get("issuer"))
-        name_key = self._normalize_identity(offer.get("name"))
-
-        keys = [k for k in (issuer_key, name_key) if k]
-        if not keys:
-            return -1
-
-        for key in keys:
-            if institution_key == key:
-                return 100
-            if institution_key in key or key in institution_key:
-                return 80
-
-        institution_tokens = set(institution_key.split())
-        best_overlap = 0
-        for key in keys:
-            overlap = len(institution_tokens.intersection(set(key.split())))
-            best_overlap = max(best_overlap, overlap)
-
-        if best_overlap == 0:
-            return -1
-        return best_overlap
+    def _reward_index(self, offers: List[Dict[str, Any]]) -> RewardCatalogIndex:
+        """Index for this catalog list, rebuilt only when a new catalog is loaded."""
+        cached = self._catalog_index
+        if cached is not None and cached.offers is offers:
+            return cached
+        index = RewardCatalogIndex(offers)
+        self._catalog_index = index
+        return index
 
     def _offer_to_rate_map(self, offer: Dict[str, Any]) -> Dict[str, float]:
-        def normalize(raw_value: Any) -> float:
-            try:
-                raw = float(raw_value)
-            except Exception:
-                return 0.0
-
-            if raw <= 0:
-                return 0.0
-            if raw <= 0.2:
-                return raw
-            if raw <= 10:
-                return raw / 100
-            return raw / 1000
-
-        categories = {
-            "groceries": normalize(offer.get("earn_rate_grocery")),
-            "travel": normalize(offer.get("earn_rate_travel")),
-            "dining": normalize(offer.get("earn_rate_dining")),
-            "default": normalize(offer.get("earn_rate_other")),
-        }
-
-        return {key: value for key, value in categories.items() if value > 0}
+        return offer_to_rate_map(offer)
 
     def _category_to_reward_bucket(self, category: str) -> str:
         if category == "groceries":
@@ -1053,45 +1650,29 @@ class StochasticPlanner:
         offers: List[Dict[str, Any]],
         bucket: str,
     ) -> Tuple[Optional[Dict[str, Any]], float]:
-        best_offer: Optional[Dict[str, Any]] = None
-        best_rate = 0.0
-
-        for offer in offers:
-            rate_map = self._offer_to_rate_map(offer)
-            rate = rate_map.get(bucket)
-            if rate is None:
-                rate = rate_map.get("default", 0.0)
-
-            if rate > best_rate:
-                best_rate = rate
-                best_offer = offer
-
-        return best_offer, best_rate
+        return self._reward_index(offers).best_offer_for_bucket(bucket)
 
     def _build_upgrade_opportunities(
         self,
-        txns: List[_Txn],
+        txns: TransactionFrame,
         cards,
         offers: List[Dict[str, Any]],
         lookback_days: int,
     ) -> List[UpgradeOpportunity]:
-        if not txns or not cards or not offers:
+        if not len(txns) or not cards or not offers:
             return []
 
-        excluded_categories = {
-            "payments", "income", "transfers", "cash", "fees", "taxes", "government",
-            "rent", "mortgage",
-        }
-
-        spend_by_category: Dict[str, float] = defaultdict(float)
-        for txn in txns:
-            if txn.amount <= 0:
-                continue
-            if txn.category in excluded_categories:
-                continue
-            spend_by_category[txn.category] += txn.amount
+        spend_by_category = txns.sum_by_category((txns.amounts > 0) & ~txns.category_mask(UPGRADE_EXCLUDED_CATEGORIES))
+        return self._upgrade_opportunities_from_spend(spend_by_category, cards, offers, lookback_days)
 
-        if not spend_by_category:
+    def _upgrade_opportunities_from_spend(
+        self,
+        spend_by_category: Dict[str, float],
+        cards,
+        offers: List[Dict[str, Any]],
+        lookback_days: int,
+    ) -> List[UpgradeOpportunity]:
+        if not spend_by_category or not cards or not offers:
             return []
 
         total_spend = sum(spend_by_category.values())
@@ -1184,74 +1765,15 @@ class StochasticPlanner:
         estimated_monthly_spend: float,
         limit: int = 3,
     ) -> List[Dict[str, Any]]:
-        candidates: List[Dict[str, Any]] = []
-
-        for offer in offers:
-            rate_map = self._offer_to_rate_map(offer)
-            rate = rate_map.get(bucket)
-            if rate is None:
-                rate = rate_map.get("default", 0.0)
-            if rate <= current_best_rate:
-                continue
-
-            annual_fee = self._safe_float(offer.get("annual_fee"))
-            monthly_incremental = estimated_monthly_spend * (rate - current_best_rate)
-            annual_incremental = monthly_incremental * 12.0
-
-            candidates.append(
-                {
-                    "offer_id": offer.get("id"),
-                    "name": offer.get("name"),
-                    "issuer": offer.get("issuer"),
-                    "reward_rate": round(rate, 4),
-                    "annual_fee": annual_fee,
-                    "estimated_monthly_incremental_reward": round(monthly_incremental, 2),
-                    "estimated_annual_incremental_reward": round(annual_incremental, 2),
-                }
-            )
-
-        if not candidates:
-            return []
-
-        deduped: Dict[str, Dict[str, Any]] = {}
-        for candidate in candidates:
-            key = self._normalize_identity(f"{candidate.get('issuer', '')} {candidate.get('name', '')}")
-            existing = deduped.get(key)
-            if existing is None or (
-                candidate.get("estimated_monthly_incremental_reward", 0.0)
-                > existing.get("estimated_monthly_incremental_reward", 0.0)
-            ):
-                deduped[key] = candidate
-
-        ordered = sorted(
-            deduped.values(),
-            key=lambda c: (
-                0 if (c.get("annual_fee") is None or c.get("annual_fee") <= 0) else 1,
-                -c.get("estimated_monthly_incremental_reward", 0.0),
-                -c.get("reward_rate", 0.0),
-            ),
+        return self._reward_index(offers).top_offers_for_bucket(
+            bucket=bucket,
+            current_best_rate=current_best_rate,
+            estimated_monthly_spend=estimated_monthly_spend,
+            limit=limit,
         )
-        return ordered[:max(1, limit)]
-
-    def _safe_float(self, value: Any) -> Optional[float]:
-        if value is None:
-            return None
-        try:
-            return float(value)
-        except Exception:
-            return None
 
     def _normalize_identity(self, value: Optional[str]) -> str:
-        if not value:
-            return ""
-
-        normalized = "".join(ch.lower() if ch.isalnum() else " " for ch in value)
-        return " ".join(token for token in normalized.split() if token)
-
-    def _utilization_from_txn(self, txn: _Txn, credit_limit: float) -> Optional[float]:
-        if txn.balance is not None:
-            return max(0.0, min(100.0, (txn.balance / credit_limit) * 100))
-        return None
+        return normalize_identity(value)
 
     def _bucket_for_utilization(self, utilization: float) -> str:
         if utilization < 30:
@@ -1264,26 +1786,10 @@ class StochasticPlanner:
         return infer_shared_category(value)
 
     def _safe_parse_date(self, value: str) -> Optional[datetime]:
-        if not value:
-            return None
-        try:
-            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
-        except Exception:
-            pass
-        for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
-            try:
-                return datetime.strptime(value, fmt)
-            except Exception:
-                continue
-        return None
+        return parse_transaction_date(value)
 
     def _days_until_due(self, due_date_str: Optional[str]) -> Optional[int]:
-        if not due_date_str:
-            return None
-        due_date = self._safe_parse_date(due_date_str)
-        if due_date is None:
-            return None
-        return (due_date - datetime.utcnow()).days
+        return current_evaluation_context().days_until_due_utc(due_date_str)
 
 
 stochastic_planner = StochasticPlanner()
@@ -0,0 +1,291 @@
+"""
+Transaction Frame
+- Columnar, date-sorted view of normalized transactions for the stochastic planner
+- Grouped sums via np.bincount, which accumulates in row order so totals match
+  a sequential Python loop bit for bit
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from itertools import repeat
+from operator import is_not
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (card_id, date, amount, category, balance)
+FrameRow = Tuple[str, datetime, float, str, Optional[float]]
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode(values: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """Integer codes for values, with labels numbered in order of first appearance."""
+    index: Dict[str, int] = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+    return codes, list(index)
+
+
+class TransactionFrame:
+    """
+    Parallel column arrays for in-window transactions, sorted by date.
+
+    Categories and card IDs are integer-coded; `balances` holds NaN where the
+    provider sent no balance and `has_balance` marks the rows that had one.
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        amounts: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[str],
+        card_codes: np.ndarray,
+        card_ids: List[str],
+        balances: np.ndarray,
+        has_balance: np.ndarray,
+    ):
+        self.dates = dates
+        self.amounts = amounts
+        self.category_codes = category_codes
+        self.categories = categories
+        self.card_codes = card_codes
+        self.card_ids = card_ids
+        self.balances = balances
+        self.has_balance = has_balance
+        self._day_strings: Optional[np.ndarray] = None
+        self._day_keys: Optional[np.ndarray] = None
+        self._month_codes: Optional[np.ndarray] = None
+        self._months: List[str] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[FrameRow]) -> "TransactionFrame":
+        """Build a frame from row tuples, stably sorted by date like list.sort(key=date)."""
+        rows = list(rows)
+        # Integer microseconds are much cheaper to build than np.array(datetimes).
+        return cls.from_columns(
+            card_ids=[row[0] for row in rows],
+            micros=np.fromiter(((row[1] - _EPOCH) // _MICROSECOND for row in rows), dtype=np.int64, count=len(rows)),
+            amounts=[row[2] for row in rows],
+            categories=[row[3] for row in rows],
+            balances=[row[4] for row in rows],
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        card_ids: Sequence[str],
+        micros: np.ndarray,
+        amounts: Sequence[float],
+        categories: Sequence[str],
+        balances: Sequence[Optional[float]],
+    ) -> "TransactionFrame":
+        """
+        Build a frame from parallel columns, with dates as int64 microseconds
+        since 1970-01-01. Same frame as `from_rows` on the equivalent rows.
+        """
+        micros = np.asarray(micros, dtype=np.int64)
+        order = np.argsort(micros, kind="stable")
+        category_codes, category_labels = _encode_in_order(categories, order)
+        card_codes, card_labels = _encode_in_order(card_ids, order)
+        # None becomes NaN in a float array.
+        balance_values = np.array(balances, dtype=np.float64).reshape(-1)
+        has_balance = np.fromiter(map(is_not, balances, repeat(None)), dtype=bool, count=len(balances))
+
+        return cls(
+            dates=micros[order].view("datetime64[us]"),
+            amounts=np.array(amounts, dtype=np.float64).reshape(-1)[order],
+            category_codes=category_codes,
+            categories=category_labels,
+            card_codes=card_codes,
+            card_ids=card_labels,
+            balances=balance_values[order],
+            has_balance=has_balance[order],
+        )
+
+    def since(self, start: datetime) -> "TransactionFrame":
+        """
+        The rows dated at or after `start`, as their own frame. Same frame as
+        building from just those rows: labels are renumbered by first appearance.
+        """
+        first = int(np.searchsorted(self.dates, np.datetime64(start, "us"), side="left"))
+        if first == 0:
+            return self
+        category_codes, categories = _renumber(self.category_codes[first:], self.categories)
+        card_codes, card_ids = _renumber(self.card_codes[first:], self.card_ids)
+        return TransactionFrame(
+            dates=self.dates[first:],
+            amounts=self.amounts[first:],
+            category_codes=category_codes,
+            categories=categories,
+            card_codes=card_codes,
+            card_ids=card_ids,
+            balances=self.balances[first:],
+            has_balance=self.has_balance[first:],
+        )
+
+    def __len__(self) -> int:
+        return int(self.dates.shape[0])
+
+    def category_at(self, position: int) -> str:
+        return self.categories[int(self.category_codes[position])]
+
+    @property
+    def day_strings(self) -> np.ndarray:
+        """ISO `YYYY-MM-DD` per row, for lexicographic range checks against request dates."""
+        if self._day_strings is None:
+            self._day_strings = _calendar_labels(self.dates, "D")[1]
+        return self._day_strings
+
+    @property
+    def day_keys(self) -> np.ndarray:
+        """Days since 1970-01-01 per row, for integer range checks."""
+        if self._day_keys is None:
+            self._day_keys = self.dates.astype("datetime64[D]").astype(np.int64)
+        return self._day_keys
+
+    @property
+    def month_codes(self) -> np.ndarray:
+        """Per-row index into `months`."""
+        if self._month_codes is None:
+            self._index_months()
+        return self._month_codes
+
+    @property
+    def months(self) -> List[str]:
+        """Sorted `YYYY-MM` labels present in the frame."""
+        if self._month_codes is None:
+            self._index_months()
+        return self._months
+
+    def _index_months(self) -> None:
+        labels, _, codes = _calendar_labels(self.dates, "M")
+        self._months = [str(label) for label in labels]
+        self._month_codes = codes
+
+    def category_mask(self, categories: Iterable[str]) -> np.ndarray:
+        """Rows whose category is one of `categories`."""
+        wanted = set(categories)
+        selected = [code for code, label in enumerate(self.categories) if label in wanted]
+        return np.isin(self.category_codes, selected)
+
+    def date_range_mask(self, start: datetime, end: datetime) -> np.ndarray:
+        """Rows with start <= date <= end (inclusive datetimes)."""
+        return (self.dates >= np.datetime64(start, "us")) & (self.dates <= np.datetime64(end, "us"))
+
+    def day_range_mask(self, start: str, end: str) -> np.ndarray:
+        """
+        Rows whose `YYYY-MM-DD` day string lies in [start, end], compared as text.
+
+        Valid ISO days order the same as their day keys, so those bounds skip
+        the string column; anything else falls back to comparing `day_strings`.
+        """
+        start_key, end_key = _iso_day_key(start), _iso_day_key(end)
+        if start_key is None or end_key is None:
+            day_strings = self.day_strings
+            return (day_strings >= start) & (day_strings <= end)
+        day_keys = self.day_keys
+        return (day_keys >= start_key) & (day_keys <= end_key)
+
+    def sum_by_category(self, mask: np.ndarray) -> Dict[str, float]:
+        """Amount totals per category over masked rows, keyed in first-appearance order."""
+        return _grouped_sums(self.category_codes, self.categories, self.amounts, mask)
+
+    def count_by_category(self, mask: np.ndarray) -> Dict[str, int]:
+        """Row counts per category over masked rows, keyed in first-appearance order."""
+        ones = np.ones(len(self), dtype=np.float64)
+        return {label: int(count) for label, count in _grouped_sums(self.category_codes, self.categories, ones, mask).items()}
+
+    def sum_by_card(self, mask: np.ndarray) -> Dict[str, float]:
+        """Amount totals per card over masked rows, keyed in first-appearance order."""
+        return _grouped_sums(self.card_codes, self.card_ids, self.amounts, mask)
+
+    def sum_by_month(self, mask: np.ndarray) -> Dict[str, float]:
+        """Amount totals per `YYYY-MM` over masked rows, keyed in month order."""
+        return _grouped_sums(self.month_codes, self.months, self.amounts, mask)
+
+    def sum_by_month_and_category(self, mask: np.ndarray) -> Dict[str, Dict[str, float]]:
+        """Amount totals per month, then per category, for the (month, category) pairs present."""
+        return _nested_sums(self.month_codes, self.months, self.category_codes, self.categories, self.amounts, mask)
+
+    def sum_by_category_and_card(self, mask: np.ndarray) -> Dict[str, Dict[str, float]]:
+        """Amount totals per category, then per card, each keyed in first-appearance order."""
+        return _nested_sums(self.category_codes, self.categories, self.card_codes, self.card_ids, self.amounts, mask)
+
+
+def _encode_in_order(values: Sequence[str], order: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """`_encode` of values taken in `order`, without materializing the reordered list."""
+    codes, labels = _encode(values)
+    return _renumber(codes[order], labels)
+
+
+def _renumber(codes: np.ndarray, labels: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """Codes and labels renumbered by first appearance in `codes`, dropping labels that do not occur."""
+    if not codes.size:
+        return codes, []
+    distinct = _first_appearance(codes)
+    remap = np.empty(len(labels), dtype=np.intp)
+    remap[distinct] = np.arange(len(distinct), dtype=np.intp)
+    return remap[codes], [labels[code] for code in distinct]
+
+
+def _iso_day_key(value: str) -> Optional[int]:
+    """Day key for a canonical `YYYY-MM-DD` string, or None for anything else."""
+    digits = value[:4] + value[5:7] + value[8:]
+    if len(value) != 10 or value[4] != "-" or value[7] != "-" or not (digits.isascii() and digits.isdigit()):
+        return None
+    try:
+        return (date.fromisoformat(value) - _EPOCH_DATE).days
+    except ValueError:
+        return None
+
+
+def _calendar_labels(dates: np.ndarray, unit: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ISO labels for dates truncated to `unit`, formatted once per distinct period.
+
+    Returns (sorted distinct labels, per-row labels, per-row index into the labels).
+    """
+    periods, codes = np.unique(dates.astype(f"datetime64[{unit}]"), return_inverse=True)
+    labels = np.datetime_as_string(periods, unit=unit)
+    codes = codes.astype(np.intp, copy=False).reshape(-1)
+    return labels, labels[codes], codes
+
+
+def _first_appearance(codes: np.ndarray) -> np.ndarray:
+    """Distinct codes ordered by where they first occur."""
+    distinct, first_index = np.unique(codes, return_index=True)
+    return distinct[np.argsort(first_index, kind="stable")]
+
+
+def _nested_sums(
+    outer_codes: np.ndarray,
+    outer_labels: List[str],
+    inner_codes: np.ndarray,
+    inner_labels: List[str],
+    weights: np.ndarray,
+    mask: np.ndarray,
+) -> Dict[str, Dict[str, float]]:
+    outer_codes = outer_codes[mask]
+    if not outer_codes.size:
+        return {}
+    width = len(inner_labels)
+    pair_codes = outer_codes * width + inner_codes[mask]
+    sums = np.bincount(pair_codes, weights=weights[mask], minlength=len(outer_labels) * width)
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for pair in _first_appearance(pair_codes):
+        outer, inner = divmod(int(pair), width)
+        totals.setdefault(outer_labels[outer], {})[inner_labels[inner]] = float(sums[pair])
+    return totals
+
+
+def _grouped_sums(codes: np.ndarray, labels: List[str], weights: np.ndarray, mask: np.ndarray) -> Dict[str, float]:
+    codes = codes[mask]
+    if not codes.size:
+        return {}
+    sums = np.bincount(codes, weights=weights[mask], minlength=len(labels))
+    return {labels[code]: float(sums[code]) for code in _first_appearance(codes)}
@@ -4,7 +4,7 @@ Generates insights for individual transactions
 """
 
 from typing import Dict, List, Optional
-from datetime import datetime
+from app.core.evaluation import current_evaluation_context, evaluation_scope
 
 
 class TransactionInsightGenerator:
@@ -14,6 +14,7 @@ class TransactionInsightGenerator:
         """Initialize insight generator"""
         pass
     
+    @evaluation_scope
     def generate_transaction_insight(
         self,
         transaction: Dict,
@@ -82,8 +83,9 @@ class TransactionInsightGenerator:
             if not due_date_str:
                 return None
             
-            due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-            days_until_due = (due_date - datetime.now()).days
+            days_until_due = current_evaluation_context().days_until_due(due_date_str)
+            if days_until_due is None:
+                return None
             
             min_payment = card_context.get('minimum_payment', 0)
             
@@ -6,9 +6,14 @@ Main entry point for the Python microservice
 from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 from app.core.config import settings
+from app.core.executor import compute_executor
+from app.core.response_cache import response_cache
 from app.api import analyze, recommendations, simulate, stochastic
+from app.services.card_choice_shards import card_choice_sharder
+from app.services.reward_catalog import reward_catalog
 
 
 @asynccontextmanager
@@ -20,6 +25,9 @@ async def lifespan(app: FastAPI):
     print("=" * 60)
     print("Starting Credit Intelligence Service...")
     print("=" * 60)
+
+    # Warm the reward catalog in the background so the first card-choice call doesn't wait on Supabase
+    asyncio.create_task(reward_catalog.get_offers())
     
     print("\nService ready!")
     print("=" * 60)
@@ -28,6 +36,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("\nShutting down Credit Intelligence Service...")
+    await reward_catalog.aclose()
+    compute_executor.shutdown(wait=False)
+    card_choice_sharder.shutdown(wait=False)
 
 
 app = FastAPI(
@@ -62,7 +73,9 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "version": "0.1.0"
+        "version": "0.1.0",
+        "compute": compute_executor.stats(),
+        "response_cache": response_cache.info(),
     }
 
 
@@ -127,7 +127,7 @@ export const paymentRecommendationRequestSchema = z.object({
     })
   ),
   available_amount: z.number().positive(),
-  optimization_goal: z.enum(['minimize_interest', 'balanced', 'minimize_balance']),
+  optimization_goal: z.enum(['minimize_interest', 'balanced', 'minimize_balance', 'optimal']),
 });
 
 export const payoffSimulationRequestSchema = z.object({
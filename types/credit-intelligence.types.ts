@@ -53,7 +53,7 @@ export interface PaymentRecommendationRequest {
   userId: string;
   cards: CardDataForAnalysis[];
   availableAmount: number; // Amount user can pay this month
-  optimizationGoal: 'minimize_interest' | 'balanced' | 'minimize_balance';
+  optimizationGoal: 'minimize_interest' | 'balanced' | 'minimize_balance' | 'optimal';
 }
 
 export interface PaymentRecommendation {
@@ -80,6 +80,7 @@ export interface PaymentRecommendationResponse {
     monthlyInterest: number;
     annualInterest: number;
   };
+  objectiveValue: number; // Projected interest + utilization penalty; lower is better
 }
 
 // ==================== PAYOFF SIMULATION ====================